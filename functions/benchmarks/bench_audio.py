@@ -0,0 +1,98 @@
+"""音频转换基准：吞吐(音频秒/墙钟秒)与峰值内存，对比原pydub整段解码路径
+
+用法:
+    python benchmarks/bench_audio.py --durations 60,600,7200 --targets mp3,aac,ogg
+每个用例在独立子进程中运行，峰值内存包含ffmpeg子进程。
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import media  # noqa: E402
+
+
+def make_source(path: Path, seconds: int) -> None:
+    """生成立体声FLAC样本"""
+    media.run_ffmpeg([
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={seconds}',
+        '-ac', '2', '-c:a', 'flac', str(path),
+    ])
+
+
+def pydub_convert(src: Path, dst: Path, target: str) -> str:
+    """原handle_media_conversion_sync的音频实现"""
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(str(src))
+    fmt, bitrate = {'mp3': ('mp3', '192k'), 'aac': ('adts', '128k'), 'ogg': ('ogg', '192k')}.get(target, (target, None))
+    audio.export(str(dst), format=fmt, bitrate=bitrate)
+    return 'pydub'
+
+
+def run_single(impl: str, src: Path, target: str, seconds: int) -> dict:
+    dst = src.with_name(f'out_{impl}.{target}')
+    start = time.perf_counter()
+    if impl == 'pydub':
+        method = pydub_convert(src, dst, target)
+    else:
+        method = media.convert_audio(src, dst, target)
+    elapsed = time.perf_counter() - start
+
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    result = {
+        'impl': impl,
+        'method': method,
+        'target': target,
+        'audioSeconds': seconds,
+        'wallSeconds': round(elapsed, 2),
+        'realtimeFactor': round(seconds / elapsed, 1) if elapsed else None,
+        'peakRssMb': round(max(own, children) / 1024, 1),
+        'outputMb': round(dst.stat().st_size / 1024 / 1024, 2),
+    }
+    dst.unlink()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--durations', default='60,600,7200', help='样本时长(秒)，逗号分隔')
+    parser.add_argument('--targets', default='mp3,aac,ogg')
+    parser.add_argument('--impl', default='both', choices=['both', 'ffmpeg', 'pydub'])
+    parser.add_argument('--run', nargs=4, metavar=('IMPL', 'SRC', 'TARGET', 'SECONDS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        impl, src, target, seconds = args.run
+        print(json.dumps(run_single(impl, Path(src), target, int(seconds))))
+        return
+
+    impls = ['ffmpeg', 'pydub'] if args.impl == 'both' else [args.impl]
+    with tempfile.TemporaryDirectory() as tmp:
+        for seconds in [int(d) for d in args.durations.split(',') if d]:
+            src = Path(tmp) / f'source_{seconds}.flac'
+            make_source(src, seconds)
+            for target in args.targets.split(','):
+                for impl in impls:
+                    proc = subprocess.run(
+                        [sys.executable, __file__, '--run', impl, str(src), target, str(seconds)],
+                        capture_output=True, text=True,
+                    )
+                    if proc.returncode != 0:
+                        error = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+                        print(json.dumps({'impl': impl, 'target': target, 'audioSeconds': seconds, 'error': error}))
+                    else:
+                        print(proc.stdout.strip())
+            src.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""批量转换基准：100张图片串行与进程池并行的吞吐对比
+
+用法:
+    python benchmarks/bench_batch.py --count 100 --size 2000x1500 --target webp
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 关闭结果缓存，否则第二轮会直接命中
+os.environ['CONVERT_CACHE_DISABLED'] = '1'
+
+import convert  # noqa: E402
+from convertlib import batch  # noqa: E402
+
+
+def make_images(directory: Path, count: int, size: tuple) -> list:
+    from PIL import Image
+
+    paths = []
+    for i in range(count):
+        # 每张图内容不同，避免编码器走捷径
+        img = Image.effect_mandelbrot(size, (-2.0 + i * 0.001, -1.2, 1.0, 1.2), 64).convert('RGB')
+        path = directory / f'bench_{i:04d}.png'
+        img.save(path)
+        paths.append(path)
+    return paths
+
+
+def run(paths: list, target: str, parallel: bool) -> dict:
+    params = {'operation': 'convert', 'conversionType': 'image', 'targetFormat': target}
+    mode = 'parallel' if parallel else 'serial'
+    jobs = [(p, p.name, params, f'bench_{mode}_{i}', 'image', None) for i, p in enumerate(paths)]
+    start = time.perf_counter()
+    results = batch.run_batch(convert.handle_conversion_sync, jobs, convert.UPLOAD_DIR, parallel=parallel)
+    elapsed = time.perf_counter() - start
+    for r in results:
+        if r.get('fileName'):
+            (convert.UPLOAD_DIR / r['fileName']).unlink(missing_ok=True)
+    return {
+        'mode': mode,
+        'workers': batch.worker_count() if parallel else 1,
+        'images': len(paths),
+        'failed': sum(1 for r in results if not r['success']),
+        'seconds': round(elapsed, 2),
+        'imagesPerSecond': round(len(paths) / elapsed, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--size', default='2000x1500')
+    parser.add_argument('--target', default='webp')
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    source_dir = convert.UPLOAD_DIR / 'bench_batch_src'
+    source_dir.mkdir(parents=True, exist_ok=True)
+    paths = make_images(source_dir, args.count, (width, height))
+
+    # 先让进程池启动，避免把进程创建时间算进并行结果
+    batch.get_pool().submit(int).result()
+
+    serial = run(paths, args.target, parallel=False)
+    parallel = run(paths, args.target, parallel=True)
+    print(json.dumps(serial))
+    print(json.dumps(parallel))
+    print(json.dumps({'speedup': round(serial['seconds'] / parallel['seconds'], 2)}))
+
+    for path in paths:
+        path.unlink()
+    source_dir.rmdir()
+
+
+if __name__ == '__main__':
+    main()
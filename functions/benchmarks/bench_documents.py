@@ -0,0 +1,124 @@
+"""长文本转PDF基准：1MB/10MB/100MB文本的耗时与峰值内存
+
+用法:
+    python benchmarks/bench_documents.py --sizes 1,10,100 --impls legacy,canvas,flow --timeout 600
+每个用例在独立子进程中运行。legacy 为原实现(整篇文本放进一个Paragraph)，
+canvas 为 text_to_pdf 的逐行绘制，flow 为按段落分批交给 SimpleDocTemplate。
+超过 --timeout 秒的用例记为超时。
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import documents  # noqa: E402
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor '
+         'incididunt ut labore et dolore magna aliqua <tag> & co').split()
+
+
+def make_source(path: Path, size_mb: int) -> None:
+    """生成段落长度不一的英文文本，含需要转义的 < > &"""
+    rng = random.Random(size_mb)
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target:
+            paragraph = '\n'.join(
+                ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 18)))
+                for _ in range(rng.randint(1, 12))
+            ) + '\n\n'
+            f.write(paragraph)
+            written += len(paragraph)
+
+
+def legacy_convert(src: Path, dst: Path) -> None:
+    """原convert_txt_to_pdf的实现"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+    with open(src, 'r', encoding='utf-8') as f:
+        text = f.read()
+    doc = SimpleDocTemplate(str(dst), pagesize=letter)
+    doc.build([Paragraph(text, getSampleStyleSheet()['Normal'])])
+
+
+def flow_convert(src: Path, dst: Path) -> None:
+    paragraphs = ((text, 'Normal') for text in documents.iter_text_paragraphs(src))
+    documents.paragraphs_to_pdf(paragraphs, dst, 'Helvetica')
+
+
+def _rss_kb(field: str) -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_single(impl: str, src: Path, size_mb: int) -> dict:
+    dst = src.with_name(f'out_{impl}.pdf')
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    start = time.perf_counter()
+    {'legacy': legacy_convert, 'canvas': documents.text_to_pdf, 'flow': flow_convert}[impl](src, dst)
+    elapsed = time.perf_counter() - start
+    result = {
+        'impl': impl,
+        'sizeMb': size_mb,
+        'seconds': round(elapsed, 2),
+        'mbPerSecond': round(size_mb / elapsed, 2),
+        'peakRssMb': round(_rss_kb('VmHWM') / 1024, 1),
+        'outputMb': round(dst.stat().st_size / 1024 / 1024, 2),
+    }
+    dst.unlink()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1,10,100', help='文本大小(MB)，逗号分隔')
+    parser.add_argument('--impls', default='legacy,canvas,flow')
+    parser.add_argument('--timeout', type=int, default=600)
+    parser.add_argument('--run', nargs=3, metavar=('IMPL', 'SRC', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        impl, src, size_mb = args.run
+        print(json.dumps(run_single(impl, Path(src), int(size_mb))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in [int(s) for s in args.sizes.split(',') if s]:
+            src = Path(tmp) / f'source_{size_mb}mb.txt'
+            make_source(src, size_mb)
+            for impl in args.impls.split(','):
+                try:
+                    proc = subprocess.run(
+                        [sys.executable, __file__, '--run', impl, str(src), str(size_mb)],
+                        capture_output=True, text=True, timeout=args.timeout,
+                    )
+                except subprocess.TimeoutExpired:
+                    print(json.dumps({'impl': impl, 'sizeMb': size_mb, 'error': f'timeout after {args.timeout}s'}))
+                    continue
+                if proc.returncode != 0:
+                    error = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+                    print(json.dumps({'impl': impl, 'sizeMb': size_mb, 'error': error}))
+                else:
+                    print(proc.stdout.strip())
+            src.unlink()
+
+
+if __name__ == '__main__':
+    main()
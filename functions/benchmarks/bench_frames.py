@@ -0,0 +1,131 @@
+"""多帧图像基准：500帧GIF转动画WEBP/GIF/多页TIFF/PDF的耗时与峰值内存
+
+用法:
+    python benchmarks/bench_frames.py --frames 500 --size 640x480 --targets webp,gif,tiff,pdf
+每个用例在独立子进程中运行。list 为先把所有帧读进列表再 save_all(append_images=...)
+的做法，stream 为 convert_image 的逐帧编码。
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import images  # noqa: E402
+
+
+def make_source(path: Path, frames: int, size: tuple) -> None:
+    """逐帧生成GIF，生成过程本身不把所有帧留在内存里"""
+    from PIL import Image, ImageDraw
+    from PIL import GifImagePlugin
+
+    palette = None
+    with open(path, 'wb') as fp:
+        for i in range(frames):
+            frame = Image.new('RGB', size, (i % 256, 80, 160))
+            draw = ImageDraw.Draw(frame)
+            x = i * 7 % size[0]
+            draw.ellipse((x, size[1] // 4, x + size[0] // 5, size[1] // 4 + size[0] // 5), fill=(255, 220, 0))
+            draw.text((10, 10), f'frame {i}', fill=(255, 255, 255))
+            if palette is None:
+                frame = frame.quantize(128)
+                header, _ = GifImagePlugin.getheader(frame, info={'loop': 0, 'duration': 40})
+                for chunk in header:
+                    fp.write(chunk)
+                palette = frame
+            else:
+                frame = frame.quantize(palette=palette)
+            for chunk in GifImagePlugin.getdata(frame, (0, 0), duration=40):
+                fp.write(chunk)
+        fp.write(b';')
+
+
+def list_convert(src: Path, dst: Path, target: str) -> int:
+    """所有帧解码进列表后一次性保存"""
+    from PIL import Image, ImageSequence
+
+    pil_format = images.SAVE_OPTIONS[target][0]
+    with Image.open(src) as img:
+        frames = [frame.convert('RGB') for frame in ImageSequence.Iterator(img)]
+        durations = [img.info.get('duration', 40)] * len(frames)
+    # 与stream使用相同的编码参数
+    options = images.encoder_options(pil_format)
+    frames[0].save(dst, pil_format, save_all=True, append_images=frames[1:], duration=durations, loop=0, **options)
+    return len(frames)
+
+
+def _rss_kb(field: str) -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_single(impl: str, src: Path, target: str) -> dict:
+    dst = src.with_name(f'out_{impl}.{target}')
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    base_kb = _rss_kb('VmRSS')
+    start = time.perf_counter()
+    if impl == 'list':
+        frames = list_convert(src, dst, target)
+    else:
+        frames = images.convert_image(src, dst, target)['frames']
+    elapsed = time.perf_counter() - start
+    peak_kb = _rss_kb('VmHWM')
+    result = {
+        'impl': impl,
+        'target': target,
+        'frames': frames,
+        'seconds': round(elapsed, 2),
+        'framesPerSecond': round(frames / elapsed, 1),
+        'peakRssMb': round(peak_kb / 1024, 1),
+        'convertOverheadMb': round((peak_kb - base_kb) / 1024, 1),
+        'outputMb': round(dst.stat().st_size / 1024 / 1024, 2),
+    }
+    dst.unlink()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--size', default='640x480')
+    parser.add_argument('--targets', default='webp,gif,tiff,pdf')
+    parser.add_argument('--impls', default='list,stream')
+    parser.add_argument('--run', nargs=3, metavar=('IMPL', 'SRC', 'TARGET'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        impl, src, target = args.run
+        print(json.dumps(run_single(impl, Path(src), target)))
+        return
+
+    width, height = (int(v) for v in args.size.split('x'))
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'source.gif'
+        make_source(src, args.frames, (width, height))
+        for target in args.targets.split(','):
+            for impl in args.impls.split(','):
+                proc = subprocess.run(
+                    [sys.executable, __file__, '--run', impl, str(src), target],
+                    capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    error = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+                    print(json.dumps({'impl': impl, 'target': target, 'error': error}))
+                else:
+                    print(proc.stdout.strip())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""图像转换基准：不同尺寸/格式下的耗时与峰值内存，对比原整图解码路径
+
+用法:
+    python benchmarks/bench_images.py --megapixels 2,12,48 --sources jpg,png,tif --targets webp,jpg,png --width 1600
+每个用例在独立子进程中运行。legacy 为原实现(整图解码，固定quality=90)，
+其余为 convert_image 在各 effort 档位下的结果；--width 为0时只转换格式不缩放。
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import images  # noqa: E402
+
+
+def make_source(path: Path, megapixels: int) -> None:
+    from PIL import Image
+
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = megapixels * 1_000_000 // width
+    # 分形图有细节，压缩率接近真实照片
+    img = Image.effect_mandelbrot((width, height), (-2.0, -1.2, 1.0, 1.2), 128).convert('RGB')
+    img.save(path)
+
+
+def legacy_convert(src: Path, dst: Path, target: str, width: int) -> dict:
+    """原handle_image_conversion_sync的实现，外加整图解码后缩放"""
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = None
+    pil_format, options = images.SAVE_OPTIONS[target]
+    with Image.open(src) as img:
+        if pil_format == 'JPEG' and img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGB')
+        if width:
+            img = img.resize((width, round(img.size[1] * width / img.size[0])), Image.Resampling.LANCZOS)
+        img.save(dst, pil_format, **options)
+        return {'width': img.size[0], 'height': img.size[1], 'decode': 'full'}
+
+
+def _rss_kb(field: str) -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_single(impl: str, src: Path, target: str, width: int) -> dict:
+    dst = src.with_name(f'out_{impl}.{target}')
+    # ru_maxrss会跨exec继承父进程的峰值，改为重置VmHWM后测量
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    start = time.perf_counter()
+    if impl == 'legacy':
+        info = legacy_convert(src, dst, target, width)
+    else:
+        info = images.convert_image(src, dst, target, width=width or None, effort=impl)
+    elapsed = time.perf_counter() - start
+    result = {
+        'impl': impl,
+        'source': src.suffix.lstrip('.'),
+        'target': target,
+        'output': f"{info['width']}x{info['height']}",
+        'decode': info['decode'],
+        'seconds': round(elapsed, 3),
+        'peakRssMb': round(_rss_kb('VmHWM') / 1024, 1),
+        'outputKb': round(dst.stat().st_size / 1024, 1),
+    }
+    dst.unlink()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--megapixels', default='2,12,48', help='源图像素(百万)，逗号分隔')
+    parser.add_argument('--sources', default='jpg,png,tif')
+    parser.add_argument('--targets', default='webp,jpg,png')
+    parser.add_argument('--width', type=int, default=1600, help='输出宽度，0表示不缩放')
+    parser.add_argument('--impls', default='legacy,fast,balanced,small')
+    parser.add_argument('--run', nargs=4, metavar=('IMPL', 'SRC', 'TARGET', 'WIDTH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        impl, src, target, width = args.run
+        print(json.dumps(run_single(impl, Path(src), target, int(width))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for megapixels in [int(m) for m in args.megapixels.split(',') if m]:
+            for source in args.sources.split(','):
+                src = Path(tmp) / f'source_{megapixels}mp.{source}'
+                make_source(src, megapixels)
+                for target in args.targets.split(','):
+                    for impl in args.impls.split(','):
+                        proc = subprocess.run(
+                            [sys.executable, __file__, '--run', impl, str(src), target, str(args.width)],
+                            capture_output=True, text=True,
+                        )
+                        if proc.returncode != 0:
+                            error = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+                            print(json.dumps({'impl': impl, 'source': source, 'target': target,
+                                              'megapixels': megapixels, 'error': error}))
+                        else:
+                            print(json.dumps(dict(json.loads(proc.stdout), megapixels=megapixels)))
+                src.unlink()
+
+
+if __name__ == '__main__':
+    main()
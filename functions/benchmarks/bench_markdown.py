@@ -0,0 +1,107 @@
+"""HTML转Markdown基准：BeautifulSoup(html.parser)+get_text 与 lxml 转换器的吞吐对比
+
+用法:
+    python benchmarks/bench_markdown.py --corpus saved_pages/ --repeat 5
+--corpus 为保存下来的 .html 页面目录；不指定时生成一组结构接近新闻/文档页的合成页面。
+legacy 需要安装 beautifulsoup4。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import webpage  # noqa: E402
+
+WORDS = 'the quick brown fox jumps over lazy dog convert markdown page content section'.split()
+
+
+def make_corpus(count: int) -> list:
+    """合成页面：导航、正文段落、列表、表格、代码块和页脚"""
+    rng = random.Random(0)
+    pages = []
+    for i in range(count):
+        words = lambda n: ' '.join(rng.choice(WORDS) for _ in range(n))  # noqa: E731
+        body = []
+        for section in range(rng.randint(5, 30)):
+            body.append(f'<h2>{words(4)}</h2>')
+            for _ in range(rng.randint(2, 8)):
+                body.append(f'<p>{words(40)} <a href="/s{section}">{words(2)}</a> <b>{words(3)}</b> {words(30)}</p>')
+            body.append('<ul>' + ''.join(f'<li>{words(6)}</li>' for _ in range(rng.randint(2, 8))) + '</ul>')
+            if section % 4 == 0:
+                body.append('<table>' + ''.join(
+                    '<tr>' + ''.join(f'<td>{words(2)}</td>' for _ in range(4)) + '</tr>' for _ in range(10)
+                ) + '</table>')
+                body.append(f'<pre><code>{words(20)}</code></pre>')
+        nav = ''.join(f'<a href="/n{j}">{words(1)}</a>' for j in range(40))
+        pages.append((
+            f'<html><head><title>Page {i}</title><style>body{{}}</style><script>var x = 1;</script></head>'
+            f'<body><nav>{nav}</nav><div class="content"><article>{"".join(body)}</article></div>'
+            f'<footer>{words(20)}</footer></body></html>'
+        ).encode())
+    return pages
+
+
+def legacy_convert(content: bytes) -> str:
+    """原url-to-markdown的解析方式"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    title = soup.title.string if soup.title else 'Webpage'
+    for script in soup(['script', 'style']):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split('  '))
+    return f"# {title}\n\n" + '\n'.join(chunk for chunk in chunks if chunk)
+
+
+def lxml_convert(content: bytes) -> str:
+    result = webpage.html_to_markdown(content, base_url='https://example.com/')
+    return f"# {result['title']}\n\n{result['markdown']}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--corpus', help='.html 页面目录')
+    parser.add_argument('--pages', type=int, default=50, help='合成页面数')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--impls', default='legacy,lxml')
+    args = parser.parse_args()
+
+    if args.corpus:
+        pages = [p.read_bytes() for p in sorted(Path(args.corpus).glob('*.htm*'))]
+    else:
+        pages = make_corpus(args.pages)
+    total_mb = sum(len(p) for p in pages) / 1024 / 1024
+
+    impls = {'legacy': legacy_convert, 'lxml': lxml_convert}
+    results = {}
+    for name in args.impls.split(','):
+        convert = impls[name]
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            output = sum(len(convert(page)) for page in pages)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best
+        print(json.dumps({
+            'impl': name,
+            'pages': len(pages),
+            'inputMb': round(total_mb, 2),
+            'seconds': round(best, 3),
+            'pagesPerSecond': round(len(pages) / best, 1),
+            'mbPerSecond': round(total_mb / best, 2),
+            'outputChars': output,
+        }))
+    if 'legacy' in results and 'lxml' in results:
+        print(json.dumps({'speedup': round(results['legacy'] / results['lxml'], 2)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""multipart解析基准：对比旧的整体split解析与增量解析的峰值内存和吞吐
+
+用法:
+    python benchmarks/bench_multipart.py --sizes 10,200,1024
+"""
+
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import multipart  # noqa: E402
+
+BOUNDARY = '----BenchBoundary7MA4YWxkTrZu0gW'
+BLOCK = os.urandom(3 * 1024 * 1024)
+
+
+def write_event(path: Path, size_mb: int) -> None:
+    """生成base64编码的multipart请求体写入文件，避免在父进程中占用内存"""
+    head = (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="conversionType"\r\n\r\nvideo\r\n'
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="targetFormat"\r\n\r\nmp4\r\n'
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="clip.mp4"\r\n'
+        f'Content-Type: video/mp4\r\n\r\n'
+    ).encode()
+    tail = f'\r\n--{BOUNDARY}--\r\n'.encode()
+    remaining = size_mb * 1024 * 1024
+    pending = head
+    with open(path, 'wb') as f:
+        while remaining > 0:
+            block = BLOCK[:min(len(BLOCK), remaining)]
+            remaining -= len(block)
+            data = pending + block
+            # 每次编码3字节的整数倍，拼接后与整体编码一致
+            cut = len(data) - len(data) % 3
+            f.write(base64.b64encode(data[:cut]))
+            pending = data[cut:]
+        f.write(base64.b64encode(pending + tail))
+
+
+def legacy_parse(body_b64: str, out_path: Path) -> None:
+    """旧实现：整体解码后split再join"""
+    body = base64.b64decode(body_b64)
+    parts = body.split(f'--{BOUNDARY}'.encode())
+    for part in parts:
+        if b'Content-Disposition' in part:
+            lines = part.split(b'\r\n')
+            body_start = 0
+            for i, line in enumerate(lines):
+                if line.startswith(b'Content-Disposition') and 'name="file"' in line.decode():
+                    for j in range(i + 1, len(lines)):
+                        if lines[j].strip() == b'':
+                            body_start = j + 1
+                            break
+                    file_data = b'\r\n'.join(lines[body_start:-1])
+                    with open(out_path, 'wb') as f:
+                        f.write(file_data)
+
+
+def streaming_parse(body_b64: str, out_path: Path) -> None:
+    def file_factory(field_name, filename, content_type):
+        return multipart.FileSink(multipart.UploadedFile(field_name, filename, content_type, out_path))
+
+    parser = multipart.MultipartParser(BOUNDARY, file_factory)
+    for chunk in multipart.iter_event_body({'body': body_b64, 'isBase64Encoded': True}):
+        parser.feed(chunk)
+    parser.close()
+
+
+def _rss_kb(field: str) -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_single(impl: str, event_path: Path, size_mb: int) -> dict:
+    """在子进程中运行：读入事件后重置峰值RSS，只统计解析本身"""
+    with open(event_path, 'r') as f:
+        body_b64 = f.read()
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    base_kb = _rss_kb('VmRSS')
+
+    out_path = event_path.with_suffix(f'.{impl}.out')
+    start = time.perf_counter()
+    (legacy_parse if impl == 'legacy' else streaming_parse)(body_b64, out_path)
+    elapsed = time.perf_counter() - start
+
+    peak_kb = _rss_kb('VmHWM')
+    out_size = out_path.stat().st_size
+    out_path.unlink()
+    return {
+        'impl': impl,
+        'sizeMb': size_mb,
+        'seconds': round(elapsed, 3),
+        'throughputMbps': round(size_mb / elapsed, 1) if elapsed else None,
+        'eventRssMb': round(base_kb / 1024, 1),
+        'peakRssMb': round(peak_kb / 1024, 1),
+        'parseOverheadMb': round((peak_kb - base_kb) / 1024, 1),
+        'outputBytes': out_size,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10,200,1024', help='上传大小(MB)，逗号分隔')
+    parser.add_argument('--impl', default='both', choices=['both', 'legacy', 'streaming'])
+    parser.add_argument('--run', nargs=3, metavar=('IMPL', 'EVENT', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        impl, event_path, size_mb = args.run
+        print(json.dumps(run_single(impl, Path(event_path), int(size_mb))))
+        return
+
+    impls = ['legacy', 'streaming'] if args.impl == 'both' else [args.impl]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in [int(s) for s in args.sizes.split(',') if s]:
+            event_path = Path(tmp) / f'event_{size_mb}.b64'
+            write_event(event_path, size_mb)
+            for impl in impls:
+                proc = subprocess.run(
+                    [sys.executable, __file__, '--run', impl, str(event_path), str(size_mb)],
+                    capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    results.append({'impl': impl, 'sizeMb': size_mb, 'error': proc.stderr.strip().splitlines()[-1:]})
+                else:
+                    results.append(json.loads(proc.stdout))
+                print(json.dumps(results[-1]))
+            event_path.unlink()
+
+
+if __name__ == '__main__':
+    main()
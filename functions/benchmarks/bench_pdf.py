@@ -0,0 +1,128 @@
+"""PDF合并/拆分基准：流式写入(pdf.merge_pdfs/split_pdf)与PyPDF2 PdfMerger/PdfWriter的耗时和内存峰值
+
+用法:
+    python benchmarks/bench_pdf.py --cases many,large,split
+用reportlab在本地生成输入：many 为300个10页的文件，large 为4个1000页的文件，split 为拆分一个2000页的文件；
+每个输入带一张噪声图片(所有页共用)，使输入体积接近真实扫描件。每次运行在单独的子进程里，内存峰值互不影响。
+"""
+
+import argparse
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import pdf  # noqa: E402
+
+# 用例 -> (输入个数, 每个输入的页数)
+CASES = {
+    'many': (300, 10),
+    'large': (4, 1000),
+    'split': (1, 2000),
+}
+
+
+def make_inputs(directory: Path, count: int, pages: int, image_px: int) -> list:
+    from PIL import Image
+    from reportlab.pdfgen import canvas
+
+    image = directory / 'noise.png'
+    Image.effect_noise((image_px, image_px), 48).convert('RGB').save(image)
+    paths = []
+    for index in range(count):
+        path = directory / f'input_{index:04d}.pdf'
+        c = canvas.Canvas(str(path))
+        for page in range(pages):
+            c.drawImage(str(image), 72, 400, 200, 200)
+            c.drawString(72, 720, f'Input {index + 1} page {page + 1}')
+            c.drawString(72, 700, 'lorem ipsum dolor sit amet ' * 3)
+            c.showPage()
+        c.save()
+        paths.append(path)
+    return paths
+
+
+def run_mode(case: str, mode: str, inputs: list, out_dir: Path) -> dict:
+    """在子进程中执行一次合并或拆分"""
+    import PyPDF2
+
+    start = time.perf_counter()
+    if case == 'split':
+        dst = out_dir / 'split.zip'
+        if mode == 'stream':
+            parts = len(pdf.split_pdf(inputs[0], dst, 'part'))
+        else:
+            reader = PyPDF2.PdfReader(str(inputs[0]))
+            with zipfile.ZipFile(dst, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for index, page in enumerate(reader.pages):
+                    writer = PyPDF2.PdfWriter()
+                    writer.add_page(page)
+                    # PdfWriter需要可seek的输出
+                    buffer = io.BytesIO()
+                    writer.write(buffer)
+                    archive.writestr(f'part_{index + 1:04d}.pdf', buffer.getvalue())
+            parts = len(reader.pages)
+        pages = parts
+    else:
+        dst = out_dir / 'merged.pdf'
+        if mode == 'stream':
+            pages = pdf.merge_pdfs([(path, '') for path in inputs], dst)
+        else:
+            merger = PyPDF2.PdfMerger()
+            for path in inputs:
+                merger.append(str(path))
+            merger.write(str(dst))
+            merger.close()
+            pages = len(PyPDF2.PdfReader(str(dst)).pages)
+    elapsed = time.perf_counter() - start
+    return {
+        'case': case,
+        'mode': mode,
+        'seconds': round(elapsed, 2),
+        'peakRssMb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'outputMb': round(dst.stat().st_size / 1024 / 1024, 2),
+        'pages': pages,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cases', default='many,large,split')
+    parser.add_argument('--modes', default='stream,pypdf2')
+    parser.add_argument('--image-px', type=int, default=300, help='每个输入中噪声图片的边长')
+    parser.add_argument('--run', nargs=3, metavar=('CASE', 'MODE', 'DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        case, mode, directory = args.run
+        directory = Path(directory)
+        inputs = sorted(directory.glob('input_*.pdf'))
+        print(json.dumps(run_mode(case, mode, inputs, directory)))
+        return
+
+    for case in args.cases.split(','):
+        count, pages = CASES[case]
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            inputs = make_inputs(directory, count, pages, args.image_px)
+            input_mb = sum(p.stat().st_size for p in inputs) / 1024 / 1024
+            for mode in args.modes.split(','):
+                proc = subprocess.run([sys.executable, __file__, '--run', case, mode, str(directory)],
+                                      capture_output=True, text=True)
+                if proc.returncode != 0:
+                    result = {'case': case, 'mode': mode, 'error': proc.stderr.strip()[-200:]}
+                else:
+                    result = json.loads(proc.stdout)
+                result.update(inputs=count, inputMb=round(input_mb, 2))
+                print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""分段并行转码基准：单进程ffmpeg转码与按关键帧分段并行转码在不同核数下的耗时
+
+用法:
+    python benchmarks/bench_segments.py --cores 1,4,16 --seconds 120 --target mp4
+每个核数在单独的子进程里运行，用CPU亲和性限制为该核数(机器核数不足时以实际可用核数运行，
+结果里的 cpus 为实际使用的核数)。样片用ffmpeg测试源在本地生成，输出帧数用于确认拼接没有丢帧。
+需要ffmpeg(系统或imageio-ffmpeg)。
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import media  # noqa: E402
+
+
+def make_source(path: Path, seconds: int, size: str) -> None:
+    """H.264/AAC样片，每2秒一个关键帧"""
+    media.run_ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-g', '60', '-pix_fmt', 'yuv420p', '-c:a', 'aac',
+        '-shortest', str(path),
+    ])
+
+
+def count_frames(path: Path) -> int:
+    proc = subprocess.run([media.ffmpeg_exe(), '-hide_banner', '-i', str(path), '-map', '0:v:0', '-f', 'null', '-'],
+                          capture_output=True)
+    frames = re.findall(rb'frame=\s*(\d+)', proc.stderr)
+    return int(frames[-1]) if frames else 0
+
+
+def run_case(src: Path, target: str, preset: str, mode: str, cores: int) -> dict:
+    """在子进程中执行：限制CPU亲和性后转码一次"""
+    available = sorted(os.sched_getaffinity(0))
+    cpus = available[:cores]
+    os.sched_setaffinity(0, cpus)
+    with tempfile.TemporaryDirectory() as tmp:
+        dst = Path(tmp) / f'out.{target}'
+        start = time.perf_counter()
+        method = media.convert_video(src, dst, target, preset=preset, allow_remux=False,
+                                     parallel=mode == 'segmented', workers=cores)
+        elapsed = time.perf_counter() - start
+        info = media.probe(dst)
+        return {
+            'mode': mode,
+            'cores': cores,
+            'cpus': len(cpus),
+            'method': method,
+            'seconds': round(elapsed, 2),
+            'outputMb': round(dst.stat().st_size / 1024 / 1024, 2),
+            'duration': round(info['duration'], 2),
+            'frames': count_frames(dst),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cores', default='1,4,16')
+    parser.add_argument('--seconds', type=int, default=120)
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--target', default='mp4', choices=sorted(media.VIDEO_ENCODERS))
+    parser.add_argument('--preset', default='balanced', choices=sorted(media.PRESETS))
+    parser.add_argument('--run', nargs=4, metavar=('SRC', 'TARGET', 'MODE', 'CORES'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        src, target, mode, cores = args.run
+        print(json.dumps(run_case(Path(src), target, args.preset, mode, int(cores))))
+        return
+
+    if not media.ffmpeg_exe():
+        sys.exit('ffmpeg not available')
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'source.mp4'
+        make_source(src, args.seconds, args.size)
+        expected = count_frames(src)
+        for cores in [int(c) for c in args.cores.split(',')]:
+            results = {}
+            for mode in ('single', 'segmented'):
+                proc = subprocess.run(
+                    [sys.executable, __file__, '--preset', args.preset, '--run', str(src), args.target, mode, str(cores)],
+                    capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    results[mode] = {'mode': mode, 'cores': cores, 'error': proc.stderr.strip()[-200:]}
+                else:
+                    results[mode] = dict(json.loads(proc.stdout), sourceFrames=expected)
+                print(json.dumps(results[mode]), flush=True)
+            single, segmented = results['single'], results['segmented']
+            if 'seconds' in single and 'seconds' in segmented:
+                print(json.dumps({'cores': cores, 'speedup': round(single['seconds'] / segmented['seconds'], 2)}),
+                      flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""负载测试：ASGI服务(server.py)与handler路径的吞吐和延迟对比
+
+用法:
+    python benchmarks/bench_server.py --modes asgi,handler,handler-cold --requests 200 --concurrency 8
+    python benchmarks/bench_server.py --case document --workers 4
+
+asgi 为 uvicorn server:app(预热的工作进程池)；handler 为单进程HTTP适配器把请求转成Netlify事件
+调用 convert.handler(热进程)；handler-cold 为每个请求启动新进程调用handler，相当于每次冷启动。
+每个请求上传一个样本并等待转换完成，输出 requests/sec、p50、p99。结果缓存已关闭。
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+FUNCTIONS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(FUNCTIONS_DIR))
+
+CASES = {
+    'image': ('sample.png', {'conversionType': 'image', 'targetFormat': 'webp'}),
+    'document': ('sample.txt', {'conversionType': 'document', 'targetFormat': 'pdf'}),
+}
+
+
+def make_sample(case: str) -> bytes:
+    if case == 'image':
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.effect_noise((1200, 900), 32).convert('RGB').save(buffer, 'PNG')
+        return buffer.getvalue()
+    return ('lorem ipsum dolor sit amet ' * 12 + '\n\n').encode() * 400
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve_handler(port: int, cold: bool) -> None:
+    """把HTTP请求转换成Netlify事件交给 convert.handler"""
+    if not cold:
+        import convert
+
+    class Adapter(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _invoke(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            url = urlsplit(self.path)
+            event = {
+                'httpMethod': self.command,
+                'path': url.path,
+                'headers': {k.lower(): v for k, v in self.headers.items()},
+                'queryStringParameters': dict(parse_qsl(url.query)),
+                'body': base64.b64encode(body).decode('ascii'),
+                'isBase64Encoded': True,
+            }
+            if cold:
+                proc = subprocess.run([sys.executable, __file__, '--invoke'], input=json.dumps(event),
+                                      capture_output=True, text=True)
+                response = json.loads(proc.stdout)
+            else:
+                response = convert.handler(event, None)
+            payload = response.get('body') or ''
+            payload = base64.b64decode(payload) if response.get('isBase64Encoded') else payload.encode()
+            self.send_response(response['statusCode'])
+            for name, value in (response.get('headers') or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = _invoke
+
+    ThreadingHTTPServer(('127.0.0.1', port), Adapter).serve_forever()
+
+
+def start_server(mode: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, CONVERT_CACHE_DISABLED='1', CONVERT_SERVER_WORKERS=str(workers))
+    if mode == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'server:app', '--port', str(port), '--log-level', 'warning']
+    else:
+        cmd = [sys.executable, __file__, '--serve-handler', str(port)] + (['--cold'] if mode == 'handler-cold' else [])
+    proc = subprocess.Popen(cmd, cwd=FUNCTIONS_DIR, env=env)
+    import requests
+
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/api/status', timeout=5).status_code == 200:
+                return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def run_load(port: int, sample: bytes, filename: str, fields: dict, total: int, concurrency: int) -> dict:
+    import requests
+
+    local = threading.local()
+
+    def one(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        response = session.post(f'http://127.0.0.1:{port}/api/convert', data=fields,
+                                files={'file': (filename, sample)}, timeout=300)
+        return time.perf_counter() - start, response.status_code == 200 and response.json().get('success')
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        # 预热：连接建立、首次导入等不计入
+        list(executor.map(one, range(concurrency)))
+        start = time.perf_counter()
+        results = list(executor.map(one, range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': sum(1 for r in results if not r[1]),
+        'seconds': round(elapsed, 2),
+        'rps': round(total / elapsed, 2),
+        'p50Ms': round(statistics.median(latencies) * 1000, 1),
+        'p99Ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', default='asgi,handler')
+    parser.add_argument('--case', default='image', choices=sorted(CASES))
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='ASGI工作进程数')
+    parser.add_argument('--serve-handler', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--cold', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--invoke', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.invoke:
+        os.chdir(FUNCTIONS_DIR)
+        import convert
+
+        print(json.dumps(convert.handler(json.load(sys.stdin), None)))
+        return
+    if args.serve_handler:
+        serve_handler(args.serve_handler, args.cold)
+        return
+
+    filename, fields = CASES[args.case]
+    sample = make_sample(args.case)
+    for mode in args.modes.split(','):
+        port = _free_port()
+        proc = start_server(mode, port, args.workers)
+        try:
+            result = run_load(port, sample, filename, fields, args.requests, args.concurrency)
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(json.dumps({'mode': mode, 'case': args.case, 'sampleKb': round(len(sample) / 1024, 1), **result}),
+              flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""视频转换基准：对比原moviepy重编码路径与ffmpeg remux/转码路径的耗时和输出大小
+
+用法:
+    python benchmarks/bench_video.py --durations 10,60 --target mp4
+需要ffmpeg(系统或imageio-ffmpeg)；moviepy路径仅在安装了moviepy时运行。
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import media  # noqa: E402
+
+
+def make_source(path: Path, seconds: int) -> None:
+    """用ffmpeg的测试源生成H.264/AAC样片"""
+    media.run_ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-c:a', 'aac',
+        '-shortest', str(path),
+    ])
+
+
+def moviepy_convert(src: Path, dst: Path, target: str) -> str:
+    """原handle_media_conversion_sync的实现"""
+    import moviepy.editor as mp
+
+    clip = mp.VideoFileClip(str(src))
+    if target == 'mp4':
+        clip.write_videofile(str(dst), codec='libx264', audio_codec='aac', verbose=False, logger=None)
+    elif target == 'webm':
+        clip.write_videofile(str(dst), codec='libvpx', audio_codec='libvorbis', verbose=False, logger=None)
+    elif target == 'avi':
+        clip.write_videofile(str(dst), codec='png', audio_codec='pcm_s16le', verbose=False, logger=None)
+    else:
+        clip.write_videofile(str(dst), verbose=False, logger=None)
+    clip.close()
+    return 'moviepy'
+
+
+def timed(name: str, fn, src: Path, dst: Path) -> dict:
+    start = time.perf_counter()
+    try:
+        method = fn(src, dst)
+    except Exception as e:
+        return {'path': name, 'error': str(e)[:200]}
+    elapsed = time.perf_counter() - start
+    result = {
+        'path': name,
+        'method': method,
+        'seconds': round(elapsed, 2),
+        'outputMb': round(dst.stat().st_size / 1024 / 1024, 2),
+    }
+    dst.unlink()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--durations', default='10,60', help='样片时长(秒)，逗号分隔')
+    parser.add_argument('--source', default='mkv', help='样片容器')
+    parser.add_argument('--target', default='mp4', choices=sorted(media.VIDEO_ENCODERS))
+    parser.add_argument('--skip-moviepy', action='store_true')
+    args = parser.parse_args()
+
+    candidates = [
+        ('ffmpeg-auto', lambda s, d: media.convert_video(s, d, args.target)),
+        ('ffmpeg-transcode-fast', lambda s, d: media.convert_video(s, d, args.target, preset='fast', allow_remux=False)),
+        ('ffmpeg-transcode-balanced', lambda s, d: media.convert_video(s, d, args.target, preset='balanced', allow_remux=False)),
+    ]
+    if not args.skip_moviepy:
+        candidates.append(('moviepy', lambda s, d: moviepy_convert(s, d, args.target)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for seconds in [int(d) for d in args.durations.split(',') if d]:
+            src = Path(tmp) / f'source_{seconds}.{args.source}'
+            make_source(src, seconds)
+            for name, fn in candidates:
+                dst = Path(tmp) / f'out_{name}.{args.target}'
+                result = timed(name, fn, src, dst)
+                result.update(durationSec=seconds, sourceMb=round(src.stat().st_size / 1024 / 1024, 2))
+                print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""端到端转换基准：生成合成样本，构造multipart事件经 convert.handler 转换，记录各转换路径的
+墙钟时间、CPU时间、峰值内存和输出大小；可与保存的基线对比，发现性能回退
+
+用法:
+    python benchmarks/run.py --suite quick --repeat 3 --output baseline.json
+    python benchmarks/run.py --suite quick --compare baseline.json --threshold 0.2
+    python benchmarks/run.py --cases 'image:*' --list
+每次转换在独立子进程中运行(关闭结果缓存)，CPU时间和峰值内存包含已结束的ffmpeg等子进程
+(进程池的工作进程不计入CPU时间)。
+有回退时退出码为1；缺少ffmpeg等依赖的用例记为skipped。
+"""
+
+import argparse
+import base64
+import fnmatch
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from convertlib import documents, media  # noqa: E402
+
+BOUNDARY = '----BenchBoundaryE2EqLx7YwRkTz'
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor '
+         'incididunt ut labore et dolore magna aliqua <tag> & co').split()
+
+# 用例：名称 -> (样本, 表单字段)；样本为 (类型, 大小, 扩展名)，同一样本在各用例间复用
+SUITES = {
+    'quick': [
+        ('image:png->webp@2mp', ('image', 2, 'png'), {'conversionType': 'image', 'targetFormat': 'webp'}),
+        ('image:jpg->png@2mp', ('image', 2, 'jpg'), {'conversionType': 'image', 'targetFormat': 'png'}),
+        ('image:jpg->webp@12mp/1600w', ('image', 12, 'jpg'), {'conversionType': 'image', 'targetFormat': 'webp', 'width': '1600'}),
+        ('document:pdf->txt@50p', ('pdf', 50, 'pdf'), {'conversionType': 'document', 'targetFormat': 'txt'}),
+        ('document:pdf->docx@50p', ('pdf', 50, 'pdf'), {'conversionType': 'document', 'targetFormat': 'docx'}),
+        ('document:txt->pdf@1mb', ('txt', 1, 'txt'), {'conversionType': 'document', 'targetFormat': 'pdf'}),
+        ('document:txt->docx@1mb', ('txt', 1, 'txt'), {'conversionType': 'document', 'targetFormat': 'docx'}),
+        ('document:docx->pdf@1mb', ('docx', 1, 'docx'), {'conversionType': 'document', 'targetFormat': 'pdf'}),
+        ('document:docx->txt@1mb', ('docx', 1, 'docx'), {'conversionType': 'document', 'targetFormat': 'txt'}),
+        ('audio:wav->mp3@30s', ('audio', 30, 'wav'), {'conversionType': 'audio', 'targetFormat': 'mp3'}),
+        ('video:mp4->webm@10s', ('video', 10, 'mp4'), {'conversionType': 'video', 'targetFormat': 'webm'}),
+        ('video:mp4->mov@10s', ('video', 10, 'mp4'), {'conversionType': 'video', 'targetFormat': 'mov'}),
+    ],
+    'full': [
+        ('image:png->webp@12mp', ('image', 12, 'png'), {'conversionType': 'image', 'targetFormat': 'webp'}),
+        ('image:jpg->jpg@48mp/1600w', ('image', 48, 'jpg'), {'conversionType': 'image', 'targetFormat': 'jpg', 'width': '1600'}),
+        ('image:tif->png@48mp', ('image', 48, 'tif'), {'conversionType': 'image', 'targetFormat': 'png'}),
+        ('document:pdf->txt@500p', ('pdf', 500, 'pdf'), {'conversionType': 'document', 'targetFormat': 'txt'}),
+        ('document:txt->pdf@20mb', ('txt', 20, 'txt'), {'conversionType': 'document', 'targetFormat': 'pdf'}),
+        ('document:docx->pdf@10mb', ('docx', 10, 'docx'), {'conversionType': 'document', 'targetFormat': 'pdf'}),
+        ('audio:wav->mp3@600s', ('audio', 600, 'wav'), {'conversionType': 'audio', 'targetFormat': 'mp3'}),
+        ('video:mp4->webm@60s', ('video', 60, 'mp4'), {'conversionType': 'video', 'targetFormat': 'webm'}),
+        ('video:mp4->avi@60s', ('video', 60, 'mp4'), {'conversionType': 'video', 'targetFormat': 'avi'}),
+    ],
+}
+SUITES['full'] = SUITES['quick'] + SUITES['full']
+
+# 对比基线时忽略的小幅变化，避免把计时噪声当成回退
+MIN_SECONDS_DELTA = 0.05
+MIN_RSS_DELTA_MB = 8
+
+
+def _write_text(path: Path, size_mb: float, seed: int = 0) -> None:
+    """段落长度不一的英文文本，含需要转义的 < > &"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target:
+            paragraph = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 120))) + '\n\n'
+            f.write(paragraph)
+            written += len(paragraph)
+
+
+def make_fixture(directory: Path, kind: str, size: int, ext: str) -> Path:
+    """生成样本：image按百万像素，pdf按页数，txt/docx按MB，audio/video按秒"""
+    path = directory / f'{kind}_{size}.{ext}'
+    if path.exists():
+        return path
+    if kind == 'image':
+        from PIL import Image
+
+        width = int((size * 1_000_000 * 4 / 3) ** 0.5)
+        height = size * 1_000_000 // width
+        # 分形加噪声，避免编码器遇到大片纯色走捷径
+        img = Image.effect_mandelbrot((width, height), (-2.0, -1.2, 1.0, 1.2), 64).convert('RGB')
+        noise = Image.effect_noise((width, height), 24).convert('RGB')
+        Image.blend(img, noise, 0.25).save(path, quality=90)
+    elif kind == 'pdf':
+        # 约每页60行
+        text = directory / f'pdf_source_{size}.txt'
+        rng = random.Random(size)
+        with open(text, 'w', encoding='utf-8') as f:
+            for _ in range(size * 60):
+                f.write(' '.join(rng.choice(WORDS) for _ in range(12)) + '\n')
+        documents.text_to_pdf(text, path)
+        text.unlink()
+    elif kind == 'txt':
+        _write_text(path, size)
+    elif kind == 'docx':
+        text = directory / f'docx_source_{size}.txt'
+        _write_text(text, size, seed=1)
+        documents.text_to_docx(text, path)
+        text.unlink()
+    elif kind == 'audio':
+        media.run_ffmpeg([
+            '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={size}',
+            '-ac', '2', str(path),
+        ])
+    elif kind == 'video':
+        media.run_ffmpeg([
+            '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={size}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={size}',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', str(path),
+        ])
+    else:
+        raise ValueError(f'Unknown fixture kind: {kind}')
+    return path
+
+
+def missing_dependency(kind: str):
+    if kind in ('audio', 'video') and not media.ffmpeg_exe():
+        return 'ffmpeg not found'
+    return None
+
+
+def make_event(src: Path, fields: dict) -> dict:
+    """与API网关一致的base64编码multipart事件"""
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{src.name}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode()
+    )
+    body = b''.join(parts) + src.read_bytes() + f'\r\n--{BOUNDARY}--\r\n'.encode()
+    return {
+        'httpMethod': 'POST',
+        'path': '/api/convert',
+        'headers': {'content-type': f'multipart/form-data; boundary={BOUNDARY}'},
+        'body': base64.b64encode(body).decode('ascii'),
+        'isBase64Encoded': True,
+    }
+
+
+def _rss_kb(field: str) -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_single(src: Path, fields: dict) -> dict:
+    """子进程内：一次端到端转换"""
+    # 结果缓存会让重复运行直接命中
+    os.environ['CONVERT_CACHE_DISABLED'] = '1'
+    import convert
+
+    event = make_event(src, fields)
+    # ru_maxrss会跨exec继承父进程的峰值，改为重置VmHWM后测量
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    cpu_start = _cpu_seconds()
+    start = time.perf_counter()
+    response = convert.handler(event, None)
+    elapsed = time.perf_counter() - start
+    cpu = _cpu_seconds() - cpu_start
+
+    body = json.loads(response.get('body') or '{}')
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    result = {
+        'statusCode': response['statusCode'],
+        'wallSeconds': round(elapsed, 3),
+        'cpuSeconds': round(cpu, 3),
+        'peakRssMb': round(max(_rss_kb('VmHWM'), children_kb) / 1024, 1),
+        'inputKb': round(src.stat().st_size / 1024, 1),
+        'outputKb': round(body['fileSize'] / 1024, 1) if 'fileSize' in body else None,
+    }
+    if response['statusCode'] != 200:
+        result['error'] = body.get('error', 'failed')
+    if body.get('fileName'):
+        convert.ARTIFACTS.discard(body['fileName'])
+    return result
+
+
+def run_case(name: str, src: Path, fields: dict, repeat: int) -> dict:
+    """重复运行取中位数；峰值内存取最大值"""
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, __file__, '--run', str(src), json.dumps(fields)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            error = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+            return {'case': name, 'error': error}
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        if run.get('error'):
+            return {'case': name, 'statusCode': run['statusCode'], 'error': run['error']}
+        runs.append(run)
+    return {
+        'case': name,
+        'runs': len(runs),
+        'wallSeconds': round(statistics.median(r['wallSeconds'] for r in runs), 3),
+        'wallMinSeconds': min(r['wallSeconds'] for r in runs),
+        'cpuSeconds': round(statistics.median(r['cpuSeconds'] for r in runs), 3),
+        'peakRssMb': max(r['peakRssMb'] for r in runs),
+        'inputKb': runs[0]['inputKb'],
+        'outputKb': runs[-1]['outputKb'],
+    }
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    """与基线对比，返回超过阈值的指标"""
+    regressions = []
+    checks = (
+        ('wallSeconds', MIN_SECONDS_DELTA),
+        ('cpuSeconds', MIN_SECONDS_DELTA),
+        ('peakRssMb', MIN_RSS_DELTA_MB),
+    )
+    for metric, min_delta in checks:
+        old, new = baseline.get(metric), result.get(metric)
+        if old is None or new is None:
+            continue
+        if new > old * (1 + threshold) and new - old > min_delta:
+            regressions.append({'metric': metric, 'baseline': old, 'current': new,
+                                'ratio': round(new / old, 2) if old else None})
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suite', default='quick', choices=sorted(SUITES))
+    parser.add_argument('--cases', default='*', help='按名称过滤用例的通配符，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='把结果写入JSON文件(可作为之后的基线)')
+    parser.add_argument('--compare', help='基线JSON文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='相对基线变慢/变大超过该比例记为回退')
+    parser.add_argument('--fixtures', help='样本目录(保留以便复用)；默认使用临时目录')
+    parser.add_argument('--list', action='store_true', help='只列出用例')
+    parser.add_argument('--run', nargs=2, metavar=('SRC', 'FIELDS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        src, fields = args.run
+        print(json.dumps(run_single(Path(src), json.loads(fields))))
+        return
+
+    patterns = [p for p in args.cases.split(',') if p]
+    cases = [case for case in SUITES[args.suite] if any(fnmatch.fnmatch(case[0], p) for p in patterns)]
+    if args.list:
+        for name, fixture, fields in cases:
+            print(name)
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r['case']: r for r in json.load(f)['results'] if 'wallSeconds' in r}
+
+    results = []
+    regressed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir = Path(args.fixtures or tmp)
+        fixture_dir.mkdir(parents=True, exist_ok=True)
+        for name, (kind, size, ext), fields in cases:
+            missing = missing_dependency(kind)
+            if missing:
+                result = {'case': name, 'skipped': missing}
+            else:
+                src = make_fixture(fixture_dir, kind, size, ext)
+                result = run_case(name, src, fields, args.repeat)
+            if name in baseline and 'wallSeconds' in result:
+                result['regressions'] = compare(result, baseline[name], args.threshold)
+                regressed = regressed or bool(result['regressions'])
+            print(json.dumps(result), flush=True)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'suite': args.suite,
+                'repeat': args.repeat,
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'cpus': os.cpu_count(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'results': results,
+            }, f, indent=2)
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
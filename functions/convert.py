@@ -1,83 +1,191 @@
+import time
+
+_MODULE_START = time.perf_counter()
+
 import base64
-from PIL import Image
-import docx
-from docx.shared import Inches
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-import moviepy.editor as mp
-from pydub import AudioSegment
-import cv2
-import requests
-from bs4 import BeautifulSoup
-import yt_dlp
+import functools
+import json
+import math
+import mimetypes
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict
+
+# 重量级依赖(PIL、moviepy、yt_dlp等)在各转换路径中按需加载
+from convertlib import artifacts, batch, cache, crawl, documents, downloads, fetch, frames, images, jobs, lazy, media, multipart, pdf, sniff, tracing, uploads, webpage, ytdl
 
 # 简化版 - 使用标准库
 app = None
 
 # 上传目录 - 使用/tmp在Netlify Functions中
 UPLOAD_DIR = Path("/tmp/uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+
+# 转换产物 - 原子写入，下载链接在TTL内有效，总大小超过上限时按最近访问淘汰；
+# 上传的输入文件请求结束即删除，残留文件由后台清理线程处理
+ARTIFACTS = artifacts.ArtifactStore(
+    UPLOAD_DIR,
+    ttl=float(os.environ.get('CONVERT_ARTIFACT_TTL', '3600')),
+    max_bytes=int(os.environ.get('CONVERT_ARTIFACT_MAX_MB', '1024')) * 1024 * 1024,
+    sweep_interval=float(os.environ.get('CONVERT_ARTIFACT_SWEEP_INTERVAL', '60')),
+)
+
+# 分块上传 - 超过单次请求大小上限的文件分块上传，可断点续传；进行中的上传放在产物目录的.partial下
+UPLOADS = uploads.ChunkedUploads(
+    UPLOAD_DIR / artifacts.PARTIAL_DIR,
+    chunk_size=int(float(os.environ.get('CONVERT_UPLOAD_CHUNK_MB', '4')) * 1024 * 1024),
+    max_bytes=int(os.environ.get('CONVERT_UPLOAD_MAX_MB', '4096')) * 1024 * 1024,
+)
+# 清理线程删除过期的上传后，一并丢弃它们在内存中的哈希状态和锁
+ARTIFACTS.add_sweep_hook(lambda live: UPLOADS.prune())
+
+# 转换结果缓存 - 放在UPLOAD_DIR之外，请求结束后仍然保留
+RESULT_CACHE = cache.ResultCache(
+    Path(os.environ.get('CONVERT_CACHE_DIR', '/tmp/convert-cache')),
+    max_bytes=int(os.environ.get('CONVERT_CACHE_MAX_MB', '512')) * 1024 * 1024,
+    enabled=os.environ.get('CONVERT_CACHE_DISABLED', '') not in ('1', 'true'),
+)
+
+# 截帧缓存 - 按输入哈希和时间戳保存截出的帧，同一视频再次生成缩略图、雪碧图或预览时不再启动ffmpeg
+FRAME_CACHE = frames.FrameCache(
+    Path(os.environ.get('CONVERT_FRAME_CACHE_DIR', '/tmp/convert-frames')),
+    max_bytes=int(os.environ.get('CONVERT_FRAME_CACHE_MAX_MB', '128')) * 1024 * 1024,
+    enabled=os.environ.get('CONVERT_FRAME_CACHE_DISABLED', '') not in ('1', 'true'),
+)
+
+# 网页抓取 - 连接池跨调用复用，可缓存的响应按HTTP缓存语义保存在磁盘上
+FETCHER = fetch.Fetcher(
+    fetch.HttpCache(
+        Path(os.environ.get('CONVERT_FETCH_CACHE_DIR', '/tmp/convert-fetch-cache')),
+        max_bytes=int(os.environ.get('CONVERT_FETCH_CACHE_MAX_MB', '128')) * 1024 * 1024,
+        enabled=os.environ.get('CONVERT_FETCH_CACHE_DISABLED', '') not in ('1', 'true'),
+    ),
+    max_bytes=int(os.environ.get('CONVERT_FETCH_MAX_MB', '10')) * 1024 * 1024,
+    deadline=float(os.environ.get('CONVERT_FETCH_DEADLINE', '30')),
+)
+
+# yt-dlp 信息提取缓存 - 按视频id，probe之后的下载不再重复提取
+YTDL_INFO_CACHE = ytdl.InfoCache(
+    Path(os.environ.get('CONVERT_YTDL_CACHE_DIR', '/tmp/convert-ytdl-info')),
+    ttl=float(os.environ.get('CONVERT_YTDL_INFO_TTL', '1800')),
+    enabled=os.environ.get('CONVERT_YTDL_CACHE_DISABLED', '') not in ('1', 'true'),
+)
+YTDL_FRAGMENTS = int(os.environ.get('CONVERT_YTDL_FRAGMENTS', '4'))
+YTDL_RATE_LIMIT = os.environ.get('CONVERT_YTDL_RATE_LIMIT', '')
+YTDL_THROTTLED_RATE = os.environ.get('CONVERT_YTDL_THROTTLED_RATE', '100K')
+
+# 整站抓取的上限
+CRAWL_MAX_PAGES = int(os.environ.get('CONVERT_CRAWL_MAX_PAGES', '500'))
+CRAWL_MAX_CONCURRENCY = int(os.environ.get('CONVERT_CRAWL_MAX_CONCURRENCY', '16'))
+CRAWL_PER_HOST = int(os.environ.get('CONVERT_CRAWL_PER_HOST', '4'))
+CRAWL_DELAY = float(os.environ.get('CONVERT_CRAWL_DELAY', '0.2'))
+CRAWL_DEADLINE = float(os.environ.get('CONVERT_CRAWL_DEADLINE', '600'))
+
+# 函数响应体(base64)中单次最多返回的字节数；更大的产物重定向到对象存储的预签名链接，
+# 未配置对象存储地址时返回413，客户端需用Range分段下载或改用服务模式(server.py流式返回)
+DOWNLOAD_REDIRECT_BYTES = int(float(os.environ.get('CONVERT_DOWNLOAD_REDIRECT_MB', '4')) * 1024 * 1024)
+
+# 对象存储的下载地址前缀，如 https://files.example.com/api/objects/ ；由共享 CONVERT_OBJECT_DIR 和
+# CONVERT_SIGNING_KEY 的 server.py 实例流式提供。对象是产物的硬链接，随产物一起被清理
+OBJECT_URL = os.environ.get('CONVERT_OBJECT_URL', '')
+OBJECT_STORE = downloads.LocalObjectStore(
+    Path(os.environ.get('CONVERT_OBJECT_DIR', '/tmp/convert-objects')),
+    url_prefix=OBJECT_URL or '/api/objects/',
+)
+ARTIFACTS.add_sweep_hook(OBJECT_STORE.prune)
+
+# 异步任务队列 - 长时间的音视频转换在后台线程中执行，通过 /api/jobs/<id> 查询
+JOB_QUEUE = jobs.JobQueue(
+    jobs.SQLiteJobStore(Path(os.environ.get('CONVERT_JOB_DB', '/tmp/convert-jobs.sqlite3'))),
+    max_workers=int(os.environ.get('CONVERT_JOB_WORKERS', '2')),
+)
+# 结束的任务保留多久(秒)，默认与产物相同；过期后 /api/jobs/<id> 返回404
+JOB_TTL = float(os.environ.get('CONVERT_JOB_TTL', os.environ.get('CONVERT_ARTIFACT_TTL', '3600')))
+ARTIFACTS.add_sweep_hook(lambda live: JOB_QUEUE.prune(JOB_TTL))
+
+# 可通过 CONVERT_WARMUP 环境变量在冷启动时预先导入后端
+WARMUP_RESULTS = lazy.warm_up_from_env()
+
+# 模块自身的加载耗时(含预热)
+STARTUP_MS = round((time.perf_counter() - _MODULE_START) * 1000, 2)
 
 def get_file_type(filename: str) -> str:
     ext = filename.lower().split('.')[-1] if '.' in filename else ''
+    return sniff.FORMAT_KINDS.get(ext, 'other')
+
+def conversion_kind(source_format: str, target_format: str, fallback_kind: str = None):
+    """根据真实源格式和目标格式选出转换路径(image/document/audio/video)，不支持时返回None"""
+    target = target_format.lower()
+    kind = sniff.FORMAT_KINDS.get(source_format)
+    if kind is None:
+        # 未识别的格式按客户端声明的类型交给PIL/ffmpeg尝试；文档必须识别出格式
+        kind = fallback_kind if fallback_kind in ('image', 'audio', 'video') else None
     
-    image_exts = ['jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp']
-    document_exts = ['pdf', 'doc', 'docx', 'txt', 'html']
-    audio_exts = ['mp3', 'wav', 'flac', 'aac', 'ogg', 'm4a']
-    video_exts = ['mp4', 'avi', 'mkv', 'mov', 'webm', 'flv']
-    
-    if ext in image_exts:
-        return 'image'
-    elif ext in document_exts:
-        return 'document'
-    elif ext in audio_exts:
-        return 'audio'
-    elif ext in video_exts:
+    if kind == 'image':
+        return 'image' if target in images.SAVE_OPTIONS else None
+    if kind == 'document':
+        return 'document' if (source_format, target) in DOCUMENT_CONVERTERS else None
+    if kind == 'video' and target in media.VIDEO_ENCODERS:
         return 'video'
-    return 'other'
+    if kind in ('audio', 'video') and target in media.AUDIO_ENCODERS:
+        # 视频转音频格式时只提取音轨
+        return 'audio'
+    return None
 
 def get_mime_type(filename: str) -> str:
     mime_type, _ = mimetypes.guess_type(filename)
     return mime_type or 'application/octet-stream'
 
+# 指标里出现的路由(前两级路径)和方法；其余的统一记为other，客户端路径不会产生新的时间序列
+TRACE_ROUTES = {
+    '/api/convert', '/api/uploads', '/api/jobs', '/api/download', '/api/objects',
+    '/api/status', '/api/metrics', '/api/warmup',
+}
+TRACE_METHODS = {'GET', 'POST', 'OPTIONS', 'HEAD'}
+
+def trace_route(event) -> str:
+    """指标里的路由标签：只取前两级路径，不包含文件名、任务id；未知路由和方法记为other"""
+    route = '/'.join((event.get('path') or '').split('/')[:3])
+    method = event.get('httpMethod', '')
+    return f"{method if method in TRACE_METHODS else 'OTHER'} {route if route in TRACE_ROUTES else 'other'}"
+
 def handler(event, context):
     """Netlify函数入口"""
     
-    try:
-        # 解析请求
-        if event.get('httpMethod') == 'GET':
-            return handle_get(event)
-        elif event.get('httpMethod') == 'POST':
-            return handle_post(event)
-        else:
-            return {
-                'statusCode': 405,
+    ARTIFACTS.start_sweeper()
+    # 分阶段计时，结果放在Server-Timing响应头里
+    with tracing.request(trace_route(event)) as trace:
+        query = event.get('queryStringParameters') or {}
+        trace.include_json = query.get('trace') == 'true'
+        try:
+            # 解析请求
+            if event.get('httpMethod') == 'GET':
+                response = handle_get(event)
+            elif event.get('httpMethod') == 'POST':
+                response = handle_post(event)
+            else:
+                response = {
+                    'statusCode': 405,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Headers': 'Content-Type',
+                    },
+                    'body': json.dumps({'error': 'Method not allowed'})
+                }
+        
+        except Exception as e:
+            response = {
+                'statusCode': 500,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*',
                     'Access-Control-Allow-Headers': 'Content-Type',
                 },
-                'body': json.dumps({'error': 'Method not allowed'})
+                'body': json.dumps({'error': f'Server error: {str(e)}'})
             }
-    
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-            },
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
-    
-    finally:
-        # 清理临时文件
-        try:
-            if UPLOAD_DIR.exists():
-                shutil.rmtree(UPLOAD_DIR)
-        except:
-            pass
+        return tracing.finish(trace, response)
 
 def handle_get(event):
     """处理GET请求"""
@@ -92,6 +200,15 @@ def handle_get(event):
             "yt_dlp": shutil.which('yt-dlp') is not None,
             "python_imaging": True,
             "pypdf2": True,
+            "startupMs": STARTUP_MS,
+            "warmup": WARMUP_RESULTS,
+            "imports": lazy.import_report(),
+            "cache": RESULT_CACHE.stats(),
+            "frameCache": FRAME_CACHE.stats(),
+            "fetch": FETCHER.stats(),
+            "artifacts": ARTIFACTS.stats(),
+            "uploads": UPLOADS.stats(),
+            "ytdlInfoCache": YTDL_INFO_CACHE.stats(),
         }
         
         return {
@@ -103,39 +220,143 @@ def handle_get(event):
             'body': json.dumps(status)
         }
     
-    elif path.startswith('/api/download/'):
-        # 文件下载 - 直接返回文件内容
-        filename = path.split('/api/download/')[-1]
-        file_path = UPLOAD_DIR / filename
+    elif path == '/api/metrics':
+        # 各阶段耗时直方图，Prometheus文本格式
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+                'Access-Control-Allow-Origin': '*',
+                'Cache-Control': 'no-cache',
+            },
+            'body': tracing.METRICS.render()
+        }
+    
+    elif path == '/api/warmup':
+        # 预热钩子 - 例如 /api/warmup?groups=image,document
+        query = event.get('queryStringParameters') or {}
+        groups_param = query.get('groups', 'all')
+        groups = list(lazy.BACKENDS) if groups_param == 'all' else [g.strip() for g in groups_param.split(',') if g.strip()]
         
-        if not file_path.exists():
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'warmup': lazy.warm_up(groups),
+                'imports': lazy.import_report(),
+            })
+        }
+    
+    elif path.startswith('/api/uploads/'):
+        # 分块上传的进度，客户端据此从offset处续传
+        upload_id = path.split('/api/uploads/')[-1]
+        try:
+            status = UPLOADS.status(upload_id)
+        except uploads.UploadNotFound:
             return {
                 'statusCode': 404,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*',
                 },
-                'body': json.dumps({'error': 'File not found'})
+                'body': json.dumps({'error': 'Upload not found'})
             }
         
-        # 读取文件
-        with open(file_path, 'rb') as f:
-            file_content = f.read()
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Cache-Control': 'no-cache',
+            },
+            'body': json.dumps(status)
+        }
+    
+    elif path.startswith('/api/jobs/'):
+        # 异步任务状态
+        job_id = path.split('/api/jobs/')[-1]
+        job = JOB_QUEUE.get(job_id)
         
-        mime_type = get_mime_type(filename)
+        if not job:
+            return {
+                'statusCode': 404,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                },
+                'body': json.dumps({'error': 'Job not found'})
+            }
         
         return {
             'statusCode': 200,
             'headers': {
-                'Content-Type': mime_type,
-                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*',
                 'Cache-Control': 'no-cache',
             },
-            'body': base64.b64encode(file_content).decode('utf-8'),
-            'isBase64Encoded': True
+            'body': json.dumps(job)
         }
     
+    elif path.startswith('/api/download/'):
+        # 文件下载 - 支持Range和条件请求，大文件重定向到对象存储
+        filename = path.split('/api/download/')[-1]
+        file_path = ARTIFACTS.open(filename)
+        
+        if file_path is None:
+            return {
+                'statusCode': 404,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                },
+                'body': json.dumps({'error': 'File not found'})
+            }
+        
+        if OBJECT_URL and file_path.stat().st_size > DOWNLOAD_REDIRECT_BYTES:
+            OBJECT_STORE.put(file_path, filename)
+            return {
+                'statusCode': 302,
+                'headers': {
+                    'Location': OBJECT_STORE.presign(filename),
+                    'Access-Control-Allow-Origin': '*',
+                    'Cache-Control': 'no-cache',
+                },
+                'body': ''
+            }
+        
+        return serve_file(event, file_path, filename)
+    
+    elif path.startswith('/api/objects/'):
+        # 预签名的对象存储下载；大对象由 server.py 流式返回，这里同样受响应体大小限制
+        filename = path.split('/api/objects/')[-1]
+        query = event.get('queryStringParameters') or {}
+        object_path = OBJECT_STORE.path_for(filename)
+        
+        if not OBJECT_STORE.verify(filename, query.get('expires'), query.get('signature')):
+            return {
+                'statusCode': 403,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                },
+                'body': json.dumps({'error': 'Invalid or expired signature'})
+            }
+        
+        if not object_path.is_file():
+            return {
+                'statusCode': 404,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                },
+                'body': json.dumps({'error': 'File not found'})
+            }
+        
+        return serve_file(event, object_path, filename)
+    
     else:
         return {
             'statusCode': 404,
@@ -146,6 +367,69 @@ def handle_get(event):
             'body': json.dumps({'error': 'Not found'})
         }
 
+def serve_file(event, file_path: Path, filename: str):
+    """返回文件内容，处理If-None-Match/If-Modified-Since和单段Range"""
+    
+    request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    stat = file_path.stat()
+    etag = downloads.etag_for(stat)
+    
+    headers = {
+        'Content-Type': get_mime_type(filename),
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Access-Control-Allow-Origin': '*',
+        'Cache-Control': 'no-cache',
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': downloads.last_modified_for(stat),
+    }
+    
+    if downloads.is_not_modified(request_headers, etag, stat):
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
+    
+    try:
+        byte_range = downloads.parse_range(request_headers, stat.st_size, etag)
+    except downloads.RangeNotSatisfiable:
+        headers['Content-Range'] = f'bytes */{stat.st_size}'
+        return {'statusCode': 416, 'headers': headers, 'body': ''}
+    
+    if byte_range:
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        status_code = 206
+    else:
+        start, end = 0, stat.st_size - 1
+        status_code = 200
+    
+    if end - start + 1 > DOWNLOAD_REDIRECT_BYTES:
+        return {
+            'statusCode': 413,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Accept-Ranges': 'bytes',
+            },
+            'body': json.dumps({
+                'error': f'File exceeds the inline download limit of {DOWNLOAD_REDIRECT_BYTES} bytes; '
+                         'request it in byte ranges or download it from the streaming server',
+                'size': stat.st_size,
+                'maxBytes': DOWNLOAD_REDIRECT_BYTES,
+            })
+        }
+    
+    # 只读取请求的区间
+    with tracing.stage('read', end - start + 1 if stat.st_size else 0):
+        content = downloads.read_range(file_path, start, end) if stat.st_size else b''
+    with tracing.stage('encode', len(content)):
+        body = base64.b64encode(content).decode('utf-8')
+    
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': body,
+        'isBase64Encoded': True
+    }
+
 def handle_post(event):
     """处理POST请求"""
     
@@ -154,6 +438,15 @@ def handle_post(event):
     if path == '/api/convert':
         return handle_convert(event)
     
+    elif path == '/api/uploads':
+        return handle_upload_start(event)
+    
+    elif path.startswith('/api/uploads/') and path.endswith('/complete'):
+        return handle_upload_complete(event, path[len('/api/uploads/'):-len('/complete')])
+    
+    elif path.startswith('/api/uploads/'):
+        return handle_upload_chunk(event, path.split('/api/uploads/')[-1])
+    
     else:
         return {
             'statusCode': 404,
@@ -169,18 +462,9 @@ def handle_convert(event):
     """处理文件转换"""
     
     try:
-        # 解析multipart/form-data
-        body = event.get('body', '')
-        is_base64 = event.get('isBase64Encoded', False)
-        
-        if is_base64:
-            body = base64.b64decode(body)
-        else:
-            body = body.encode() if isinstance(body, str) else body
-        
         content_type = event.get('headers', {}).get('content-type', '')
         
-        if not body or 'multipart/form-data' not in content_type:
+        if not event.get('body') or 'multipart/form-data' not in content_type:
             return {
                 'statusCode': 400,
                 'headers': {
@@ -190,13 +474,7 @@ def handle_convert(event):
                 'body': json.dumps({'error': 'Invalid content type'})
             }
         
-        # 简单的multipart解析 - 查找boundary
-        boundary = None
-        for part in content_type.split(';'):
-            part = part.strip()
-            if part.startswith('boundary='):
-                boundary = part.split('=', 1)[1].strip('"')
-                break
+        boundary = multipart.parse_boundary(content_type)
         
         if not boundary:
             return {
@@ -208,193 +486,619 @@ def handle_convert(event):
                 'body': json.dumps({'error': 'No boundary found'})
             }
         
-        # 解析parts
-        parts = body.split(f'--{boundary}'.encode())
-        file_data = None
-        conversion_type = 'document'
-        operation = 'convert'
-        target_format = 'docx'
-        video_url = None
-        webpage_url = None
-        
-        for part in parts:
-            if b'Content-Disposition' in part:
-                lines = part.split(b'\r\n')
-                headers = {}
-                body_start = 0
-                
-                for i, line in enumerate(lines):
-                    if line.startswith(b'Content-Disposition'):
-                        # 解析Content-Disposition
-                        disp = line.decode()
-                        if 'name="file"' in disp:
-                            # 文件部分
-                            for j in range(i+1, len(lines)):
-                                if lines[j].strip() == b'':
-                                    body_start = j+1
-                                    break
-                            file_data = b'\r\n'.join(lines[body_start:-1])  # 去掉最后的\r\n
-                        elif 'name="conversionType"' in disp:
-                            for j in range(i+1, len(lines)):
-                                if lines[j].strip() == b'':
-                                    body_start = j+1
-                                    break
-                            conversion_type = b'\r\n'.join(lines[body_start:-1]).decode().strip()
-                        elif 'name="operation"' in disp:
-                            for j in range(i+1, len(lines)):
-                                if lines[j].strip() == b'':
-                                    body_start = j+1
-                                    break
-                            operation = b'\r\n'.join(lines[body_start:-1]).decode().strip()
-                        elif 'name="targetFormat"' in disp:
-                            for j in range(i+1, len(lines)):
-                                if lines[j].strip() == b'':
-                                    body_start = j+1
-                                    break
-                            target_format = b'\r\n'.join(lines[body_start:-1]).decode().strip()
-                        elif 'name="videoUrl"' in disp:
-                            for j in range(i+1, len(lines)):
-                                if lines[j].strip() == b'':
-                                    body_start = j+1
-                                    break
-                            video_url = b'\r\n'.join(lines[body_start:-1]).decode().strip()
-                        elif 'name="webpageUrl"' in disp:
-                            for j in range(i+1, len(lines)):
-                                if lines[j].strip() == b'':
-                                    body_start = j+1
-                                    break
-                            webpage_url = b'\r\n'.join(lines[body_start:-1]).decode().strip()
-        
         # 生成唯一文件名
         file_id = str(uuid.uuid4())
+        parser = upload_parser(boundary, file_id)
         
-        # 处理转换
-        conversion_params = {
-            'operation': operation,
-            'targetFormat': target_format,
-            'conversionType': conversion_type
-        }
+        # 增量解析multipart，不整体复制请求体
+        try:
+            # decode为base64解码，parse为边界扫描(写盘单独记为write)
+            for chunk in tracing.timed_iter('decode', multipart.iter_event_body(event)):
+                with tracing.stage('parse', len(chunk)):
+                    parser.feed(chunk)
+            with tracing.stage('parse'):
+                parser.close()
+        except ValueError as e:
+            # MultipartError、格式不支持以及 base64 解码错误
+            return upload_error_response(parser, e)
         
-        if video_url:
-            conversion_params['videoUrl'] = video_url
-        if webpage_url:
-            conversion_params['webpageUrl'] = webpage_url
+        response, call = plan_conversion(parser.files, parser.fields, file_id)
+        if response:
+            return response
         
-        # 对于需要文件的操作
-        if operation in ['convert'] and not file_data:
+        # 同步调用转换函数
+        fn, args, kwargs = call
+        return discarding_uploads(parser.files, fn, *args, **kwargs)
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'error': f'Conversion failed: {str(e)}'})
+        }
+
+def upload_parser(boundary: str, file_id: str) -> multipart.MultipartParser:
+    """增量multipart解析器：文件part边接收边写入磁盘，收到文件头后先识别格式"""
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    
+    def file_factory(field_name, filename, part_type):
+        index = len(parser.files)
+        stored_name = f"upload_{file_id}.bin" if index == 0 else f"upload_{file_id}_{index}.bin"
+        upload = multipart.UploadedFile(field_name, filename, part_type, UPLOAD_DIR / stored_name)
+        return multipart.FileSink(upload, sniff.SNIFF_BYTES, on_head=check_upload)
+    
+    def check_upload(upload, head):
+        # 按真实格式命名，目标格式已知时在写盘前拒绝不可能的转换
+        source_format = sniff.sniff(head)
+        if source_format:
+            upload.path = upload.path.with_suffix(f".{source_format}")
+        fields = parser.fields
+        if fields.get('operation', 'convert') == 'convert' and fields.get('targetFormat'):
+            if not conversion_kind(source_format or '', fields['targetFormat'], fields.get('conversionType')):
+                raise sniff.UnsupportedConversion(
+                    f"Unsupported conversion: {source_format or 'unknown format'} to {fields['targetFormat']}"
+                )
+    
+    parser = multipart.MultipartParser(boundary, file_factory)
+    return parser
+
+def upload_error_response(parser: multipart.MultipartParser, error: ValueError):
+    """上传解析失败：关闭并删除已写入的文件，格式不支持返回415，请求体错误返回400"""
+    parser.abort()
+    
+    if isinstance(error, sniff.UnsupportedConversion):
+        return {
+            'statusCode': 415,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': str(error)})
+        }
+    
+    return {
+        'statusCode': 400,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+        },
+        'body': json.dumps({'error': f'Invalid multipart body: {str(error)}'})
+    }
+
+def plan_conversion(files, fields: Dict, file_id: str):
+    """按上传的文件和表单字段决定如何处理
+
+    返回 (响应, None)：参数错误或已放入任务队列；
+    返回 (None, (fn, args, kwargs))：由调用方执行 discarding_uploads(files, fn, *args, **kwargs)。
+    """
+    upload = next((f for f in files if f.field_name == 'file' and f.size > 0), None)
+    
+    # 处理转换 - 其余非空字段(videoUrl、noCache等)原样传给转换函数
+    conversion_params = {k: v for k, v in fields.items() if v}
+    conversion_params.setdefault('operation', 'convert')
+    if conversion_params['operation'] not in frames.FORMATS:
+        # 截帧操作的默认输出格式由操作决定
+        conversion_params.setdefault('targetFormat', 'docx')
+    conversion_params.setdefault('conversionType', 'document')
+    operation = conversion_params['operation']
+    trace = tracing.current()
+    if trace and conversion_params.get('trace') == 'true':
+        trace.include_json = True
+    
+    # 批量转换 - 多个file/files部分并行处理
+    if operation == 'batch':
+        batch_files = [f for f in files if f.field_name in ('file', 'files') and f.size > 0]
+        return queue_or_call(operation, files, conversion_params,
+                             (handle_batch_conversion_sync, (batch_files, conversion_params, file_id), {}))
+    
+    # 合并PDF - 多个file/files部分按上传顺序合并
+    if operation == 'merge':
+        merge_files = [(f.path, f.filename) for f in files if f.field_name in ('file', 'files') and f.size > 0]
+        return queue_or_call(operation, files, conversion_params,
+                             (handle_pdf_merge_sync, (merge_files, conversion_params, file_id), {}))
+    
+    # 对于需要文件的操作
+    if operation in ['convert'] and not upload:
+        for f in files:
+            f.path.unlink(missing_ok=True)
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'error': 'No file uploaded'})
+        }, None
+    
+    if upload:
+        original_filename = upload.path.name
+        file_path = upload.path
+        file_type = get_file_type(original_filename)
+    else:
+        file_path = None
+        file_type = conversion_params['conversionType']
+    
+    args = (
+        file_path,
+        original_filename if upload else f"url_{file_id}",
+        conversion_params, file_id, file_type,
+    )
+    kwargs = {'input_hash': upload.sha256 if upload else None}
+    return queue_or_call(operation, files, conversion_params, (handle_conversion_sync, args, kwargs))
+
+def queue_or_call(operation: str, files, conversion_params: Dict, call):
+    """async=true 时放入任务队列，立即返回任务id；否则把调用交给调用方执行"""
+    if conversion_params.get('async') == 'true':
+        fn, args, kwargs = call
+        job = JOB_QUEUE.submit(operation, discarding_uploads, files, fn, *args, **kwargs)
+        return {
+            'statusCode': 202,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'success': True,
+                'jobId': job['id'],
+                'statusUrl': f"/api/jobs/{job['id']}",
+                'state': job['state']
+            })
+        }, None
+    
+    return None, call
+
+def read_json_body(event) -> Dict:
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded', False):
+        body = base64.b64decode(body)
+    value = json.loads(body or '{}')
+    if not isinstance(value, dict):
+        raise ValueError('JSON body must be an object')
+    return value
+
+def upload_error(error: Exception):
+    """分块上传的错误 -> 响应；偏移量不一致时带上服务端已接收的字节数"""
+    if isinstance(error, uploads.UploadNotFound):
+        status_code, body = 404, {'error': 'Upload not found'}
+    elif isinstance(error, uploads.OffsetMismatch):
+        status_code, body = 409, {'error': str(error), 'offset': error.offset}
+    elif isinstance(error, uploads.UploadIncomplete):
+        status_code, body = 409, {'error': str(error)}
+    elif isinstance(error, uploads.UploadTooLarge):
+        status_code, body = 413, {'error': str(error)}
+    elif isinstance(error, uploads.ChecksumMismatch):
+        status_code, body = 422, {'error': str(error)}
+    else:
+        status_code, body = 400, {'error': str(error)}
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+        },
+        'body': json.dumps(body)
+    }
+
+def handle_upload_start(event):
+    """开始分块上传 - 请求体 {"fileName", "size", "sha256"(可选)}"""
+    try:
+        body = read_json_body(event)
+        upload = UPLOADS.start(body.get('fileName', ''), int(body.get('size') or 0), body.get('sha256'))
+    except (ValueError, TypeError) as e:
+        return upload_error(e)
+    
+    return {
+        'statusCode': 201,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+        },
+        'body': json.dumps(dict(upload, uploadUrl=f"/api/uploads/{upload['uploadId']}"))
+    }
+
+def handle_upload_chunk(event, upload_id: str):
+    """追加一块 - 请求体为原始字节，?offset=已接收字节数，X-Chunk-Sha256 为该块的sha256(可选)"""
+    query = event.get('queryStringParameters') or {}
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    try:
+        offset = int(query.get('offset', ''))
+        with tracing.stage('write'):
+            status = UPLOADS.append(
+                upload_id, offset, tracing.timed_iter('decode', multipart.iter_event_body(event)),
+                checksum=headers.get('x-chunk-sha256')
+            )
+    except (KeyError, ValueError) as e:
+        return upload_error(e)
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': 'no-cache',
+        },
+        'body': json.dumps(status)
+    }
+
+def complete_upload(upload_id: str, fields: Dict):
+    """上传完成：识别格式后把文件移到UPLOAD_DIR，按与multipart上传相同的方式处理
+
+    返回 (响应, 调用, 上传的文件)，含义同 plan_conversion；格式不支持时保留这次上传，
+    客户端可以换一个目标格式重新complete。
+    """
+    fields = {k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in fields.items() if v not in (None, '')}
+    sha256 = fields.pop('sha256', None)
+    head = UPLOADS.head(upload_id, sniff.SNIFF_BYTES)
+    source_format = sniff.sniff(head)
+    if fields.get('operation', 'convert') == 'convert' and fields.get('targetFormat'):
+        if not conversion_kind(source_format or '', fields['targetFormat'], fields.get('conversionType')):
             return {
-                'statusCode': 400,
+                'statusCode': 415,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                },
+                'body': json.dumps({'success': False, 'error': f"Unsupported conversion: {source_format or 'unknown format'} to {fields['targetFormat']}"})
+            }, None, []
+    
+    file_id = str(uuid.uuid4())
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    info = UPLOADS.complete(upload_id, UPLOAD_DIR / f"upload_{file_id}.{source_format or 'bin'}", sha256=sha256)
+    upload = multipart.UploadedFile('file', info['filename'], None, info['path'])
+    upload.size = info['size']
+    # 追加时已增量计算，结果缓存不必重新读取文件
+    upload.sha256 = info['sha256']
+    response, call = plan_conversion([upload], fields, file_id)
+    return response, call, [upload]
+
+def handle_upload_complete(event, upload_id: str):
+    """完成分块上传并转换 - 请求体为转换参数(与multipart表单字段相同)，可带整个文件的sha256"""
+    try:
+        response, call, files = complete_upload(upload_id, read_json_body(event))
+    except (KeyError, ValueError) as e:
+        return upload_error(e)
+    if response:
+        return response
+    
+    fn, args, kwargs = call
+    return discarding_uploads(files, fn, *args, **kwargs)
+
+def handle_conversion_sync(file_path: Path, original_filename: str, params: Dict, file_id: str, file_type: str, input_hash: str = None, progress=None):
+    """同步处理转换"""
+    
+    operation = params.get('operation', 'convert')
+    target_format = params.get('targetFormat', 'pdf')
+    conversion_type = params.get('conversionType', file_type)
+    
+    # 处理不需要文件的操作
+    if 'videoUrl' in params and operation == 'download':
+        return handle_youtube_download_sync(params['videoUrl'], target_format, file_id, params, progress=progress)
+    elif 'videoUrl' in params and operation == 'probe':
+        return handle_youtube_probe_sync(params['videoUrl'], refresh=params.get('noCache') == 'true')
+    elif 'webpageUrl' in params and operation == 'url-to-markdown':
+        return handle_url_to_markdown_sync(params['webpageUrl'], file_id, params)
+    elif 'webpageUrl' in params and operation == 'crawl':
+        return handle_crawl_sync(params['webpageUrl'], file_id, params, progress=progress)
+    
+    # 需要文件的操作
+    if not file_path or not file_path.exists():
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': 'File required for this operation'})
+        }
+    
+    if operation == 'split':
+        return handle_pdf_split_sync(file_path, file_id, params, progress=progress)
+    if operation == 'merge':
+        # 分块上传等只有一个输入文件时，相当于按页码范围提取页面
+        return handle_pdf_merge_sync([(file_path, original_filename)], params, file_id, progress=progress)
+    
+    if operation in frames.FORMATS:
+        return handle_frames_sync(file_path, operation, file_id, params, input_hash=input_hash, progress=progress)
+    
+    if operation == 'convert' and target_format:
+        # 按识别出的源格式选择转换路径，客户端的conversionType只作为后备
+        source_format = file_path.suffix.lower().lstrip('.')
+        kind = conversion_kind(source_format, target_format, conversion_type)
+        if kind is None:
+            return {
+                'statusCode': 415,
                 'headers': {
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*',
                 },
-                'body': json.dumps({'error': 'No file uploaded'})
+                'body': json.dumps({'success': False, 'error': f'Unsupported conversion: {source_format or "unknown format"} to {target_format}'})
             }
         
-        if file_data:
-            original_filename = f"upload_{file_id}.bin"
-            # 保存上传的文件
-            file_path = UPLOAD_DIR / original_filename
-            
-            with open(file_path, 'wb') as f:
-                f.write(file_data)
-            
-            file_type = get_file_type(original_filename)
+        # 相同输入和参数直接返回缓存的产物
+        cache_key = None
+        if RESULT_CACHE.enabled and params.get('noCache') != 'true':
+            with tracing.stage('cache'):
+                cache_key = RESULT_CACHE.key(input_hash or cache.hash_file(file_path), params, kind)
+                cached = RESULT_CACHE.fetch(cache_key, ARTIFACTS.root, f"converted_{file_id}")
+            if cached:
+                output_path = ARTIFACTS.register(cached['path'])
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                    },
+                    'body': json.dumps({
+                        'success': True,
+                        'downloadUrl': f"/api/download/{output_path.name}",
+                        'fileName': output_path.name,
+                        'fileSize': output_path.stat().st_size,
+                        'message': cached['message'],
+                        'cached': True
+                    })
+                }
         else:
-            file_path = None
-            file_type = conversion_type
+            RESULT_CACHE.bypass()
         
-        # 同步调用转换函数
-        result = handle_conversion_sync(
-            file_path, 
-            original_filename if file_data else f"url_{file_id}", 
-            conversion_params, file_id, file_type
-        )
+        result = CONVERSION_HANDLERS[kind](file_path, original_filename, target_format, file_id, params=params, progress=progress)
+        
+        if cache_key and result['statusCode'] == 200:
+            body = json.loads(result['body'])
+            try:
+                with tracing.stage('cache'):
+                    RESULT_CACHE.store(cache_key, ARTIFACTS.path(body['fileName']), body.get('message', ''))
+            except OSError:
+                # 缓存写入失败不影响本次转换结果
+                pass
         return result
     
-    except Exception as e:
+    return {
+        'statusCode': 400,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+        },
+        'body': json.dumps({'success': False, 'error': 'Unsupported conversion'})
+    }
+
+def discarding_uploads(uploads, fn, *args, **kwargs):
+    """调用转换函数，结束后删除上传的输入文件；产物由ARTIFACTS管理，不随请求删除"""
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        for upload in uploads:
+            upload.path.unlink(missing_ok=True)
+
+
+@tracing.traced('batch')
+def handle_batch_conversion_sync(uploads, params: Dict, file_id: str, progress=None):
+    """批量转换 - 进程池并行，可选打包为ZIP；progress 按完成的文件数报告"""
+    
+    if not uploads:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': 'No files uploaded'})
+        }
+    
+    # 批量任务本身已经并行，单个文件内部不再使用进程池
+    item_params = dict(params, operation='convert', parallel='false')
+    batch_jobs = [
+        (upload.path, upload.path.name, item_params, f"{file_id}_{index}", get_file_type(upload.path.name), upload.sha256)
+        for index, upload in enumerate(uploads)
+    ]
+    
+    # 打包时zip先写到临时路径，全部完成后再提交；中途失败留下的临时文件由清理线程删除
+    zip_path = None
+    tmp_zip = None
+    if params.get('bundle') == 'zip':
+        zip_path = ARTIFACTS.path(f"batch_{file_id}.zip")
+        tmp_zip = ARTIFACTS.partial_path(zip_path.name)
+    
+    results = batch.run_batch(
+        handle_conversion_sync, batch_jobs, ARTIFACTS.root,
+        zip_path=tmp_zip,
+        names=[upload.filename for upload in uploads],
+        parallel=params.get('parallel') != 'false',
+        progress=progress
+    )
+    if tmp_zip:
+        ARTIFACTS.commit(tmp_zip, zip_path.name)
+    succeeded = sum(1 for r in results if r['success'])
+    
+    body = {
+        'success': succeeded > 0,
+        'results': results,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'message': 'Batch conversion completed'
+    }
+    if zip_path:
+        body['bundle'] = {
+            'downloadUrl': f"/api/download/{zip_path.name}",
+            'fileName': zip_path.name,
+            'fileSize': zip_path.stat().st_size,
+        }
+    
+    return {
+        'statusCode': 200 if succeeded else 500,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+        },
+        'body': json.dumps(body)
+    }
+
+@tracing.traced('pdf')
+def handle_pdf_merge_sync(sources, params: Dict, file_id: str, progress=None):
+    """合并PDF - sources为 (路径, 文件名) 列表，逐个打开输入流式复制页面，不重新渲染
+    
+    pages为所有输入共用的页码范围；pageRanges为与输入一一对应的JSON数组，如 ["1-3", "", "5-"]。
+    """
+    
+    if not sources:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': 'No files uploaded'})
+        }
+    
+    not_pdf = [name for path, name in sources if path.suffix.lower() != '.pdf']
+    if not_pdf:
+        return {
+            'statusCode': 415,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': f"Only PDF files can be merged: {', '.join(not_pdf)}"})
+        }
+    
+    try:
+        if params.get('pageRanges'):
+            ranges = json.loads(params['pageRanges'])
+            if not isinstance(ranges, list) or len(ranges) != len(sources):
+                raise ValueError('pageRanges must be a JSON array with one entry per file')
+        else:
+            ranges = [params.get('pages', '')] * len(sources)
+        
+        output_filename = f"merged_{file_id}.pdf"
+        with ARTIFACTS.writing(output_filename) as tmp_path:
+            page_total = pdf.merge_pdfs(
+                [(path, spec or '') for (path, _), spec in zip(sources, ranges)],
+                tmp_path, progress=progress
+            )
+        output_path = ARTIFACTS.path(output_filename)
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'success': True,
+                'downloadUrl': f"/api/download/{output_filename}",
+                'fileName': output_filename,
+                'fileSize': output_path.stat().st_size,
+                'message': f'Merged {len(sources)} PDF(s) into {page_total} pages',
+                'inputs': len(sources),
+                'pages': page_total
+            })
+        }
+    
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': f'PDF merge failed: {str(e)}'})
+        }
+
+@tracing.traced('pdf')
+def handle_pdf_split_sync(file_path: Path, file_id: str, params: Dict, progress=None):
+    """拆分PDF为ZIP - ranges为分号分隔的页码范围(每个范围一个文件)，否则pages中每every页一个文件"""
+    
+    if file_path.suffix.lower() != '.pdf':
         return {
-            'statusCode': 500,
+            'statusCode': 415,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*',
             },
-            'body': json.dumps({'error': f'Conversion failed: {str(e)}'})
+            'body': json.dumps({'success': False, 'error': 'Only PDF files can be split'})
         }
-
-def handle_conversion_sync(file_path: Path, original_filename: str, params: Dict, file_id: str, file_type: str):
-    """同步处理转换"""
-    
-    operation = params.get('operation', 'convert')
-    target_format = params.get('targetFormat', 'pdf')
-    conversion_type = params.get('conversionType', file_type)
     
-    # 处理不需要文件的操作
-    if 'videoUrl' in params and operation == 'download':
-        return handle_youtube_download_sync(params['videoUrl'], target_format, file_id)
-    elif 'webpageUrl' in params and operation == 'url-to-markdown':
-        return handle_url_to_markdown_sync(params['webpageUrl'], file_id)
+    try:
+        output_filename = f"split_{file_id}.zip"
+        with ARTIFACTS.writing(output_filename) as tmp_path:
+            parts = pdf.split_pdf(
+                file_path, tmp_path, 'part',
+                ranges=params.get('ranges', ''),
+                pages=params.get('pages', ''),
+                every=int(params.get('every') or 1),
+                progress=progress
+            )
+        output_path = ARTIFACTS.path(output_filename)
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'success': True,
+                'downloadUrl': f"/api/download/{output_filename}",
+                'fileName': output_filename,
+                'fileSize': output_path.stat().st_size,
+                'message': f'Split into {len(parts)} PDF(s)',
+                'parts': parts
+            })
+        }
     
-    # 需要文件的操作
-    if not file_path or not file_path.exists():
+    except ValueError as e:
         return {
             'statusCode': 400,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*',
             },
-            'body': json.dumps({'success': False, 'error': 'File required for this operation'})
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': f'PDF split failed: {str(e)}'})
         }
-    
-    if operation == 'convert' and target_format:
-        if conversion_type == 'image':
-            return handle_image_conversion_sync(file_path, original_filename, target_format, file_id)
-        elif conversion_type == 'document':
-            return handle_document_conversion_sync(file_path, original_filename, target_format, file_id)
-        elif conversion_type in ['audio', 'video']:
-            return handle_media_conversion_sync(file_path, original_filename, target_format, conversion_type, file_id)
-    
-    return {
-        'statusCode': 400,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-        },
-        'body': json.dumps({'success': False, 'error': 'Unsupported conversion'})
-    }
 
-def handle_image_conversion_sync(file_path: Path, original_filename: str, target_format: str, file_id: str):
+@tracing.traced('image')
+def handle_image_conversion_sync(file_path: Path, original_filename: str, target_format: str, file_id: str, params: Dict = None, progress=None):
     """图像转换"""
     
+    params = params or {}
+    
     try:
         output_filename = f"converted_{file_id}.{target_format}"
-        output_path = UPLOAD_DIR / output_filename
-        
-        # 打开图像
-        with Image.open(file_path) as img:
-            # 转换格式
-            if target_format.lower() in ['jpg', 'jpeg']:
-                # 转换为RGB模式（如果需要）
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                img.save(output_path, 'JPEG', quality=90)
-            elif target_format.lower() == 'png':
-                img.save(output_path, 'PNG')
-            elif target_format.lower() == 'webp':
-                img.save(output_path, 'WEBP', quality=90)
-            elif target_format.lower() == 'bmp':
-                img.save(output_path, 'BMP')
-            elif target_format.lower() == 'tiff':
-                img.save(output_path, 'TIFF')
-            else:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                    },
-                    'body': json.dumps({'success': False, 'error': f'Unsupported image format: {target_format}'})
-                }
+        output_path = ARTIFACTS.path(output_filename)
+        
+        # 指定尺寸时JPEG按比例缩减解码，超出像素预算的未压缩大图按条带处理，
+        # 动画GIF/WEBP和多页TIFF逐帧编码为多帧输出
+        with ARTIFACTS.writing(output_filename) as tmp_path:
+            info = images.convert_image(
+                file_path, tmp_path, target_format,
+                width=params.get('width'),
+                height=params.get('height'),
+                fit=params.get('fit', 'contain'),
+                quality=params.get('quality'),
+                effort=params.get('effort'),
+                progressive=params.get('progressive') == 'true',
+                animated=params.get('animated') != 'false'
+            )
         
         return {
             'statusCode': 200,
@@ -407,10 +1111,33 @@ def handle_image_conversion_sync(file_path: Path, original_filename: str, target
                 'downloadUrl': f"/api/download/{output_filename}",
                 'fileName': output_filename,
                 'fileSize': output_path.stat().st_size,
-                'message': 'Image conversion completed'
+                'message': 'Image conversion completed',
+                'width': info['width'],
+                'height': info['height'],
+                'decode': info['decode'],
+                'frames': info.get('frames', 1)
             })
         }
         
+    except images.ImageTooLarge as e:
+        return {
+            'statusCode': 413,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
+    except ValueError as e:
+        # 参数无效或目标格式不支持
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
     except Exception as e:
         return {
             'statusCode': 500,
@@ -421,97 +1148,73 @@ def handle_image_conversion_sync(file_path: Path, original_filename: str, target
             'body': json.dumps({'success': False, 'error': f'Image conversion failed: {str(e)}'})
         }
 
-def handle_document_conversion_sync(file_path: Path, original_filename: str, target_format: str, file_id: str):
+def convert_pdf_to_docx(file_path: Path, output_path: Path, params: Dict):
+    """PDF转Word - 按页提取文本，每页一个段落"""
+    pages = pdf.parse_page_range(params.get('pageRange', ''), pdf.page_count(file_path))
+    doc = lazy.load('docx').Document()
+    for text in pdf.iter_page_text(file_path, pages, parallel=params.get('parallel') != 'false'):
+        doc.add_paragraph(text)
+    doc.save(output_path)
+
+def convert_pdf_to_txt(file_path: Path, output_path: Path, params: Dict):
+    """PDF转文本 - 页数多时分片到进程池并行，逐页写入"""
+    pages = pdf.parse_page_range(params.get('pageRange', ''), pdf.page_count(file_path))
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for text in pdf.iter_page_text(file_path, pages, parallel=params.get('parallel') != 'false'):
+            f.write(text)
+            f.write("\n")
+
+def convert_docx_to_pdf(file_path: Path, output_path: Path, params: Dict):
+    """Word到PDF - 逐段读取document.xml，按段落排版"""
+    documents.docx_to_pdf(file_path, output_path)
+
+def convert_docx_to_txt(file_path: Path, output_path: Path, params: Dict):
+    """Word到文本"""
+    documents.docx_to_txt(file_path, output_path)
+
+def convert_txt_to_pdf(file_path: Path, output_path: Path, params: Dict):
+    """文本到PDF - canvas逐行绘制，不经过段落排版"""
+    documents.text_to_pdf(file_path, output_path)
+
+def convert_txt_to_docx(file_path: Path, output_path: Path, params: Dict):
+    """文本到Word - 按空行分段"""
+    documents.text_to_docx(file_path, output_path)
+
+# (源格式, 目标格式) -> 文档转换函数
+DOCUMENT_CONVERTERS = {
+    ('pdf', 'docx'): convert_pdf_to_docx,
+    ('pdf', 'txt'): convert_pdf_to_txt,
+    ('docx', 'pdf'): convert_docx_to_pdf,
+    ('docx', 'txt'): convert_docx_to_txt,
+    ('txt', 'pdf'): convert_txt_to_pdf,
+    ('txt', 'docx'): convert_txt_to_docx,
+}
+
+@tracing.traced('document')
+def handle_document_conversion_sync(file_path: Path, original_filename: str, target_format: str, file_id: str, params: Dict = None, progress=None):
     """文档转换"""
     
+    params = params or {}
+    
     try:
         output_filename = f"converted_{file_id}.{target_format}"
-        output_path = UPLOAD_DIR / output_filename
+        output_path = ARTIFACTS.path(output_filename)
         
-        ext = file_path.suffix.lower()
+        source_format = file_path.suffix.lower().lstrip('.')
+        converter = DOCUMENT_CONVERTERS.get((source_format, target_format.lower()))
         
-        if ext == '.pdf':
-            if target_format.lower() == 'docx':
-                # PDF到Word - 使用PyPDF2读取文本，然后创建Word文档
-                from PyPDF2 import PdfReader
-                
-                reader = PdfReader(file_path)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                
-                # 创建Word文档
-                doc = docx.Document()
-                doc.add_paragraph(text)
-                doc.save(output_path)
-                
-            elif target_format.lower() == 'txt':
-                from PyPDF2 import PdfReader
-                
-                reader = PdfReader(file_path)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                    
-        elif ext in ['.docx', '.doc']:
-            if target_format.lower() == 'pdf':
-                # Word到PDF - 读取Word文档并转换为PDF
-                import mammoth
-                
-                with open(file_path, "rb") as docx_file:
-                    result = mammoth.convert_to_html(docx_file)
-                    html = result.value
-                
-                # 简单的HTML到PDF转换（简化版）
-                from reportlab.lib.styles import getSampleStyleSheet
-                from reportlab.platypus import SimpleDocTemplate, Paragraph
-                
-                doc = SimpleDocTemplate(str(output_path), pagesize=letter)
-                styles = getSampleStyleSheet()
-                story = []
-                
-                # 简单地将HTML转换为纯文本
-                text = html.replace('<p>', '').replace('</p>', '\n').replace('<br>', '\n')
-                story.append(Paragraph(text, styles["Normal"]))
-                
-                doc.build(story)
-                
-            elif target_format.lower() == 'txt':
-                import mammoth
-                
-                with open(file_path, "rb") as docx_file:
-                    result = mammoth.convert_to_html(docx_file)
-                    html = result.value
-                
-                # 提取纯文本
-                text = html.replace('<p>', '').replace('</p>', '\n').replace('<br>', '\n')
-                
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                    
-        elif ext == '.txt':
-            if target_format.lower() == 'pdf':
-                from reportlab.lib.styles import getSampleStyleSheet
-                from reportlab.platypus import SimpleDocTemplate, Paragraph
-                
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    text = f.read()
-                
-                doc = SimpleDocTemplate(str(output_path), pagesize=letter)
-                styles = getSampleStyleSheet()
-                story = [Paragraph(text, styles["Normal"])]
-                doc.build(story)
-                
-            elif target_format.lower() == 'docx':
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    text = f.read()
-                
-                doc = docx.Document()
-                doc.add_paragraph(text)
-                doc.save(output_path)
+        if converter is None:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                },
+                'body': json.dumps({'success': False, 'error': f'Unsupported document conversion: {source_format} to {target_format}'})
+            }
+        
+        with ARTIFACTS.writing(output_filename) as tmp_path:
+            converter(file_path, tmp_path, params)
         
         if output_path.exists():
             return {
@@ -547,56 +1250,54 @@ def handle_document_conversion_sync(file_path: Path, original_filename: str, tar
             },
             'body': json.dumps({'success': False, 'error': f'Document conversion failed: {str(e)}'})
         }
-        
-        return {
-            'success': False,
-            'error': f'Document conversion failed: {stderr.decode() if stderr else "Unknown error"}'
-        }
-        
-    except Exception as e:
+
+@tracing.traced('media')
+def handle_media_conversion_sync(file_path: Path, original_filename: str, target_format: str, file_id: str, conversion_type: str = 'video', params: Dict = None, progress=None):
+    """音视频转换 - threads 为ffmpeg编码线程数，workers 为分段并行转码的进程数(不超过可用核数)，0 为自动"""
+    
+    params = params or {}
+    try:
+        threads = int(params.get('threads', 0))
+        workers = int(params.get('workers', 0))
+        if threads < 0 or workers < 0:
+            raise ValueError('threads and workers must be non-negative')
+        workers = min(workers, batch.worker_count())
+    except ValueError as e:
         return {
-            'success': False,
-            'error': f'Document conversion failed: {str(e)}'
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': f'Invalid conversion options: {str(e)}'})
         }
-
-def handle_media_conversion_sync(file_path: Path, original_filename: str, target_format: str, conversion_type: str, file_id: str):
-    """音视频转换"""
     
     try:
         output_filename = f"converted_{file_id}.{target_format}"
-        output_path = UPLOAD_DIR / output_filename
-        
-        if conversion_type == 'video':
-            # 使用moviepy进行视频转换
-            clip = mp.VideoFileClip(str(file_path))
-            
-            if target_format.lower() == 'mp4':
-                clip.write_videofile(str(output_path), codec='libx264', audio_codec='aac', verbose=False, logger=None)
-            elif target_format.lower() == 'webm':
-                clip.write_videofile(str(output_path), codec='libvpx', audio_codec='libvorbis', verbose=False, logger=None)
-            elif target_format.lower() == 'avi':
-                clip.write_videofile(str(output_path), codec='png', audio_codec='pcm_s16le', verbose=False, logger=None)
-            else:
-                clip.write_videofile(str(output_path), verbose=False, logger=None)
-            
-            clip.close()
-            
-        elif conversion_type == 'audio':
-            # 使用pydub进行音频转换
-            audio = AudioSegment.from_file(str(file_path))
-            
-            if target_format.lower() == 'mp3':
-                audio.export(str(output_path), format='mp3', bitrate='192k')
-            elif target_format.lower() == 'wav':
-                audio.export(str(output_path), format='wav')
-            elif target_format.lower() == 'flac':
-                audio.export(str(output_path), format='flac')
-            elif target_format.lower() == 'aac':
-                audio.export(str(output_path), format='adts', bitrate='128k')
-            elif target_format.lower() == 'ogg':
-                audio.export(str(output_path), format='ogg', bitrate='192k')
-            else:
-                audio.export(str(output_path), format=target_format)
+        output_path = ARTIFACTS.path(output_filename)
+        
+        method = None
+        with ARTIFACTS.writing(output_filename) as tmp_path:
+            if conversion_type == 'video':
+                # ffmpeg先探测编码，兼容时只换容器(stream copy)，否则按预设转码；
+                # 长视频按关键帧切段后多进程并行转码(批量转换中的单项不再分段)
+                method = media.convert_video(
+                    file_path, tmp_path, target_format,
+                    preset=params.get('preset'),
+                    threads=threads,
+                    allow_remux=params.get('remux', 'auto') != 'never',
+                    progress=progress,
+                    parallel=params.get('parallel') != 'false',
+                    workers=workers
+                )
+                
+            elif conversion_type == 'audio':
+                # ffmpeg流式转码，不把整段PCM解码到内存
+                method = media.convert_audio(
+                    file_path, tmp_path, target_format,
+                    bitrate=params.get('bitrate'),
+                    progress=progress
+                )
         
         if output_path.exists():
             return {
@@ -610,7 +1311,8 @@ def handle_media_conversion_sync(file_path: Path, original_filename: str, target
                     'downloadUrl': f"/api/download/{output_filename}",
                     'fileName': output_filename,
                     'fileSize': output_path.stat().st_size,
-                    'message': 'Media conversion completed'
+                    'message': 'Media conversion completed',
+                    'method': method
                 })
             }
         else:
@@ -633,41 +1335,181 @@ def handle_media_conversion_sync(file_path: Path, original_filename: str, target
             'body': json.dumps({'success': False, 'error': f'Media conversion failed: {str(e)}'})
         }
 
-def handle_youtube_download_sync(video_url: str, target_format: str, file_id: str):
-    """YouTube视频下载"""
+# 各截帧操作的默认宽度和帧数
+FRAME_DEFAULTS = {
+    'thumbnail': {'width': 640, 'count': 1},
+    'sprite': {'width': 160, 'count': 16},
+    'frames': {'width': 640, 'count': 8},
+    'preview': {'width': 320, 'count': 12},
+}
+
+@tracing.traced('frames')
+def handle_frames_sync(file_path: Path, operation: str, file_id: str, params: Dict, input_hash: str = None, progress=None):
+    """视频截帧：thumbnail封面图、sprite雪碧图、frames均匀取N帧(zip)、preview动图预览"""
+    
+    source_format = file_path.suffix.lower().lstrip('.')
+    kind = sniff.FORMAT_KINDS.get(source_format)
+    if kind != 'video' and not (kind is None and params.get('conversionType') == 'video'):
+        return {
+            'statusCode': 415,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': f'{operation} requires a video, got {source_format or "unknown format"}'})
+        }
+    
+    formats = frames.FORMATS[operation]
+    output_format = (params.get('targetFormat') or formats[0]).lower()
+    if output_format == 'jpeg':
+        output_format = 'jpg'
+    defaults = FRAME_DEFAULTS[operation]
+    try:
+        if output_format not in formats:
+            raise ValueError(f"targetFormat must be one of {', '.join(formats)}")
+        width = int(params.get('width') or defaults['width'])
+        count = 1 if operation == 'thumbnail' else int(params.get('count') or defaults['count'])
+        columns = int(params.get('columns') or math.ceil(math.sqrt(count)))
+        fps = float(params.get('fps') or 4)
+        timestamp = float(params['timestamp']) if params.get('timestamp') else None
+        if not (16 <= width <= frames.MAX_WIDTH and 1 <= count <= frames.MAX_FRAMES and columns >= 1 and 0 < fps <= 30):
+            raise ValueError(f'width must be 16-{frames.MAX_WIDTH}, count 1-{frames.MAX_FRAMES}, columns >= 1 and fps 0-30')
+        if timestamp is not None and not (math.isfinite(timestamp) and timestamp >= 0):
+            raise ValueError('timestamp must be a non-negative number of seconds')
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
+    
+    try:
+        total = frames.duration(file_path)
+        if operation == 'thumbnail':
+            # 默认取10%处，避开片头的黑场
+            at = timestamp if timestamp is not None else total * 0.1
+            times = [round(at, 3)]
+        else:
+            times = frames.spaced_timestamps(total, count)
+        
+        with tracing.stage('grab'):
+            grabbed, cached = frames.extract(
+                file_path, times, width,
+                input_hash=input_hash or cache.hash_file(file_path),
+                frame_cache=FRAME_CACHE,
+                progress=progress
+            )
+        
+        output_filename = f"{operation}_{file_id}.{'zip' if operation == 'frames' else output_format}"
+        extra = {}
+        with ARTIFACTS.writing(output_filename) as tmp_path:
+            if operation == 'thumbnail':
+                frames.write_thumbnail(grabbed[0], tmp_path, output_format)
+            elif operation == 'sprite':
+                extra = frames.write_sprite(grabbed, times, tmp_path, output_format, columns)
+            elif operation == 'frames':
+                frames.write_frames_zip(grabbed, times, tmp_path, output_format)
+            else:
+                frames.write_preview(grabbed, tmp_path, output_format, fps)
+        output_path = ARTIFACTS.path(output_filename)
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'success': True,
+                'downloadUrl': f"/api/download/{output_filename}",
+                'fileName': output_filename,
+                'fileSize': output_path.stat().st_size,
+                'message': f'Extracted {len(times)} frame(s) for {operation}',
+                'duration': total,
+                'timestamps': times,
+                'cachedFrames': cached,
+                **extra
+            })
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': f'Frame extraction failed: {str(e)}'})
+        }
+
+# 转换路径 -> 处理函数，参数统一为 (file_path, original_filename, target_format, file_id, params=, progress=)
+CONVERSION_HANDLERS = {
+    'image': handle_image_conversion_sync,
+    'document': handle_document_conversion_sync,
+    'audio': functools.partial(handle_media_conversion_sync, conversion_type='audio'),
+    'video': functools.partial(handle_media_conversion_sync, conversion_type='video'),
+}
+
+@tracing.traced('youtube')
+def handle_youtube_download_sync(video_url: str, target_format: str, file_id: str, params: Dict = None, progress=None):
+    """YouTube视频下载 - formatId 为 probe 返回的格式id，fragments/rateLimit 控制分片并发和限速"""
+    
+    params = params or {}
+    try:
+        fragments = int(params.get('fragments', YTDL_FRAGMENTS))
+        # 客户端的限速只能比服务端配置更严格
+        rate_limit = ytdl.parse_rate(params.get('rateLimit'))
+        server_limit = ytdl.parse_rate(YTDL_RATE_LIMIT)
+        if server_limit:
+            rate_limit = min(rate_limit or server_limit, server_limit)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': f'Invalid download options: {str(e)}'})
+        }
     
     try:
         output_filename = f"youtube_download_{file_id}.{target_format}"
-        output_path = UPLOAD_DIR / output_filename
+        output_path = ARTIFACTS.path(output_filename)
         
         # yt-dlp配置
-        ydl_opts = {
-            'outtmpl': str(output_path),
-            'format': 'best[ext=mp4]/best' if target_format == 'mp4' else 'bestaudio/best',
-        }
-        
-        if target_format in ['mp3', 'm4a', 'wav']:
-            ydl_opts.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': target_format if target_format != 'm4a' else 'aac',
-                    'preferredquality': '192',
-                }],
-            })
+        ydl_opts = ytdl.download_options(
+            str(output_path), target_format,
+            fragments=fragments, rate_limit=rate_limit,
+            throttled_rate=ytdl.parse_rate(YTDL_THROTTLED_RATE),
+        )
+        if progress:
+            ydl_opts['progress_hooks'] = [jobs.ytdlp_progress_hook(progress)]
+        
+        info = ytdl.download(
+            video_url, target_format, ydl_opts, YTDL_INFO_CACHE,
+            format_id=params.get('formatId'), refresh=params.get('noCache') == 'true',
+        )
+        title = info.get('title', 'youtube_video')
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(video_url, download=True)
-            title = info.get('title', 'youtube_video')
+        # 合并或转码后的实际文件名可能与outtmpl不同
+        downloaded = [Path(d['filepath']) for d in info.get('requested_downloads') or [] if d.get('filepath')]
+        if downloaded and downloaded[0].exists():
+            output_path = downloaded[0]
         
         # 重命名文件
-        final_filename = f"{title.replace('/', '_').replace('\\', '_')}_{file_id}.{target_format}"
-        final_path = UPLOAD_DIR / final_filename
+        safe_title = title.replace('/', '_').replace('\\', '_')
+        final_filename = f"{safe_title}_{file_id}.{target_format}"
+        final_path = ARTIFACTS.path(final_filename)
         
+        # yt-dlp先写.part再rename，这里同样rename，产物始终是完整文件
         if output_path.exists():
             output_path.rename(final_path)
             output_filename = final_filename
             output_path = final_path
+        ARTIFACTS.register(output_path)
         
         return {
             'statusCode': 200,
@@ -680,10 +1522,21 @@ def handle_youtube_download_sync(video_url: str, target_format: str, file_id: st
                 'downloadUrl': f"/api/download/{output_filename}",
                 'fileName': output_filename,
                 'fileSize': output_path.stat().st_size,
-                'message': 'YouTube download completed'
+                'message': 'YouTube download completed',
+                'formatId': info.get('format_id'),
+                'infoCached': info.get('_cached', False)
             })
         }
         
+    except ytdl.UnknownFormat as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
     except Exception as e:
         return {
             'statusCode': 500,
@@ -694,33 +1547,50 @@ def handle_youtube_download_sync(video_url: str, target_format: str, file_id: st
             'body': json.dumps({'success': False, 'error': f'YouTube download failed: {str(e)}'})
         }
 
-def handle_url_to_markdown_sync(webpage_url: str, file_id: str):
-    """URL转Markdown"""
+@tracing.traced('probe')
+def handle_youtube_probe_sync(video_url: str, refresh: bool = False):
+    """只提取视频信息和可用格式，客户端选好formatId后再下载"""
     
     try:
-        # 获取网页内容
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(webpage_url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
+        yt_dlp = lazy.load('yt_dlp')
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'noplaylist': True}) as ydl:
+            info = ytdl.extract_info(ydl, video_url, YTDL_INFO_CACHE, refresh=refresh)
         
-        # 提取标题
-        title = soup.title.string if soup.title else 'Webpage'
-        
-        # 移除脚本和样式
-        for script in soup(["script", "style"]):
-            script.decompose()
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps(dict(ytdl.probe_summary(info), success=True, cached=info['_cached']))
+        }
         
-        # 提取主要内容
-        content = soup.get_text()
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': f'Video probe failed: {str(e)}'})
+        }
+
+@tracing.traced('markdown')
+def handle_url_to_markdown_sync(webpage_url: str, file_id: str, params: Dict = None):
+    """URL转Markdown"""
+    
+    params = params or {}
+    try:
+        # 获取网页内容 - 共享连接池，命中缓存或304时不重新下载
+        with tracing.stage('fetch') as fetch_stage:
+            page = FETCHER.fetch(webpage_url, use_cache=params.get('noCache') != 'true')
+            fetch_stage.bytes = len(page['content'])
         
-        # 清理文本
-        lines = (line.strip() for line in content.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        content = '\n'.join(chunk for chunk in chunks if chunk)
+        # lxml解析并单次遍历输出Markdown，保留标题、链接、列表和表格
+        parse_start = time.perf_counter()
+        page_markdown = webpage.html_to_markdown(page['content'], base_url=page['url'], encoding=page['encoding'])
+        title = page_markdown['title'] or 'Webpage'
+        content = page_markdown['markdown']
         
         # 创建Markdown内容
         markdown_content = f"# {title}\n\n"
@@ -730,10 +1600,13 @@ def handle_url_to_markdown_sync(webpage_url: str, file_id: str):
         
         # 保存文件
         output_filename = f"webpage_{file_id}.md"
-        output_path = UPLOAD_DIR / output_filename
+        output_path = ARTIFACTS.path(output_filename)
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
+        with ARTIFACTS.writing(output_filename) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(markdown_content)
+        parse_seconds = time.perf_counter() - parse_start
+        FETCHER.record_parse(parse_seconds)
         
         return {
             'statusCode': 200,
@@ -746,10 +1619,21 @@ def handle_url_to_markdown_sync(webpage_url: str, file_id: str):
                 'downloadUrl': f"/api/download/{output_filename}",
                 'fileName': output_filename,
                 'fileSize': output_path.stat().st_size,
-                'message': 'URL to Markdown conversion completed'
+                'message': 'URL to Markdown conversion completed',
+                'httpCache': page['cache'],
+                'timing': {'fetchMs': page['fetchMs'], 'parseMs': round(parse_seconds * 1000, 2)}
             })
         }
         
+    except fetch.ResponseTooLarge as e:
+        return {
+            'statusCode': 413,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
     except Exception as e:
         return {
             'statusCode': 500,
@@ -760,6 +1644,66 @@ def handle_url_to_markdown_sync(webpage_url: str, file_id: str):
             'body': json.dumps({'success': False, 'error': f'URL to Markdown conversion failed: {str(e)}'})
         }
 
+@tracing.traced('crawl')
+def handle_crawl_sync(root_url: str, file_id: str, params: Dict, progress=None):
+    """整站/站点地图转Markdown - targetFormat=md 时合并为一个文件，否则每页一个文件打包为ZIP"""
+    
+    try:
+        max_pages = min(int(params.get('maxPages', 100)), CRAWL_MAX_PAGES)
+        max_depth = int(params.get('maxDepth', 3))
+        concurrency = min(int(params.get('concurrency', 8)), CRAWL_MAX_CONCURRENCY)
+        if max_pages < 1 or max_depth < 0 or concurrency < 1:
+            raise ValueError
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': 'maxPages and concurrency must be integers >= 1, maxDepth an integer >= 0'})
+        }
+    
+    try:
+        single_file = params.get('targetFormat') == 'md'
+        output_filename = f"crawl_{file_id}.md" if single_file else f"crawl_{file_id}.zip"
+        
+        with ARTIFACTS.writing(output_filename) as tmp_path:
+            sink = crawl.MarkdownSink(tmp_path) if single_file else crawl.ZipSink(tmp_path)
+            stats = crawl.crawl(
+                FETCHER, root_url, sink,
+                max_pages=max_pages, max_depth=max_depth, concurrency=concurrency,
+                per_host=CRAWL_PER_HOST, delay=CRAWL_DELAY, deadline=CRAWL_DEADLINE,
+                progress=progress,
+            )
+        output_path = ARTIFACTS.path(output_filename)
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'success': True,
+                'downloadUrl': f"/api/download/{output_filename}",
+                'fileName': output_filename,
+                'fileSize': output_path.stat().st_size,
+                'message': f"Crawled {stats['pages']} pages to Markdown",
+                'crawl': stats
+            })
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({'success': False, 'error': f'Crawl failed: {str(e)}'})
+        }
+
 # 本地测试入口
 if __name__ == "__main__":
     # 简单测试
@@ -770,5 +1714,5 @@ if __name__ == "__main__":
         'body': b'test file content'
     }
     
-    result = lambda_handler(test_event, None)
+    result = handler(test_event, None)
     print(json.dumps(result, indent=2))
\ No newline at end of file
@@ -0,0 +1 @@
+"""convert.py 的辅助模块"""
@@ -0,0 +1,213 @@
+"""转换产物存储：原子写入、按TTL过期、总大小超限时按最近访问淘汰，后台线程清理
+
+产物直接放在根目录下(下载链接里的文件名)，每个产物在 .meta/ 下有一个同名 .json 元数据，
+元数据文件的mtime即最近访问时间。写入中的文件放在 .partial/，完成后rename到根目录，
+并发请求不会看到写了一半的产物。
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+META_DIR = '.meta'
+PARTIAL_DIR = '.partial'
+
+
+class ArtifactStore:
+    def __init__(self, root: Path, ttl: float, max_bytes: int, sweep_interval: float = 60):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._meta_root = self.root / META_DIR
+        self._partial_root = self.root / PARTIAL_DIR
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        # 每次清理后以仍然有效的产物名调用，用于清理依附于产物的数据(如对象存储里的硬链接)
+        self._sweep_hooks: List[Callable[[Set[str]], None]] = []
+        # 自上次清理以来新增的字节数，超过配额余量时提前唤醒清理线程
+        self._added = 0
+        self._last_total = 0
+        self._counters = {'committed': 0, 'expired': 0, 'evicted': 0, 'orphans': 0, 'sweeps': 0}
+        for directory in (self.root, self._meta_root, self._partial_root):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, name: str) -> Path:
+        return self.root / name
+
+    def _meta_path(self, name: str) -> Path:
+        return self._meta_root / f'{name}.json'
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def partial_path(self, name: str) -> Path:
+        """写入用的临时路径，保留扩展名(ffmpeg、PIL等按扩展名选择格式)"""
+        self._partial_root.mkdir(parents=True, exist_ok=True)
+        return self._partial_root / f'{uuid.uuid4().hex}_{name}'
+
+    def commit(self, tmp_path: Path, name: str, **meta) -> Path:
+        """把写好的临时文件rename成正式产物并记录元数据"""
+        final_path = self.path(name)
+        os.replace(tmp_path, final_path)
+        return self.register(final_path, **meta)
+
+    def register(self, path: Path, **meta) -> Path:
+        """登记已经在根目录下原子生成的文件(如yt-dlp下载后rename的文件、缓存硬链接)"""
+        now = time.time()
+        size = path.stat().st_size
+        meta_path = self._meta_path(path.name)
+        self._meta_root.mkdir(parents=True, exist_ok=True)
+        tmp_meta = meta_path.with_name(f'{meta_path.name}.tmp{os.getpid()}_{threading.get_ident()}')
+        with open(tmp_meta, 'w') as f:
+            json.dump(dict(meta, size=size, created=now, expires=now + self.ttl), f)
+        os.replace(tmp_meta, meta_path)
+
+        self._count('committed')
+        with self._lock:
+            self._added += size
+            over_quota = self._last_total + self._added > self.max_bytes
+        if over_quota:
+            self._wake.set()
+        return path
+
+    @contextmanager
+    def writing(self, name: str, **meta) -> Iterator[Path]:
+        """with store.writing(name) as tmp: 写入tmp；正常结束时提交，出错时删除临时文件"""
+        tmp_path = self.partial_path(name)
+        try:
+            yield tmp_path
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        if tmp_path.exists():
+            self.commit(tmp_path, name, **meta)
+
+    def open(self, name: str) -> Optional[Path]:
+        """下载时查找产物：未登记、已过期或不存在时返回None，否则刷新最近访问时间"""
+        if not name or name.startswith('.') or Path(name).name != name:
+            return None
+        meta_path = self._meta_path(name)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('expires', 0) < time.time():
+                return None
+            path = self.path(name)
+            if not path.is_file():
+                return None
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        return path
+
+    def discard(self, name: str) -> None:
+        self._meta_path(name).unlink(missing_ok=True)
+        self.path(name).unlink(missing_ok=True)
+
+    def sweep(self) -> Dict:
+        """删除过期产物、残留的临时文件和孤儿文件，然后按最近访问时间淘汰到配额以内"""
+        now = time.time()
+        entries = []
+        total = 0
+        known = set()
+        for meta_path in self._meta_root.glob('*.json'):
+            name = meta_path.name[:-len('.json')]
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                atime = meta_path.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+            path = self.path(name)
+            if meta.get('expires', 0) < now or not path.exists():
+                self.discard(name)
+                self._count('expired')
+                continue
+            known.add(name)
+            size = meta.get('size', 0)
+            total += size
+            entries.append((atime, size, name))
+
+        # 上传的输入文件、崩溃留下的临时文件等没有元数据的文件，超过TTL后删除
+        for directory in (self.root, self._partial_root, self._meta_root):
+            try:
+                children = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in children:
+                if entry.name in (META_DIR, PARTIAL_DIR) or (directory == self.root and entry.name in known):
+                    continue
+                if directory == self._meta_root and entry.name.endswith('.json'):
+                    continue
+                try:
+                    if now - entry.stat(follow_symlinks=False).st_mtime <= self.ttl:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.unlink(entry.path)
+                    self._count('orphans')
+                except OSError:
+                    pass
+
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                self.discard(name)
+                known.discard(name)
+                total -= size
+                self._count('evicted')
+
+        for hook in self._sweep_hooks:
+            try:
+                hook(known)
+            except Exception:
+                pass
+
+        with self._lock:
+            self._added = 0
+            self._last_total = total
+        self._count('sweeps')
+        return self.stats()
+
+    def add_sweep_hook(self, hook: Callable[[Set[str]], None]) -> None:
+        self._sweep_hooks.append(hook)
+
+    def start_sweeper(self) -> None:
+        """启动后台清理线程(幂等)；请求路径上不做目录扫描"""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='artifact-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            try:
+                self.sweep()
+            except Exception:
+                # 清理失败不影响请求，下个周期重试
+                pass
+            self._wake.wait(self.sweep_interval)
+            self._wake.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters['bytes'] = self._last_total + self._added
+        counters['maxBytes'] = self.max_bytes
+        counters['ttl'] = self.ttl
+        return counters
@@ -0,0 +1,88 @@
+"""多文件批量转换：进程池并行执行，结果按完成顺序写入ZIP"""
+
+import json
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+# 已压缩的格式写入ZIP时不再压缩
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.aac', '.m4a', '.ogg', '.opus',
+    '.mp4', '.mkv', '.mov', '.webm', '.avi', '.flv', '.zip', '.docx', '.xlsx', '.pptx', '.epub',
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def worker_count() -> int:
+    """可用CPU核数(考虑cgroup/affinity限制)"""
+    env = os.environ.get('CONVERT_BATCH_WORKERS')
+    if env:
+        return max(1, int(env))
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """进程级共享的进程池，首次使用时创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn而不是fork：调用方进程里已有清理线程、任务队列线程，fork后子进程可能卡在它们持有的锁上
+            _pool = ProcessPoolExecutor(max_workers=worker_count(), mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def run_batch(convert_one: Callable, jobs: Sequence[tuple], output_dir: Path, zip_path: Optional[Path] = None,
+              names: Sequence[str] = (), parallel: bool = True,
+              progress: Optional[Callable[[float], None]] = None) -> List[Dict]:
+    """并行执行 convert_one(*job)，返回与 jobs 顺序一致的结果列表
+
+    convert_one 必须是模块级函数(可被pickle)，返回值为HTTP响应字典，
+    产物为 output_dir / body['fileName']。zip_path 不为空时，
+    每个任务完成后立即把产物追加进ZIP，不必等全部完成。
+    progress 不为空时每完成一个任务以已完成的比例调用一次。
+    """
+    results: List[Optional[Dict]] = [None] * len(jobs)
+    archive = zipfile.ZipFile(zip_path, 'w', allowZip64=True) if zip_path else None
+
+    def collect(index: int, response: Dict) -> None:
+        body = json.loads(response.get('body') or '{}')
+        entry = {'index': index, 'success': response.get('statusCode') == 200, **body}
+        if names:
+            entry['sourceName'] = names[index]
+        results[index] = entry
+        if archive is not None and entry['success'] and body.get('fileName'):
+            output_path = output_dir / body['fileName']
+            arcname = f"{index + 1:04d}_{Path(names[index]).stem if names else index}{output_path.suffix}"
+            compress = zipfile.ZIP_STORED if output_path.suffix.lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            archive.write(output_path, arcname, compress_type=compress)
+        if progress:
+            progress(sum(1 for r in results if r is not None) / len(jobs))
+
+    try:
+        if not parallel or len(jobs) <= 1:
+            for index, job in enumerate(jobs):
+                collect(index, convert_one(*job))
+        else:
+            pool = get_pool()
+            futures = {pool.submit(convert_one, *job): index for index, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    response = future.result()
+                except Exception as e:
+                    response = {'statusCode': 500, 'body': json.dumps({'success': False, 'error': str(e)})}
+                collect(index, response)
+    finally:
+        if archive is not None:
+            archive.close()
+    return results
+
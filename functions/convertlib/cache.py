@@ -0,0 +1,180 @@
+"""按输入内容寻址的转换结果缓存"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, Optional
+
+# 缓存格式或转换实现变化时递增，使旧条目失效
+CACHE_VERSION = '2'
+
+# 每种转换类型依赖的后端包，版本号参与缓存键
+BACKEND_PACKAGES = {
+    'image': ['Pillow'],
+    'document': ['PyPDF2', 'python-docx', 'reportlab'],
+    'audio': ['imageio-ffmpeg'],
+    'video': ['imageio-ffmpeg'],
+}
+
+# 不影响输出内容的参数，不参与缓存键
+IGNORED_PARAMS = {'noCache', 'async', 'bundle', 'parallel', 'trace'}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_backend_versions: Dict[str, str] = {}
+
+
+def hash_file(path: Path) -> str:
+    """分块计算文件的sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def backend_version(conversion_type: str) -> str:
+    """后端包版本，读取包元数据而不导入包本身"""
+    if conversion_type not in _backend_versions:
+        versions = []
+        for package in BACKEND_PACKAGES.get(conversion_type, []):
+            try:
+                versions.append(f'{package}={metadata.version(package)}')
+            except metadata.PackageNotFoundError:
+                versions.append(f'{package}=missing')
+        _backend_versions[conversion_type] = ','.join(versions)
+    return _backend_versions[conversion_type]
+
+
+class ResultCache:
+    """磁盘上的LRU结果缓存，总大小超过上限时按最近访问时间淘汰
+
+    每个条目是一个产物文件加一个同名 .json 元数据文件，
+    元数据文件的mtime即最近访问时间，多个进程共享同一目录也能工作。
+    """
+
+    def __init__(self, root: Path, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'bypassed': 0}
+
+    def key(self, input_hash: str, params: Dict, kind: str) -> str:
+        """kind 为按输入格式确定的实际转换类型(而不是客户端传的conversionType)，决定参与的后端版本"""
+        relevant = {k: v for k, v in params.items() if k not in IGNORED_PARAMS}
+        material = json.dumps({
+            'input': input_hash,
+            'kind': kind,
+            'params': relevant,
+            'backend': backend_version(kind),
+            'version': CACHE_VERSION,
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / key[:2] / f'{key}.json'
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def bypass(self) -> None:
+        self._count('bypassed')
+
+    def fetch(self, key: str, dest_dir: Path, dest_stem: str) -> Optional[Dict]:
+        """命中时把产物放到 dest_dir/dest_stem.<ext> 并返回元数据"""
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            artifact = meta_path.with_name(meta['artifact'])
+            dest = dest_dir / f"{dest_stem}{artifact.suffix}"
+            _link_or_copy(artifact, dest)
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        meta['path'] = dest
+        return meta
+
+    def store(self, key: str, output_path: Path, message: str) -> None:
+        """保存产物；写入临时文件后rename，并发请求不会读到半个条目"""
+        meta_path = self._meta_path(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        artifact_name = f'{key}{output_path.suffix}'
+        artifact = meta_path.with_name(artifact_name)
+        tmp_suffix = f'.tmp{os.getpid()}_{threading.get_ident()}'
+
+        tmp_artifact = artifact.with_name(artifact_name + tmp_suffix)
+        _link_or_copy(output_path, tmp_artifact)
+        os.replace(tmp_artifact, artifact)
+
+        tmp_meta = meta_path.with_name(meta_path.name + tmp_suffix)
+        with open(tmp_meta, 'w') as f:
+            json.dump({
+                'artifact': artifact_name,
+                'size': artifact.stat().st_size,
+                'message': message,
+                'created': time.time(),
+            }, f)
+        os.replace(tmp_meta, meta_path)
+
+        self._count('stores')
+        self.evict()
+
+    def evict(self) -> None:
+        """总大小超过上限时，从最久未访问的条目开始删除"""
+        entries = []
+        total = 0
+        for meta_path in self.root.glob('*/*.json'):
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                atime = meta_path.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+            size = meta.get('size', 0)
+            total += size
+            entries.append((atime, size, meta_path, meta.get('artifact')))
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, meta_path, artifact_name in entries:
+            if total <= self.max_bytes:
+                break
+            meta_path.unlink(missing_ok=True)
+            if artifact_name:
+                meta_path.with_name(artifact_name).unlink(missing_ok=True)
+            total -= size
+            self._count('evictions')
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['hits'] + counters['misses']
+        counters['hitRate'] = round(counters['hits'] / lookups, 3) if lookups else None
+        counters['enabled'] = self.enabled
+        counters['maxBytes'] = self.max_bytes
+        return counters
+
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    """同一文件系统上用硬链接，否则复制"""
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
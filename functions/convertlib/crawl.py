@@ -0,0 +1,345 @@
+"""整站/站点地图转Markdown：asyncio调度并发抓取，结果边抓边写入ZIP或单个Markdown文件
+
+抓取本身复用 fetch.Fetcher(同一个连接池和HTTP缓存)，在线程池中执行；
+asyncio负责按主机限制并发、礼貌间隔、robots.txt检查和去重。
+"""
+
+import asyncio
+import gzip
+import hashlib
+import posixpath
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+from urllib.parse import unquote, urldefrag, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+from convertlib import lazy, webpage
+
+# robots.txt 中匹配的User-agent名
+ROBOTS_AGENT = 'ConvertCrawler'
+
+# 这些扩展名的链接不是网页，不抓取
+SKIP_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.ico', '.bmp', '.tiff',
+    '.pdf', '.zip', '.gz', '.tgz', '.tar', '.rar', '.7z', '.exe', '.dmg', '.msi',
+    '.mp3', '.mp4', '.webm', '.mov', '.avi', '.wav', '.ogg', '.css', '.js', '.json',
+    '.woff', '.woff2', '.ttf', '.eot', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+}
+
+# robots.txt 的Crawl-delay上限(秒)，防止单个站点拖住整个请求
+MAX_CRAWL_DELAY = 5
+
+# 站点地图索引最多展开的子站点地图数
+MAX_SITEMAPS = 50
+
+# 错误列表最多保留的条目
+MAX_ERRORS = 50
+
+
+def normalize_url(url: str) -> str:
+    """去掉片段，协议和主机小写，空路径补成'/'，用于判重"""
+    url, _ = urldefrag(url)
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', parts.query, ''))
+
+
+def is_sitemap_url(url: str) -> bool:
+    path = urlsplit(url).path.lower()
+    return path.endswith(('.xml', '.xml.gz'))
+
+
+def parse_sitemap(content: bytes) -> Dict[str, List[str]]:
+    """解析 urlset 或 sitemapindex，返回 {'pages': [...], 'sitemaps': [...]}"""
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    etree = lazy.load('lxml.etree')
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+    root = etree.fromstring(content, parser=parser)
+    result = {'pages': [], 'sitemaps': []}
+    if root is None:
+        return result
+    target = result['sitemaps'] if etree.QName(root).localname == 'sitemapindex' else result['pages']
+    for loc in root.iter('{*}loc'):
+        if loc.text and loc.text.strip():
+            target.append(loc.text.strip())
+    return result
+
+
+class _HostGate:
+    """单个主机的并发上限和请求间隔"""
+
+    def __init__(self, concurrency: int, delay: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.delay = delay
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+class ZipSink:
+    """每个页面一个 .md 文件，按URL路径命名"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._names: Set[str] = set()
+
+    def _name(self, url: str) -> str:
+        parts = urlsplit(url)
+        path = unquote(parts.path)
+        if path.endswith('/') or not path:
+            path += 'index'
+        stem, ext = posixpath.splitext(path.lstrip('/'))
+        if ext.lower() not in ('.html', '.htm', '.php', '.asp', '.aspx', ''):
+            stem += ext
+        if parts.query:
+            stem += '_' + hashlib.sha256(parts.query.encode()).hexdigest()[:8]
+        stem = '/'.join(p for p in stem.split('/') if p not in ('', '.', '..')) or 'index'
+        name = f'{stem}.md'
+        if name in self._names:
+            name = f"{stem}_{hashlib.sha256(url.encode()).hexdigest()[:8]}.md"
+        self._names.add(name)
+        return name
+
+    def add(self, url: str, title: str, markdown: str) -> None:
+        self._zip.writestr(self._name(url), f"# {title}\n\nSource: {url}\n\n---\n\n{markdown}\n")
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class MarkdownSink:
+    """所有页面依次追加到一个Markdown文件"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8')
+        self._count = 0
+
+    def add(self, url: str, title: str, markdown: str) -> None:
+        if self._count:
+            self._file.write('\n\n---\n\n')
+        self._file.write(f"# {title}\n\nSource: {url}\n\n{markdown}\n")
+        self._count += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Crawler:
+    """从起始URL按链接广度优先抓取(限定在同一主机和起始路径之下)，或抓取站点地图列出的页面"""
+
+    def __init__(self, fetcher, root_url: str, max_pages: int = 100, max_depth: int = 3,
+                 concurrency: int = 8, per_host: int = 4, delay: float = 0.2,
+                 deadline: float = 600, progress: Optional[Callable[[float], None]] = None):
+        self.fetcher = fetcher
+        self.root_url = normalize_url(root_url)
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.deadline = deadline
+        self.progress = progress
+
+        self._set_scope(self.root_url)
+
+        self._seen: Set[str] = set()
+        self._hashes: Set[str] = set()
+        self._robots: Dict[str, RobotFileParser] = {}
+        self._robots_lock: Optional[asyncio.Lock] = None
+        self._gates: Dict[str, _HostGate] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._started = 0.0
+        self._done = 0
+        self.stats = {
+            'pages': 0, 'duplicates': 0, 'robotsBlocked': 0, 'skipped': 0,
+            'errors': 0, 'truncated': False, 'errorSamples': [],
+        }
+
+    def _set_scope(self, url: str) -> None:
+        parts = urlsplit(url)
+        self._host = parts.netloc
+        # 起始页所在目录，例如 /docs/guide/intro.html -> /docs/guide/
+        self._prefix = parts.path if parts.path.endswith('/') else posixpath.dirname(parts.path).rstrip('/') + '/'
+
+    def in_scope(self, url: str) -> bool:
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or parts.netloc != self._host:
+            return False
+        if posixpath.splitext(parts.path)[1].lower() in SKIP_EXTENSIONS:
+            return False
+        return parts.path.startswith(self._prefix) or parts.path == self._prefix.rstrip('/')
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    def _gate(self, host: str) -> _HostGate:
+        gate = self._gates.get(host)
+        if gate is None:
+            delay = self.delay
+            robots = self._robots.get(host)
+            crawl_delay = robots.crawl_delay(ROBOTS_AGENT) if robots else None
+            if crawl_delay:
+                delay = max(delay, min(float(crawl_delay), MAX_CRAWL_DELAY))
+            gate = self._gates[host] = _HostGate(self.per_host, delay)
+        return gate
+
+    async def _allowed(self, url: str) -> bool:
+        parts = urlsplit(url)
+        async with self._robots_lock:
+            if parts.netloc not in self._robots:
+                self._robots[parts.netloc] = await self._load_robots(f'{parts.scheme}://{parts.netloc}/robots.txt')
+        return self._robots[parts.netloc].can_fetch(ROBOTS_AGENT, url)
+
+    async def _load_robots(self, robots_url: str) -> RobotFileParser:
+        """按RFC 9309：4xx视为没有限制，5xx或无法访问视为全部禁止"""
+        robots = RobotFileParser(robots_url)
+        try:
+            page = await self._call(self.fetcher.fetch, robots_url)
+            robots.parse(page['content'].decode('utf-8', errors='replace').splitlines())
+        except Exception as e:
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            if status is not None and 400 <= status < 500:
+                robots.allow_all = True
+            else:
+                robots.disallow_all = True
+        return robots
+
+    def _error(self, url: str, error: Exception) -> None:
+        self.stats['errors'] += 1
+        if len(self.stats['errorSamples']) < MAX_ERRORS:
+            self.stats['errorSamples'].append({'url': url, 'error': str(error)})
+
+    async def _sitemap_pages(self, sitemap_url: str) -> List[str]:
+        pages: List[str] = []
+        pending = [sitemap_url]
+        expanded = 0
+        while pending and expanded < MAX_SITEMAPS and len(pages) < self.max_pages:
+            url = pending.pop(0)
+            expanded += 1
+            try:
+                page = await self._call(self.fetcher.fetch, url)
+                parsed = await self._call(parse_sitemap, page['content'])
+            except Exception as e:
+                self._error(url, e)
+                continue
+            pending.extend(parsed['sitemaps'])
+            pages.extend(parsed['pages'])
+        return pages
+
+    def _timed_out(self) -> bool:
+        return time.monotonic() - self._started > self.deadline
+
+    async def _visit(self, url: str, depth: int, sink, queue: asyncio.Queue) -> None:
+        if self._timed_out():
+            self.stats['truncated'] = True
+            return
+        if not await self._allowed(url):
+            self.stats['robotsBlocked'] += 1
+            return
+
+        async with self._gate(urlsplit(url).netloc):
+            page = await self._call(self.fetcher.fetch, url)
+        final_url = normalize_url(page['url'])
+        if final_url != url and depth == 0 and self._done == 0 and not is_sitemap_url(self.root_url):
+            # 起始页被重定向(如补斜杠、换域名)时以最终地址作为抓取范围
+            self._set_scope(final_url)
+            self._seen.add(final_url)
+        elif final_url != url:
+            # 重定向到范围外或已经抓过的地址
+            if not self.in_scope(final_url) or final_url in self._seen:
+                self.stats['skipped'] += 1
+                return
+            self._seen.add(final_url)
+        if 'html' not in page['contentType'].lower():
+            self.stats['skipped'] += 1
+            return
+
+        follow = depth < self.max_depth
+        result = await self._call(
+            webpage.html_to_markdown, page['content'],
+            base_url=page['url'], encoding=page['encoding'], collect_links=follow,
+        )
+        digest = hashlib.sha256(result['markdown'].encode()).digest()
+        if digest in self._hashes:
+            self.stats['duplicates'] += 1
+        else:
+            self._hashes.add(digest)
+            sink.add(page['url'], result['title'] or page['url'], result['markdown'])
+            self.stats['pages'] += 1
+
+        for link in result.get('links', ()):
+            self._enqueue(link, depth + 1, queue)
+
+    def _enqueue(self, url: str, depth: int, queue: asyncio.Queue, check_scope: bool = True) -> None:
+        url = normalize_url(url)
+        if url in self._seen or len(self._seen) >= self.max_pages:
+            if url not in self._seen:
+                self.stats['truncated'] = True
+            return
+        if check_scope and not self.in_scope(url):
+            return
+        self._seen.add(url)
+        queue.put_nowait((url, depth))
+
+    async def _worker(self, sink, queue: asyncio.Queue) -> None:
+        while True:
+            url, depth = await queue.get()
+            try:
+                await self._visit(url, depth, sink, queue)
+            except Exception as e:
+                self._error(url, e)
+            finally:
+                queue.task_done()
+                self._done += 1
+                if self.progress:
+                    # 总数随发现的链接增长，只能给出近似进度
+                    self.progress(min(self._done / max(len(self._seen), 1), 0.99))
+
+    async def run(self, sink) -> Dict:
+        self._started = time.monotonic()
+        self._robots_lock = asyncio.Lock()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency + 1, thread_name_prefix='crawl')
+        try:
+            if is_sitemap_url(self.root_url):
+                self._prefix = '/'
+                for url in await self._sitemap_pages(self.root_url):
+                    self._enqueue(url, self.max_depth, queue)
+            else:
+                self._enqueue(self.root_url, 0, queue, check_scope=False)
+
+            workers = [asyncio.create_task(self._worker(sink, queue)) for _ in range(self.concurrency)]
+            await queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self.stats['elapsed'] = round(time.monotonic() - self._started, 2)
+        return self.stats
+
+
+def crawl(fetcher, root_url: str, sink, **options) -> Dict:
+    """同步入口：在新事件循环里跑完整个抓取"""
+    crawler = Crawler(fetcher, root_url, **options)
+    try:
+        return asyncio.run(crawler.run(sink))
+    finally:
+        sink.close()
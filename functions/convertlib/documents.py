@@ -0,0 +1,314 @@
+"""文本/Word文档的流式读取与PDF渲染
+
+纯文本用reportlab canvas逐行排版；Word按段落生成flowable，
+按窗口交给platypus逐个排版，不把整篇文档拼成一个Paragraph。
+"""
+
+import contextlib
+import itertools
+import re
+import threading
+import zipfile
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from convertlib import lazy
+
+# 单个Paragraph的最大字符数；reportlab排版耗时随段落长度超线性增长，超长段落拆开
+MAX_PARAGRAPH_CHARS = 4000
+
+# 同时交给platypus排版的flowable数
+FLOWABLE_WINDOW = 64
+
+FONT_SIZE = 10
+LEADING = 12
+MARGIN = 72
+
+# 含中日韩字符时使用reportlab内置的CID字体，Helvetica没有这些字形
+CJK_FONT = 'STSong-Light'
+_CJK_RE = re.compile('[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def _font_for(sample: str) -> str:
+    if not _CJK_RE.search(sample):
+        return 'Helvetica'
+    pdfmetrics = lazy.load('reportlab.pdfbase.pdfmetrics')
+    if CJK_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(lazy.load('reportlab.pdfbase.cidfonts').UnicodeCIDFont(CJK_FONT))
+    return CJK_FONT
+
+
+_a85_lock = threading.Lock()
+_a85_users = 0
+_a85_default = None
+
+
+@contextlib.contextmanager
+def _flate_only():
+    """PDF流只做Flate压缩；默认再套一层ASCII85编码，体积更大且纯Python编码很慢
+
+    reportlab只有全局开关，这里只在生成期间关闭，最后一个使用者退出时恢复原值。
+    """
+    global _a85_users, _a85_default
+    rl_config = lazy.load('reportlab.rl_config')
+    with _a85_lock:
+        if _a85_users == 0:
+            _a85_default = rl_config.useA85
+            rl_config.useA85 = 0
+        _a85_users += 1
+    try:
+        yield
+    finally:
+        with _a85_lock:
+            _a85_users -= 1
+            if _a85_users == 0:
+                rl_config.useA85 = _a85_default
+
+
+def _sample_text(path: Path, size: int = 65536) -> str:
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read(size)
+
+
+def iter_text_lines(path: Path) -> Iterator[str]:
+    """逐行读取文本，无法解码的字节替换掉而不是整个转换失败"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            yield line.rstrip('\r\n')
+
+
+def _split_long(text: str, limit: int = MAX_PARAGRAPH_CHARS) -> Iterator[str]:
+    """在空白处把超长段落切成不超过limit的片段"""
+    while len(text) > limit:
+        cut = text.rfind(' ', limit // 2, limit)
+        if cut <= 0:
+            cut = limit
+        yield text[:cut]
+        text = text[cut:].lstrip(' ')
+    if text:
+        yield text
+
+
+def iter_text_paragraphs(path: Path) -> Iterator[str]:
+    """按空行分段，段内换行保留为'\\n'"""
+    lines = []
+    size = 0
+    for line in iter_text_lines(path):
+        if not line.strip():
+            if lines:
+                yield '\n'.join(lines)
+                lines, size = [], 0
+            continue
+        lines.append(line)
+        size += len(line)
+        if size >= MAX_PARAGRAPH_CHARS:
+            yield '\n'.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield '\n'.join(lines)
+
+
+def iter_docx_paragraphs(path: Path) -> Iterator[Tuple[str, Optional[str]]]:
+    """从word/document.xml流式读取段落，产出 (文本, 段落样式ID)
+
+    用iterparse逐个处理<w:p>并清理已处理的节点，内存与文档长度无关。
+    """
+    with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as xml:
+        depth = 0
+        body = None
+        for event, elem in ElementTree.iterparse(xml, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if elem.tag == f'{_W}body':
+                    body = elem
+                continue
+            depth -= 1
+            if elem.tag == f'{_W}p':
+                parts = []
+                for node in elem.iter():
+                    if node.tag == f'{_W}t' and node.text:
+                        parts.append(node.text)
+                    elif node.tag == f'{_W}tab':
+                        parts.append('\t')
+                    elif node.tag in (f'{_W}br', f'{_W}cr'):
+                        parts.append('\n')
+                style = elem.find(f'{_W}pPr/{_W}pStyle')
+                yield ''.join(parts), style.get(f'{_W}val') if style is not None else None
+            if body is not None and depth == 2:
+                # body下的一个块(段落/表格)处理完，释放已解析的节点
+                body.clear()
+
+
+class _CharWidths(dict):
+    """按字符缓存宽度；逐行调用stringWidth/simpleSplit在长文本上是主要开销"""
+
+    def __init__(self, font: str, size: float):
+        super().__init__()
+        self._font = font
+        self._size = size
+        self._string_width = lazy.load('reportlab.pdfbase.pdfmetrics').stringWidth
+
+    def __missing__(self, char: str) -> float:
+        width = self[char] = self._string_width(char, self._font, self._size)
+        return width
+
+
+def _wrap(text: str, widths: _CharWidths, width: float) -> Iterator[str]:
+    """按宽度折行，优先在空格处断开；没有空格可断的长串(如中文)按字符断开"""
+    if sum(map(widths.__getitem__, text)) <= width:
+        yield text
+        return
+    start, used, space = 0, 0.0, -1
+    for i, char in enumerate(text):
+        char_width = widths[char]
+        if used + char_width > width and i > start:
+            if space > start:
+                yield text[start:space]
+                start = space + 1
+                used = sum(map(widths.__getitem__, text[start:i]))
+            else:
+                yield text[start:i]
+                start, used = i, 0.0
+            space = -1
+        if char == ' ':
+            space = i
+        used += char_width
+    yield text[start:]
+
+
+def text_to_pdf(src: Path, dst: Path) -> int:
+    """纯文本转PDF的快速路径：canvas逐行绘制，不经过platypus排版；返回页数"""
+    with _flate_only():
+        return _draw_text_pdf(src, dst)
+
+
+def _draw_text_pdf(src: Path, dst: Path) -> int:
+    canvas = lazy.load('reportlab.pdfgen.canvas')
+    letter = lazy.load('reportlab.lib.pagesizes').letter
+
+    font = _font_for(_sample_text(src))
+    page_width, page_height = letter
+    width = page_width - 2 * MARGIN
+    top = page_height - MARGIN
+    lines_per_page = int((page_height - 2 * MARGIN) // LEADING)
+    widths = _CharWidths(font, FONT_SIZE)
+
+    pdf = canvas.Canvas(str(dst), pagesize=letter, pageCompression=1)
+    pages = 0
+    text = None
+    row = 0
+    for line in iter_text_lines(src):
+        for wrapped in _wrap(line.expandtabs(4), widths, width):
+            if text is None:
+                text = pdf.beginText(MARGIN, top)
+                text.setFont(font, FONT_SIZE, LEADING)
+                row = 0
+            text.textLine(wrapped)
+            row += 1
+            if row >= lines_per_page:
+                pdf.drawText(text)
+                pdf.showPage()
+                pages += 1
+                text = None
+    if text is not None:
+        pdf.drawText(text)
+        pdf.showPage()
+        pages += 1
+    if pages == 0:
+        # 空文件也输出一页
+        pdf.showPage()
+        pages = 1
+    pdf.save()
+    return pages
+
+
+def _paragraph_styles(font: str):
+    styles = lazy.load('reportlab.lib.styles').getSampleStyleSheet()
+    if font != 'Helvetica':
+        for name in ('Normal', 'Title', 'Heading1', 'Heading2', 'Heading3', 'Heading4', 'Heading5', 'Heading6'):
+            styles[name].fontName = font
+    return styles
+
+
+def _style_name(style_id: Optional[str]) -> str:
+    """Word段落样式ID映射到reportlab样式"""
+    if not style_id:
+        return 'Normal'
+    lowered = style_id.lower()
+    if lowered == 'title':
+        return 'Title'
+    match = re.match(r'heading\s*(\d)', lowered)
+    if match:
+        return f'Heading{min(max(int(match.group(1)), 1), 6)}'
+    return 'Normal'
+
+
+def _markup(text: str) -> str:
+    """转义XML特殊字符，段内换行转成<br/>"""
+    return escape(text).replace('\t', '&nbsp;' * 4).replace('\n', '<br/>')
+
+
+def paragraphs_to_pdf(paragraphs: Iterator[Tuple[str, str]], dst: Path, font: str) -> None:
+    """把 (文本, 样式名) 逐段排版为PDF
+
+    不用doc.build(list)：自己驱动platypus的handle_flowable循环，待排版列表从生成器补到
+    FLOWABLE_WINDOW 个(留出keepWithNext的前瞻)，同一时刻只有一个窗口的段落在内存中。
+    """
+    platypus = lazy.load('reportlab.platypus')
+    letter = lazy.load('reportlab.lib.pagesizes').letter
+    styles = _paragraph_styles(font)
+
+    def flowables():
+        for text, style_name in paragraphs:
+            if not text.strip():
+                continue
+            for chunk in _split_long(text):
+                yield platypus.Paragraph(_markup(chunk), styles[style_name])
+
+    # 与SimpleDocTemplate相同的单栏页面
+    doc = platypus.BaseDocTemplate(str(dst), pagesize=letter, pageCompression=1)
+    frame = platypus.Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='normal')
+    doc.addPageTemplates([platypus.PageTemplate(id='Normal', frames=[frame], pagesize=letter)])
+
+    source = flowables()
+    pending = list(itertools.islice(source, FLOWABLE_WINDOW))
+    if not pending:
+        # 空文档也输出一页
+        pending.append(platypus.Spacer(1, 1))
+    with _flate_only():
+        doc._startBuild()
+        doc.canv._doctemplate = doc
+        try:
+            while pending:
+                doc.clean_hanging()
+                # handle_flowable排版pending[0]，跨页拆分的剩余部分会放回列表头部
+                doc.handle_flowable(pending)
+                pending.extend(itertools.islice(source, FLOWABLE_WINDOW - len(pending)))
+        finally:
+            del doc.canv._doctemplate
+        doc._endBuild()
+
+
+def docx_to_pdf(src: Path, dst: Path) -> None:
+    sample = ''.join(text for text, _ in itertools.islice(iter_docx_paragraphs(src), 200))
+    paragraphs = ((text, _style_name(style)) for text, style in iter_docx_paragraphs(src))
+    paragraphs_to_pdf(paragraphs, dst, _font_for(sample))
+
+
+def docx_to_txt(src: Path, dst: Path) -> None:
+    with open(dst, 'w', encoding='utf-8') as f:
+        for text, _ in iter_docx_paragraphs(src):
+            f.write(text)
+            f.write('\n')
+
+
+def text_to_docx(src: Path, dst: Path) -> None:
+    """每个文本段落对应一个Word段落，段内换行由python-docx转成换行符"""
+    doc = lazy.load('docx').Document()
+    for paragraph in iter_text_paragraphs(src):
+        doc.add_paragraph(paragraph)
+    doc.save(dst)
@@ -0,0 +1,167 @@
+"""下载相关：Range请求、条件请求与本地对象存储的预签名链接"""
+
+import hashlib
+import hmac
+import os
+import secrets
+import shutil
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    """Range超出文件大小"""
+
+
+def etag_for(stat: os.stat_result) -> str:
+    """由大小和修改时间生成ETag，不需要读取文件内容"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def last_modified_for(stat: os.stat_result) -> str:
+    return formatdate(stat.st_mtime, usegmt=True)
+
+
+def is_not_modified(headers: Dict[str, str], etag: str, stat: os.stat_result) -> bool:
+    """If-None-Match优先，其次If-Modified-Since"""
+    if_none_match = headers.get('if-none-match')
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat.st_mtime) <= since
+    return False
+
+
+def parse_range(headers: Dict[str, str], size: int, etag: str) -> Optional[Tuple[int, int]]:
+    """解析单个 bytes=start-end，返回闭区间；无Range、Range无效或If-Range不匹配时返回None
+
+    多段Range不常见，按整个文件返回。
+    """
+    value = headers.get('range', '').strip()
+    if not value.startswith('bytes=') or ',' in value:
+        return None
+    if_range = headers.get('if-range')
+    if if_range and if_range.strip() != etag:
+        return None
+
+    start_text, _, end_text = (part.strip() for part in value[len('bytes='):].partition('-'))
+    # RFC 9110：语法无效的Range(非数字、last < first)忽略，返回整个文件
+    if not all(text.isdigit() for text in (start_text, end_text) if text):
+        return None
+    first = int(start_text) if start_text else None
+    last = int(end_text) if end_text else None
+
+    if first is None:
+        if last is None:
+            return None
+        # bytes=-N 表示最后N个字节
+        if last == 0:
+            raise RangeNotSatisfiable(value)
+        start, end = max(0, size - last), size - 1
+    else:
+        if last is not None and last < first:
+            return None
+        start, end = first, last if last is not None else size - 1
+
+    # 语法有效但起点超出文件时才是416
+    if start >= size:
+        raise RangeNotSatisfiable(value)
+    return start, min(end, size - 1)
+
+
+def read_range(path: Path, start: int, end: int) -> bytes:
+    """只读取需要的区间"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start + 1)
+
+
+def iter_file(path: Path, start: int = 0, end: Optional[int] = None,
+              chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """按块读取文件区间，用于ASGI等可以流式响应的服务器"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = (end - start + 1) if end is not None else None
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class LocalObjectStore:
+    """本地对象存储，模拟S3/R2的预签名下载链接
+
+    签名密钥来自 CONVERT_SIGNING_KEY；未设置时每个进程随机生成，
+    此时链接只能由同一进程验证。对象是产物的硬链接，产物被清理后由 prune 一并删除，
+    不会在产物过期后继续占用空间。
+    """
+
+    def __init__(self, root: Path, url_prefix: str = '/api/objects/', secret: Optional[str] = None):
+        self.root = Path(root)
+        self.url_prefix = url_prefix
+        self._secret = (secret or os.environ.get('CONVERT_SIGNING_KEY') or secrets.token_hex(32)).encode()
+
+    def path_for(self, name: str) -> Path:
+        return self.root / Path(name).name
+
+    def put(self, src: Path, name: str) -> Path:
+        """把产物放入存储；同一文件系统上用硬链接"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        dest = self.path_for(name)
+        if not dest.exists():
+            tmp = dest.with_name(f'{dest.name}.tmp{os.getpid()}')
+            try:
+                os.link(src, tmp)
+            except OSError:
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, dest)
+        return dest
+
+    def prune(self, live: Iterable[str]) -> int:
+        """删除对应产物已经过期或被淘汰的对象以及写了一半的临时文件，返回删除的个数"""
+        live = set(live)
+        removed = 0
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return 0
+        for entry in entries:
+            # put 写入中的临时文件按其目标名判断
+            if entry.name.split('.tmp')[0] in live:
+                continue
+            try:
+                os.unlink(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def _signature(self, name: str, expires: int) -> str:
+        return hmac.new(self._secret, f'{name}:{expires}'.encode(), hashlib.sha256).hexdigest()
+
+    def presign(self, name: str, expires_in: int = 3600) -> str:
+        expires = int(time.time()) + expires_in
+        return f'{self.url_prefix}{name}?expires={expires}&signature={self._signature(name, expires)}'
+
+    def verify(self, name: str, expires: str, signature: str) -> bool:
+        try:
+            expires_at = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires_at < time.time():
+            return False
+        return hmac.compare_digest(self._signature(name, expires_at), signature or '')
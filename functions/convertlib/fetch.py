@@ -0,0 +1,299 @@
+"""网页抓取：共享连接池、流式读取上限与遵循HTTP缓存语义的磁盘缓存"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from convertlib import cache, lazy
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# (连接超时, 两次读取之间的超时)，整个响应另有总时限
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 15
+
+READ_CHUNK_SIZE = 64 * 1024
+
+POOL_SIZE = 16
+
+# 没有显式过期时间但有Last-Modified时，按(Date - Last-Modified)的10%估算新鲜期，最长1小时
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX_SECONDS = 3600
+
+
+class ResponseTooLarge(ValueError):
+    """响应体超过大小上限"""
+
+
+def _cache_control(value: str) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in value.split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+def _http_time(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers: Dict[str, str]) -> Optional[float]:
+    """按RFC 9111计算新鲜期(秒)；不可存储时返回None，需要每次验证时返回0"""
+    directives = _cache_control(headers.get('cache-control', ''))
+    # private响应只给单个用户，共享的服务端缓存不能存储
+    if 'no-store' in directives or 'private' in directives or headers.get('vary', '').strip() == '*':
+        return None
+    if 'no-cache' in directives:
+        return 0
+    for name in ('s-maxage', 'max-age'):
+        if directives.get(name):
+            try:
+                return max(int(directives[name]), 0)
+            except ValueError:
+                return 0
+
+    date = _http_time(headers.get('date')) or time.time()
+    expires = headers.get('expires')
+    if expires is not None:
+        expires_at = _http_time(expires)
+        return max(expires_at - date, 0) if expires_at else 0
+
+    last_modified = _http_time(headers.get('last-modified'))
+    if last_modified:
+        return min(max(date - last_modified, 0) * HEURISTIC_FRACTION, HEURISTIC_MAX_SECONDS)
+    return 0
+
+
+class HttpCache(cache.ResultCache):
+    """以URL为键的响应缓存，复用ResultCache的目录布局与LRU淘汰
+
+    元数据里保存ETag/Last-Modified和新鲜期，过期后用条件请求验证。
+    """
+
+    def url_key(self, url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """返回元数据，body_path 指向缓存的响应体"""
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            meta['body_path'] = meta_path.with_name(meta['artifact'])
+            meta['body_path'].stat()
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            self._count('misses')
+            return None
+        self._count('hits')
+        return meta
+
+    def save(self, key: str, body: bytes, meta: Dict) -> None:
+        """写入响应体和元数据；先写临时文件再rename"""
+        meta_path = self._meta_path(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        artifact = meta_path.with_name(f'{key}.body')
+        tmp_suffix = f'.tmp{os.getpid()}_{threading.get_ident()}'
+
+        tmp_artifact = artifact.with_name(artifact.name + tmp_suffix)
+        with open(tmp_artifact, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_artifact, artifact)
+        self.touch(key, dict(meta, artifact=artifact.name, size=len(body)))
+
+        self._count('stores')
+        self.evict()
+
+    def touch(self, key: str, meta: Dict) -> None:
+        """只更新元数据(304验证成功后刷新新鲜期)"""
+        meta_path = self._meta_path(key)
+        tmp_meta = meta_path.with_name(meta_path.name + f'.tmp{os.getpid()}_{threading.get_ident()}')
+        with open(tmp_meta, 'w') as f:
+            json.dump({k: v for k, v in meta.items() if k != 'body_path'}, f)
+        os.replace(tmp_meta, meta_path)
+
+
+class Fetcher:
+    """共享requests.Session的抓取器
+
+    连接池在同一函数实例的多次调用间复用(keep-alive)，响应按块读取并在超过上限时中止，
+    可缓存的响应写入 HttpCache，重复抓取同一URL时直接命中或用304验证。
+    """
+
+    def __init__(self, http_cache: HttpCache, max_bytes: int, deadline: float = 30):
+        self.http_cache = http_cache
+        self.max_bytes = max_bytes
+        self.deadline = deadline
+        self._session = None
+        self._lock = threading.Lock()
+        self._counters = {
+            'requests': 0, 'network': 0, 'fresh': 0, 'notModified': 0,
+            'bytes': 0, 'fetchMs': 0.0, 'parseMs': 0.0,
+        }
+
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    requests = lazy.load('requests')
+                    retry = lazy.load('urllib3.util.retry').Retry(
+                        total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                        allowed_methods=('GET', 'HEAD'),
+                    )
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+                    session = requests.Session()
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    session.headers.update({
+                        'User-Agent': USER_AGENT,
+                        # 安装了brotli/zstandard时urllib3会在这里加上br/zstd并负责解码
+                        'Accept-Encoding': lazy.load('urllib3.util.request').ACCEPT_ENCODING,
+                    })
+                    self._session = session
+        return self._session
+
+    def _count(self, name: str, value=1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def record_parse(self, seconds: float) -> None:
+        self._count('parseMs', seconds * 1000)
+
+    def fetch(self, url: str, use_cache: bool = True) -> Dict:
+        """抓取URL，返回 content/url/contentType/status/cache/fetchMs
+
+        cache 为 hit(新鲜期内直接返回)、revalidated(304)、miss 或 bypass。
+        """
+        start = time.perf_counter()
+        self._count('requests')
+        key = self.http_cache.url_key(url)
+        cached = None
+        if self.http_cache.enabled and use_cache:
+            cached = self.http_cache.lookup(key)
+        else:
+            self.http_cache.bypass()
+
+        if cached and time.time() - cached['stored'] < cached['lifetime']:
+            result = self._from_cache(cached, 'hit')
+            self._count('fresh')
+            return self._finish(result, start)
+
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('lastModified'):
+                headers['If-Modified-Since'] = cached['lastModified']
+
+        self._count('network')
+        response = self.session().get(url, headers=headers, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        with response:
+            if response.status_code == 304 and cached:
+                self._count('notModified')
+                # 304没有带缓存头时沿用原来的新鲜期
+                lifetime = cached['lifetime']
+                if 'cache-control' in response.headers or 'expires' in response.headers:
+                    lifetime = freshness_lifetime(response.headers)
+                if lifetime is not None:
+                    cached.update(stored=time.time() - _age(response.headers), lifetime=lifetime)
+                    try:
+                        self.http_cache.touch(key, cached)
+                    except OSError:
+                        pass
+                return self._finish(self._from_cache(cached, 'revalidated'), start)
+
+            response.raise_for_status()
+            content = self._read(response, start)
+
+        result = {
+            'content': content,
+            'url': response.url,
+            'status': response.status_code,
+            'contentType': response.headers.get('content-type', ''),
+            'encoding': response.encoding if 'charset' in response.headers.get('content-type', '').lower() else None,
+            'cache': 'miss' if use_cache else 'bypass',
+        }
+        lifetime = freshness_lifetime(response.headers)
+        if self.http_cache.enabled and lifetime is not None:
+            validators = {
+                'etag': response.headers.get('etag'),
+                'lastModified': response.headers.get('last-modified'),
+            }
+            # 没有验证器且新鲜期为0的响应存了也用不上
+            if lifetime > 0 or any(validators.values()):
+                try:
+                    self.http_cache.save(key, content, dict(
+                        validators,
+                        url=result['url'],
+                        status=result['status'],
+                        contentType=result['contentType'],
+                        encoding=result['encoding'],
+                        stored=time.time() - _age(response.headers),
+                        lifetime=lifetime,
+                    ))
+                except OSError:
+                    # 缓存写入失败不影响本次抓取
+                    pass
+        return self._finish(result, start)
+
+    def _read(self, response, start: float) -> bytes:
+        """按块读取(已解压的)响应体，超过大小上限或总时限时中止"""
+        declared = response.headers.get('content-length')
+        if declared and declared.isdigit() and 'content-encoding' not in response.headers and int(declared) > self.max_bytes:
+            raise ResponseTooLarge(f'Response is {int(declared)} bytes, limit is {self.max_bytes}')
+
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(READ_CHUNK_SIZE):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise ResponseTooLarge(f'Response exceeds {self.max_bytes} bytes')
+            if time.perf_counter() - start > self.deadline:
+                raise TimeoutError(f'Fetching took longer than {self.deadline}s')
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _from_cache(self, meta: Dict, state: str) -> Dict:
+        with open(meta['body_path'], 'rb') as f:
+            content = f.read()
+        return {
+            'content': content,
+            'url': meta['url'],
+            'status': meta['status'],
+            'contentType': meta.get('contentType', ''),
+            'encoding': meta.get('encoding'),
+            'cache': state,
+        }
+
+    def _finish(self, result: Dict, start: float) -> Dict:
+        result['fetchMs'] = round((time.perf_counter() - start) * 1000, 2)
+        self._count('bytes', len(result['content']))
+        self._count('fetchMs', result['fetchMs'])
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        counters['fetchMs'] = round(counters['fetchMs'], 2)
+        counters['parseMs'] = round(counters['parseMs'], 2)
+        counters['maxBytes'] = self.max_bytes
+        counters['cache'] = self.http_cache.stats()
+        return counters
+
+
+def _age(headers: Dict[str, str]) -> float:
+    """响应在上游缓存中已经存放的时间"""
+    try:
+        return max(int(headers.get('age', '0')), 0)
+    except ValueError:
+        return 0
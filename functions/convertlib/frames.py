@@ -0,0 +1,299 @@
+"""视频截帧：封面缩略图、雪碧图(contact sheet)、均匀取N帧、GIF/WEBP动图预览
+
+截帧时ffmpeg按时间seek到目标之前的关键帧，只解码这一个关键帧(-skip_frame nokey)，
+耗时与视频长度无关；没有ffmpeg时退回cv2.VideoCapture(seek后逐帧解码到目标时间，较慢)。
+因此返回的是目标时间点之前最近的关键帧。缩放、拼图和编码用cv2，动图用Pillow。
+截出的帧按 输入哈希/时间戳/宽度 缓存在磁盘上，同一视频再次生成缩略图或预览时不再启动ffmpeg。
+"""
+
+import math
+import os
+import subprocess
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from convertlib import batch, lazy, media
+
+# 操作 -> 支持的输出格式(第一个为默认)；frames的输出是这些格式图片的zip
+FORMATS = {
+    'thumbnail': ('jpg', 'png', 'webp'),
+    'sprite': ('jpg', 'png', 'webp'),
+    'frames': ('jpg', 'png', 'webp'),
+    'preview': ('webp', 'gif'),
+}
+
+# 单次请求最多截取的帧数和最大宽度
+MAX_FRAMES = 100
+MAX_WIDTH = 1920
+
+# 有损格式的编码质量
+QUALITY = 85
+
+# 每写入多少帧检查一次缓存总大小
+EVICT_INTERVAL = 64
+
+
+def _np():
+    return lazy.load('numpy')
+
+
+def _cv2():
+    return lazy.load('cv2')
+
+
+def duration(src: Path) -> float:
+    """视频时长(秒)；没有ffmpeg时由cv2按帧数和帧率估算"""
+    try:
+        return media.probe(src)['duration']
+    except media.MediaError:
+        cv2 = _cv2()
+        capture = cv2.VideoCapture(str(src))
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        finally:
+            capture.release()
+        return count / fps if fps > 0 and count > 0 else 0.0
+
+
+def spaced_timestamps(total: float, count: int) -> List[float]:
+    """把时长均匀分成count段，取每段的中点；时长未知时都取0"""
+    if total <= 0:
+        return [0.0] * count
+    return [round(total * (i + 0.5) / count, 3) for i in range(count)]
+
+
+def _resize(frame, width: int):
+    cv2 = _cv2()
+    height, current = frame.shape[:2]
+    if current <= width:
+        return frame
+    new_height = max(2, int(round(height * width / current / 2)) * 2)
+    return cv2.resize(frame, (width, new_height), interpolation=cv2.INTER_AREA)
+
+
+def grab_keyframe(src: Path, seconds: float, width: int):
+    """ffmpeg截取seconds之前最近的关键帧，按宽度缩小(不放大)，返回BGR数组"""
+    exe = media.ffmpeg_exe()
+    if not exe:
+        raise media.MediaError('ffmpeg not available')
+    # -copyts 保留原时间戳，seek超过结尾时输出最后一个关键帧而不是空结果
+    proc = subprocess.run([
+        exe, '-hide_banner', '-nostdin', '-loglevel', 'error',
+        '-skip_frame', 'nokey', '-noaccurate_seek', '-copyts', '-ss', f'{seconds:.3f}', '-i', str(src),
+        '-map', '0:v:0', '-frames:v', '1', '-vf', f"scale='min({width},iw)':-2",
+        '-c:v', 'bmp', '-f', 'image2pipe', 'pipe:1',
+    ], capture_output=True)
+    if proc.returncode != 0 or not proc.stdout:
+        raise media.MediaError(proc.stderr.decode(errors='replace').strip() or f'No frame at {seconds:.3f}s')
+    np, cv2 = _np(), _cv2()
+    return cv2.imdecode(np.frombuffer(proc.stdout, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _grab_with_capture(src: Path, times: List[float], width: int) -> List:
+    """没有ffmpeg时用cv2.VideoCapture逐个seek"""
+    cv2 = _cv2()
+    capture = cv2.VideoCapture(str(src))
+    if not capture.isOpened():
+        raise media.MediaError('Cannot open video')
+    try:
+        frames = []
+        for seconds in times:
+            capture.set(cv2.CAP_PROP_POS_MSEC, seconds * 1000)
+            ok, frame = capture.read()
+            if not ok:
+                # 超过结尾时取最后一帧
+                capture.set(cv2.CAP_PROP_POS_FRAMES, max(0, capture.get(cv2.CAP_PROP_FRAME_COUNT) - 1))
+                ok, frame = capture.read()
+            if not ok:
+                raise media.MediaError(f'No frame at {seconds:.3f}s')
+            frames.append(_resize(frame, width))
+        return frames
+    finally:
+        capture.release()
+
+
+class FrameCache:
+    """按 输入哈希/时间戳(毫秒)_宽度 保存截出的帧(PNG)
+
+    文件的mtime即最近访问时间，总大小超过上限时从最久未访问的帧开始删除；多个进程可共享同一目录。
+    """
+
+    def __init__(self, root: Path, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._since_evict = 0
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def _path(self, input_hash: str, seconds: float, width: int) -> Path:
+        return self.root / input_hash[:2] / input_hash / f'{int(round(seconds * 1000))}_{width}.png'
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, input_hash: str, seconds: float, width: int):
+        path = self._path(input_hash, seconds, width)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            self._count('misses')
+            return None
+        np, cv2 = _np(), _cv2()
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        self._count('hits' if frame is not None else 'misses')
+        return frame
+
+    def put(self, input_hash: str, seconds: float, width: int, frame) -> None:
+        """写入临时文件后rename，并发请求不会读到半张图"""
+        ok, data = _cv2().imencode('.png', frame)
+        if not ok:
+            return
+        path = self._path(input_hash, seconds, width)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.tmp{os.getpid()}_{threading.get_ident()}')
+        tmp.write_bytes(data.tobytes())
+        os.replace(tmp, path)
+        self._count('stores')
+        with self._lock:
+            self._since_evict += 1
+            due = self._since_evict >= EVICT_INTERVAL
+            if due:
+                self._since_evict = 0
+        if due:
+            self.evict()
+
+    def evict(self) -> None:
+        """总大小超过上限时，从最久未访问的帧开始删除"""
+        entries = []
+        total = 0
+        for path in self.root.glob('*/*/*.png'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            total += stat.st_size
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self._count('evictions')
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['hits'] + counters['misses']
+        counters['hitRate'] = round(counters['hits'] / lookups, 3) if lookups else None
+        counters['enabled'] = self.enabled
+        counters['maxBytes'] = self.max_bytes
+        return counters
+
+
+def extract(src: Path, times: List[float], width: int, input_hash: Optional[str] = None,
+            frame_cache: Optional[FrameCache] = None, progress: Callable[[float], None] = None):
+    """截取各时间点的帧，返回 (帧列表, 命中缓存的帧数)
+
+    缓存未命中的时间点并发启动ffmpeg截取，每个都是独立进程。
+    """
+    use_cache = bool(frame_cache and frame_cache.enabled and input_hash)
+    frames = [frame_cache.get(input_hash, t, width) if use_cache else None for t in times]
+    missing = [i for i, frame in enumerate(frames) if frame is None]
+    cached = len(times) - len(missing)
+    if not missing:
+        return frames, cached
+
+    def finish(index: int, frame) -> None:
+        frames[index] = frame
+        if use_cache:
+            try:
+                frame_cache.put(input_hash, times[index], width, frame)
+            except OSError:
+                # 缓存写入失败不影响本次结果
+                pass
+        if progress:
+            progress(sum(1 for f in frames if f is not None) / len(frames))
+
+    if media.ffmpeg_exe():
+        with ThreadPoolExecutor(min(len(missing), max(2, batch.worker_count()))) as executor:
+            for index, frame in zip(missing, executor.map(lambda i: grab_keyframe(src, times[i], width), missing)):
+                finish(index, frame)
+    else:
+        for index, frame in zip(missing, _grab_with_capture(src, [times[i] for i in missing], width)):
+            finish(index, frame)
+    return frames, cached
+
+
+def encode_image(frame, fmt: str) -> bytes:
+    cv2 = _cv2()
+    options = {
+        'jpg': ('.jpg', [cv2.IMWRITE_JPEG_QUALITY, QUALITY]),
+        'png': ('.png', []),
+        'webp': ('.webp', [cv2.IMWRITE_WEBP_QUALITY, QUALITY]),
+    }
+    ext, params = options[fmt]
+    ok, data = cv2.imencode(ext, frame, params)
+    if not ok:
+        raise media.MediaError(f'Failed to encode {fmt}')
+    return data.tobytes()
+
+
+def _uniform(frames: List) -> List:
+    """分辨率中途变化时把所有帧缩放到第一帧的尺寸"""
+    cv2 = _cv2()
+    height, width = frames[0].shape[:2]
+    return [f if f.shape[:2] == (height, width) else cv2.resize(f, (width, height), interpolation=cv2.INTER_AREA)
+            for f in frames]
+
+
+def write_thumbnail(frame, dst: Path, fmt: str) -> None:
+    dst.write_bytes(encode_image(frame, fmt))
+
+
+def write_sprite(frames: List, times: List[float], dst: Path, fmt: str, columns: int) -> Dict:
+    """把帧按行排成一张图，返回每个格子的位置，供前端拖动进度条时显示"""
+    np = _np()
+    frames = _uniform(frames)
+    height, width = frames[0].shape[:2]
+    columns = max(1, min(columns, len(frames)))
+    rows = math.ceil(len(frames) / columns)
+    sheet = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+    tiles = []
+    for index, (frame, seconds) in enumerate(zip(frames, times)):
+        x, y = (index % columns) * width, (index // columns) * height
+        sheet[y:y + height, x:x + width] = frame
+        tiles.append({'time': seconds, 'x': x, 'y': y, 'width': width, 'height': height})
+    dst.write_bytes(encode_image(sheet, fmt))
+    return {'columns': columns, 'rows': rows, 'tiles': tiles}
+
+
+def write_frames_zip(frames: List, times: List[float], dst: Path, fmt: str) -> None:
+    # 图片本身已压缩，zip只做打包
+    with zipfile.ZipFile(dst, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for index, (frame, seconds) in enumerate(zip(frames, times)):
+            archive.writestr(f'frame_{index + 1:03d}_{seconds:.3f}s.{fmt}', encode_image(frame, fmt))
+
+
+def write_preview(frames: List, dst: Path, fmt: str, fps: float) -> None:
+    """GIF/WEBP动图，按fps循环播放"""
+    cv2 = _cv2()
+    Image = lazy.load('PIL.Image')
+    images = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in _uniform(frames)]
+    options = {'save_all': True, 'append_images': images[1:], 'duration': int(1000 / fps), 'loop': 0}
+    if fmt == 'webp':
+        options.update(quality=QUALITY - 15, method=4)
+    else:
+        options.update(optimize=False)
+    images[0].save(dst, 'WEBP' if fmt == 'webp' else 'GIF', **options)
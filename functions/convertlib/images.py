@@ -0,0 +1,421 @@
+"""图像转换：缩减解码(draft)、缩放、像素预算、按条带处理超大图、多帧逐帧编码与编码器参数"""
+
+import math
+import os
+import threading
+import warnings
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from convertlib import lazy
+
+# 同一时刻允许解码到内存的像素数(约4字节/像素)
+MAX_PIXELS = int(os.environ.get('CONVERT_IMAGE_MAX_PIXELS', 40_000_000))
+
+# 超出预算的未压缩图按条带解码，每条带的像素数
+BAND_PIXELS = int(os.environ.get('CONVERT_IMAGE_BAND_PIXELS', 4_000_000))
+
+# 按条带处理时允许打开的最大源图像素数；超过Pillow默认上限时只在打开文件头时临时放宽
+MAX_BANDED_PIXELS = int(os.environ.get('CONVERT_IMAGE_MAX_BANDED_PIXELS', 1_000_000_000))
+
+# 目标格式 -> (PIL格式名, 保存参数)
+SAVE_OPTIONS = {
+    'jpg': ('JPEG', {'quality': 90}),
+    'jpeg': ('JPEG', {'quality': 90}),
+    'png': ('PNG', {}),
+    'webp': ('WEBP', {'quality': 90}),
+    'bmp': ('BMP', {}),
+    'tiff': ('TIFF', {}),
+    'gif': ('GIF', {}),
+    'pdf': ('PDF', {}),
+}
+
+# 可以保存多帧(动画/多页)的格式
+ANIMATED_FORMATS = {'WEBP', 'GIF', 'TIFF', 'PDF'}
+
+# 多帧输入最多处理的帧数
+MAX_FRAMES = int(os.environ.get('CONVERT_IMAGE_MAX_FRAMES', 2000))
+
+# 源帧没有时长信息(如多页TIFF)时每帧的毫秒数
+DEFAULT_FRAME_DURATION = 100
+
+# 编码速度/体积档位；balanced与PIL默认值一致
+EFFORT_OPTIONS = {
+    'fast': {'JPEG': {}, 'PNG': {'compress_level': 1}, 'WEBP': {'method': 0}, 'TIFF': {}},
+    'balanced': {'JPEG': {}, 'PNG': {'compress_level': 6}, 'WEBP': {'method': 4}, 'TIFF': {}},
+    'small': {
+        'JPEG': {'optimize': True},
+        'PNG': {'compress_level': 9, 'optimize': True},
+        'WEBP': {'method': 6},
+        'TIFF': {'compression': 'tiff_adobe_deflate'},
+    },
+}
+
+DEFAULT_EFFORT = os.environ.get('CONVERT_IMAGE_EFFORT', 'balanced')
+
+FIT_MODES = ('contain', 'cover', 'fill', 'thumbnail')
+
+# EXIF方向为这些值时宽高互换
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class ImageTooLarge(ValueError):
+    """解码所需像素或帧数超出预算"""
+
+
+_open_lock = threading.Lock()
+
+
+def _pil():
+    return lazy.load('PIL.Image')
+
+
+def _open_image(src):
+    """打开图像(只读文件头)，Pillow的解压炸弹上限只在这里局部放宽
+
+    真正解码的像素数由调用方按MAX_PIXELS检查，超出预算的只能走条带路径。
+    """
+    Image = _pil()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        try:
+            return Image.open(src)
+        except Image.DecompressionBombError:
+            pass
+        # 超过默认上限两倍时Pillow直接报错；加锁临时提高到有限的MAX_BANDED_PIXELS后重新打开
+        with _open_lock:
+            default = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = MAX_BANDED_PIXELS // 2
+            try:
+                return Image.open(src)
+            except Image.DecompressionBombError as e:
+                raise ImageTooLarge(str(e)) from None
+            finally:
+                Image.MAX_IMAGE_PIXELS = default
+
+
+def _positive_int(value, name: str) -> Optional[int]:
+    if value in (None, ''):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {name}: {value}')
+    if number < 1:
+        raise ValueError(f'Invalid {name}: {value}')
+    return number
+
+
+def plan_resize(size: Tuple[int, int], width: Optional[int], height: Optional[int],
+                fit: str = 'contain') -> Tuple[Tuple[int, int], Tuple[float, float, float, float]]:
+    """计算输出尺寸和源图上的裁剪框
+
+    contain: 等比缩放到框内；thumbnail: 同contain但不放大；
+    cover: 等比铺满并居中裁剪；fill: 拉伸到指定尺寸。
+    只给宽或高时按比例推算另一边。
+    """
+    if fit not in FIT_MODES:
+        raise ValueError(f'Invalid fit: {fit}')
+    src_w, src_h = size
+    box = (0.0, 0.0, float(src_w), float(src_h))
+    if not width and not height:
+        return size, box
+    if not width or not height:
+        scale = width / src_w if width else height / src_h
+        if fit == 'thumbnail':
+            scale = min(scale, 1.0)
+        return (max(1, round(src_w * scale)), max(1, round(src_h * scale))), box
+
+    if fit == 'fill':
+        return (width, height), box
+    if fit == 'cover':
+        scale = max(width / src_w, height / src_h)
+        crop_w, crop_h = width / scale, height / scale
+        left, top = (src_w - crop_w) / 2, (src_h - crop_h) / 2
+        return (width, height), (left, top, left + crop_w, top + crop_h)
+
+    scale = min(width / src_w, height / src_h)
+    if fit == 'thumbnail':
+        scale = min(scale, 1.0)
+    return (max(1, round(src_w * scale)), max(1, round(src_h * scale))), box
+
+
+def encoder_options(pil_format: str, quality=None, effort: Optional[str] = None, progressive: bool = False) -> Dict:
+    """合并格式默认参数、速度档位与质量/渐进式设置"""
+    effort = effort or DEFAULT_EFFORT
+    if effort not in EFFORT_OPTIONS:
+        raise ValueError(f'Invalid effort: {effort}')
+    options = {}
+    for fmt, defaults in SAVE_OPTIONS.values():
+        if fmt == pil_format:
+            options.update(defaults)
+            break
+    options.update(EFFORT_OPTIONS[effort].get(pil_format, {}))
+    quality = _positive_int(quality, 'quality')
+    if quality is not None and pil_format in ('JPEG', 'WEBP'):
+        options['quality'] = min(quality, 100)
+    if progressive and pil_format == 'JPEG':
+        options['progressive'] = True
+    return options
+
+
+def _raw_layout(img) -> Optional[Dict]:
+    """未压缩格式(TIFF/BMP/PPM)的像素按行连续存放，可以直接读取一部分行
+
+    返回解码条带所需的信息；压缩格式返回None。
+    """
+    tiles = list(img.tile)
+    if len(tiles) != 1 or tiles[0][0] != 'raw' or tuple(tiles[0][1]) != (0, 0) + img.size:
+        return None
+    _, _, offset, args = tiles[0]
+    if isinstance(args, str):
+        args = (args,)
+    rawmode, stride, ystep = (tuple(args) + (0, 1))[:3]
+    if stride <= 0:
+        try:
+            # 打包一行得到不带对齐的行字节数
+            stride = len(_pil().new(img.mode, (img.size[0], 1)).tobytes('raw', rawmode))
+        except (ValueError, KeyError):
+            return None
+    return {
+        'offset': offset, 'rawmode': rawmode, 'stride': stride, 'ystep': ystep,
+        'mode': img.mode, 'size': img.size,
+        'palette': img.getpalette() if img.mode == 'P' else None,
+        'transparency': img.info.get('transparency'),
+    }
+
+
+def _decode_band(path: Path, layout: Dict, top: int, bottom: int):
+    """只读取并解码 [top, bottom) 行"""
+    Image = _pil()
+    width, height = layout['size']
+    stride = layout['stride']
+    # ystep为-1时(BMP)行从下往上存放
+    first_row = top if layout['ystep'] == 1 else height - bottom
+    with open(path, 'rb') as f:
+        f.seek(layout['offset'] + first_row * stride)
+        data = f.read((bottom - top) * stride)
+    band = Image.frombuffer(layout['mode'], (width, bottom - top), data, 'raw',
+                            layout['rawmode'], stride, layout['ystep'])
+    if layout['palette'] is not None:
+        band.putpalette(layout['palette'])
+    if layout['transparency'] is not None:
+        band.info['transparency'] = layout['transparency']
+    if band.mode in ('1', 'P', 'CMYK', 'YCbCr'):
+        band = band.convert('RGBA' if 'transparency' in band.info else 'RGB')
+    return band
+
+
+def _resize_in_bands(path: Path, layout: Dict,
+                     out_size: Tuple[int, int], box: Tuple[float, float, float, float], resample):
+    """逐条带解码并缩放拼接，内存只占一个条带加输出图"""
+    Image = _pil()
+    width, height = layout['size']
+    left, top, right, bottom = box
+    scale_y = out_size[1] / (bottom - top)
+    # 按输出行划分条带，条带边界对应源图上的小数坐标，拼接结果与整图缩放一致
+    out_rows = max(1, int(BAND_PIXELS // width * scale_y))
+    # 条带上下多解码几行，给重采样核留出邻域，避免拼接处出现接缝
+    margin = math.ceil(3 / scale_y) + 1
+
+    output = None
+    for dest_top in range(0, out_size[1], out_rows):
+        dest_bottom = min(out_size[1], dest_top + out_rows)
+        src_top, src_bottom = top + dest_top / scale_y, top + dest_bottom / scale_y
+        decode_top = max(0, math.floor(src_top) - margin)
+        decode_bottom = min(height, math.ceil(src_bottom) + margin)
+        band = _decode_band(path, layout, decode_top, decode_bottom)
+        part = band.resize((out_size[0], dest_bottom - dest_top), resample,
+                           box=(left, src_top - decode_top, right, src_bottom - decode_top))
+        band.close()
+        if output is None:
+            output = Image.new(part.mode, out_size)
+        output.paste(part, (0, dest_top))
+    return output
+
+
+def iter_frames(img, width: Optional[int], height: Optional[int], fit: str, resample,
+                keep_alpha: bool = True, canvas: Optional[Tuple[int, int]] = None) -> Iterator[Tuple[object, int]]:
+    """用ImageSequence逐帧解码、缩放，产出 (帧, 毫秒时长)
+
+    同一时刻只有当前源帧和它的输出帧在内存中。canvas 不为空时，
+    尺寸不同的帧(多页TIFF)等比缩放后居中补边到该尺寸。
+    """
+    ImageOps = lazy.load('PIL.ImageOps')
+    ImageSequence = lazy.load('PIL.ImageSequence')
+    for frame in ImageSequence.Iterator(img):
+        if frame.size[0] * frame.size[1] > MAX_PIXELS:
+            raise ImageTooLarge(f'Frame is {frame.size[0]}x{frame.size[1]}, exceeding the {MAX_PIXELS} pixel budget')
+        duration = frame.info.get('duration') or DEFAULT_FRAME_DURATION
+        alpha = keep_alpha and ('A' in frame.getbands() or 'transparency' in frame.info)
+        # convert同时把当前帧拷贝出来，源图seek到下一帧后不受影响
+        out = frame.convert('RGBA' if alpha else 'RGB')
+        if width or height:
+            size, box = plan_resize(frame.size, width, height, fit)
+            out = out.resize(size, resample, box=box, reducing_gap=3.0)
+        if canvas is not None and out.size != canvas:
+            out = ImageOps.pad(out, canvas, resample)
+        yield out, duration
+
+
+class _FrameTail:
+    """逐帧生成器剩余的帧，作为append_images里的一个多帧图像交给编码器
+
+    PIL的WEBP/TIFF会先list(append_images)，PDF按 seek(0..n_frames-1) 逐帧读取；
+    这里只能向前seek，当前帧保存在 frame 属性上，其余属性和方法都委托给它，
+    编码器每次只拿到一帧，不需要先把所有帧放进列表。
+    """
+
+    def __init__(self, frames: Iterator[Tuple[object, int]], count: int, durations: list):
+        self.n_frames = count
+        self.is_animated = count > 1
+        # WEBP编码器在seek(i)之后才读取duration[i]，这里随seek追加
+        self.durations = durations
+        self.frame = None
+        self._frames = frames
+        self._index = -1
+        self.seek(0)
+
+    def seek(self, index):
+        if index == self._index:
+            return
+        if index != self._index + 1 or index >= self.n_frames:
+            raise EOFError('no more frames')
+        try:
+            frame, duration = next(self._frames)
+        except StopIteration:
+            raise EOFError('no more frames')
+        # 换成新帧，旧帧随之释放
+        self.frame = frame
+        self.durations.append(duration)
+        self._index = index
+
+    def tell(self):
+        return self._index
+
+    def __getattr__(self, name):
+        return getattr(self.frame, name)
+
+
+def _save_gif(frames: Iterator[Tuple[object, int]], dst: Path, loop: int) -> Tuple[int, int, int]:
+    """逐帧写GIF；全局调色板取自第一帧，后续帧量化到同一调色板
+
+    PIL自带的GIF save_all会保留所有帧用于差分，这里直接写出每一帧。
+    """
+    GifImagePlugin = lazy.load('PIL.GifImagePlugin')
+    palette = None
+    count = 0
+    size = (0, 0)
+    with open(dst, 'wb') as fp:
+        for frame, duration in frames:
+            frame = frame.convert('RGB')
+            if palette is None:
+                frame = frame.quantize(256)
+                header, _ = GifImagePlugin.getheader(frame, info={'loop': loop, 'duration': duration})
+                for chunk in header:
+                    fp.write(chunk)
+                palette = frame
+                size = frame.size
+            else:
+                frame = frame.quantize(palette=palette)
+            for chunk in GifImagePlugin.getdata(frame, (0, 0), duration=duration, disposal=1):
+                fp.write(chunk)
+            count += 1
+        fp.write(b';')
+    return size[0], size[1], count
+
+
+def _convert_frames(img, dst: Path, pil_format: str, options: Dict, width: Optional[int],
+                    height: Optional[int], fit: str, resample, frame_count: int) -> Dict:
+    """动画/多页图像逐帧转换为多帧输出"""
+    if frame_count > MAX_FRAMES:
+        raise ImageTooLarge(f'Image has {frame_count} frames, exceeding the limit of {MAX_FRAMES}')
+
+    # 动画格式要求所有帧尺寸一致，多页TIFF/PDF每页可以不同
+    canvas = plan_resize(img.size, width, height, fit)[0] if pil_format in ('WEBP', 'GIF') else None
+    frames = iter_frames(img, width, height, fit, resample,
+                         keep_alpha=pil_format in ('WEBP', 'TIFF'), canvas=canvas)
+    loop = img.info.get('loop', 0)
+
+    if pil_format == 'GIF':
+        out_width, out_height, written = _save_gif(frames, dst, loop)
+    else:
+        first, duration = next(frames)
+        durations = [duration]
+        out_width, out_height = first.size
+        tail = _FrameTail(frames, frame_count - 1, durations)
+        if pil_format == 'WEBP':
+            options = dict(options, duration=durations, loop=loop, background=(0, 0, 0, 0))
+        first.save(dst, pil_format, save_all=True, append_images=[tail], **options)
+        written = len(durations)
+    return {'width': out_width, 'height': out_height, 'decode': 'frames', 'frames': written}
+
+
+def convert_image(src: Path, dst: Path, target: str, width=None, height=None, fit: str = 'contain',
+                  quality=None, effort: Optional[str] = None, progressive: bool = False,
+                  animated: bool = True) -> Dict:
+    """转换图像格式，可选缩放；返回输出尺寸和解码方式
+
+    解码方式: full 完整解码；draft JPEG按1/2、1/4、1/8缩减解码；
+    bands 超出像素预算时按条带解码并缩放；frames 动画/多页输入逐帧转换。
+    animated 为False时多帧输入只转换第一帧。
+    """
+    Image = _pil()
+    ImageOps = lazy.load('PIL.ImageOps')
+
+    target = target.lower()
+    if target not in SAVE_OPTIONS:
+        raise ValueError(f'Unsupported image format: {target}')
+    pil_format = SAVE_OPTIONS[target][0]
+    options = encoder_options(pil_format, quality, effort, progressive)
+    width, height = _positive_int(width, 'width'), _positive_int(height, 'height')
+    resample = Image.Resampling.BILINEAR if (effort or DEFAULT_EFFORT) == 'fast' else Image.Resampling.LANCZOS
+
+    with _open_image(src) as img:
+        frame_count = getattr(img, 'n_frames', 1)
+        if animated and frame_count > 1 and pil_format in ANIMATED_FORMATS:
+            return _convert_frames(img, Path(dst), pil_format, options, width, height, fit, resample, frame_count)
+
+        # 只读了文件头，尺寸按EXIF方向换算
+        orientation = img.getexif().get(0x0112, 1)
+        rotated = orientation in _ROTATED_ORIENTATIONS
+        oriented = img.size[::-1] if rotated else img.size
+        out_size, box = plan_resize(oriented, width, height, fit)
+        method = 'full'
+
+        if out_size != oriented and img.format == 'JPEG':
+            # 需要的尺寸(含裁剪)换算到未旋转的源图上，draft选不小于它的最大缩减倍数
+            scale = max(out_size[0] / (box[2] - box[0]), out_size[1] / (box[3] - box[1]))
+            need = (max(1, int(img.size[0] * scale)), max(1, int(img.size[1] * scale)))
+            before = img.size
+            img.draft(img.mode if img.mode in ('RGB', 'L') else 'RGB', need)
+            if img.size != before:
+                method = 'draft'
+                factor = img.size[0] / before[0]
+                box = tuple(v * factor for v in box)
+                oriented = img.size[::-1] if rotated else img.size
+
+        pixels = img.size[0] * img.size[1]
+        if pixels > MAX_PIXELS:
+            layout = _raw_layout(img) if orientation == 1 else None
+            if layout is None or out_size[0] * out_size[1] > MAX_PIXELS:
+                raise ImageTooLarge(
+                    f'Image is {img.size[0]}x{img.size[1]}, exceeding the {MAX_PIXELS} pixel budget; '
+                    f'request a smaller width/height'
+                )
+            result = _resize_in_bands(Path(src), layout, out_size, box, resample)
+            method = 'bands'
+        else:
+            img.load()
+            result = ImageOps.exif_transpose(img) if orientation != 1 else img
+            if out_size != oriented:
+                # reducing_gap 先用reduce()做整数倍缩小，再精细重采样
+                result = result.resize(out_size, resample, box=box, reducing_gap=3.0)
+            elif fit == 'cover':
+                result = result.crop(tuple(round(v) for v in box))
+
+        # JPEG/PDF不支持透明通道，转换为RGB
+        if pil_format in ('JPEG', 'PDF') and result.mode not in ('RGB', 'L', 'CMYK'):
+            result = result.convert('RGB')
+        result.save(dst, pil_format, **options)
+        return {'width': result.size[0], 'height': result.size[1], 'decode': method}
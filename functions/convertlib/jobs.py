@@ -0,0 +1,206 @@
+"""长时间转换的异步任务队列与任务状态存储"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+# 进度写入存储的最小间隔(秒)和最小变化量
+PROGRESS_INTERVAL = 0.5
+PROGRESS_STEP = 0.01
+
+
+class MemoryJobStore:
+    """进程内任务存储，主要用于测试"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, kind: str) -> Dict:
+        now = time.time()
+        job = {
+            'id': job_id, 'kind': kind, 'state': QUEUED, 'progress': 0.0, 'detail': None,
+            'result': None, 'error': None, 'created': now, 'updated': now,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        return dict(job)
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated=time.time())
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def prune(self, max_age: float) -> int:
+        """删除结束超过 max_age 秒的任务，返回删除的个数"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['state'] in FINISHED and job['updated'] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore:
+    """SQLite任务存储，同一台机器上的多个进程可以共享"""
+
+    def __init__(self, path: Path):
+        self.path = str(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY, kind TEXT, state TEXT, progress REAL,'
+                ' result TEXT, error TEXT, created REAL, updated REAL, detail TEXT)'
+            )
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'detail' not in columns:
+                # 旧版本创建的数据库没有detail列
+                conn.execute('ALTER TABLE jobs ADD COLUMN detail TEXT')
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite连接不能跨线程共享，每个线程一个
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id: str, kind: str) -> Dict:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, state, progress, created, updated) VALUES (?, ?, ?, 0, ?, ?)',
+                (job_id, kind, QUEUED, now, now),
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields) -> None:
+        for name in ('result', 'detail'):
+            if name in fields:
+                fields[name] = json.dumps(fields[name])
+        fields['updated'] = time.time()
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['detail'] = json.loads(job['detail']) if job.get('detail') else None
+        return job
+
+    def prune(self, max_age: float) -> int:
+        """删除结束超过 max_age 秒的任务，返回删除的个数"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM jobs WHERE state IN ({', '.join('?' for _ in FINISHED)}) AND updated < ?",
+                (*FINISHED, time.time() - max_age),
+            )
+        return cursor.rowcount
+
+
+class JobQueue:
+    """本地线程池执行任务
+
+    任务函数以关键字参数 progress 接收进度回调，返回值与各
+    handle_*_sync 一样是HTTP响应字典。设置 runner 后由它代替直接调用，
+    签名为 runner(job_id, fn, args, kwargs, progress)，例如服务模式下交给进程池执行。
+    """
+
+    def __init__(self, store, max_workers: int = 2):
+        self.store = store
+        self.runner: Optional[Callable] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='convert-job')
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> Dict:
+        job = self.store.create(str(uuid.uuid4()), kind)
+        self._executor.submit(self._run, job['id'], fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    def prune(self, max_age: float) -> int:
+        return self.store.prune(max_age)
+
+    def _run(self, job_id: str, fn: Callable, args, kwargs) -> None:
+        try:
+            self.store.update(job_id, state=RUNNING)
+            progress = self.progress_callback(job_id)
+            if self.runner is not None:
+                response = self.runner(job_id, fn, args, kwargs, progress)
+            else:
+                response = fn(*args, progress=progress, **kwargs)
+            body = json.loads(response.get('body') or '{}')
+            if response.get('statusCode') == 200:
+                self.store.update(job_id, state=SUCCEEDED, progress=1.0, result=body)
+            else:
+                self.store.update(job_id, state=FAILED, error=body.get('error', 'Conversion failed'))
+        except Exception as e:
+            self.store.update(job_id, state=FAILED, error=str(e))
+
+    def progress_callback(self, job_id: str) -> Callable[..., None]:
+        """节流后的进度回调，避免每一帧都写存储；存储为SQLite时也可以在其他进程里创建
+
+        detail 为附加的进度信息(如下载速度、剩余时间)，带detail时即使进度变化很小也按间隔更新。
+        """
+        last = {'time': 0.0, 'value': 0.0}
+
+        def report(fraction: float, detail: Optional[Dict] = None) -> None:
+            fraction = max(0.0, min(1.0, fraction))
+            now = time.monotonic()
+            if fraction < 1.0 and (now - last['time'] < PROGRESS_INTERVAL
+                                   or (detail is None and fraction - last['value'] < PROGRESS_STEP)):
+                return
+            last['time'], last['value'] = now, fraction
+            if detail is None:
+                self.store.update(job_id, progress=round(fraction, 4))
+            else:
+                self.store.update(job_id, progress=round(fraction, 4), detail=detail)
+
+        return report
+
+
+def ytdlp_progress_hook(progress: Callable[..., None]) -> Callable[[Dict], None]:
+    """yt-dlp的progress_hooks回调"""
+
+    def hook(d: Dict) -> None:
+        if d.get('status') == 'downloading':
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            detail = {
+                'downloadedBytes': d.get('downloaded_bytes'),
+                'totalBytes': total,
+                'speed': d.get('speed'),
+                'eta': d.get('eta'),
+            }
+            if d.get('fragment_count'):
+                detail['fragment'] = d.get('fragment_index')
+                detail['fragmentCount'] = d['fragment_count']
+            fraction = d.get('downloaded_bytes', 0) / total if total else (
+                (d.get('fragment_index') or 0) / d['fragment_count'] if d.get('fragment_count') else 0.0
+            )
+            progress(fraction, detail)
+        elif d.get('status') == 'finished':
+            progress(1.0)
+
+    return hook
@@ -0,0 +1,76 @@
+"""按转换类型延迟加载重量级依赖"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List
+
+# 每种转换路径需要的后端模块
+BACKENDS: Dict[str, List[str]] = {
+    'image': ['PIL.Image', 'PIL.ImageOps', 'PIL.ImageSequence'],
+    'document': ['PyPDF2', 'docx', 'reportlab.platypus', 'reportlab.pdfgen.canvas'],
+    'youtube': ['yt_dlp'],
+    'webpage': ['requests', 'lxml.etree'],
+    'frames': ['numpy', 'cv2'],
+}
+
+# 模块名 -> 首次导入耗时(秒)
+IMPORT_TIMES: Dict[str, float] = {}
+
+_lock = threading.Lock()
+
+
+def load(name: str):
+    """导入模块，首次导入时记录耗时"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        IMPORT_TIMES[name] = time.perf_counter() - start
+        return module
+
+
+def warm_up(groups: Iterable[str]) -> Dict[str, str]:
+    """预先导入指定转换类型的后端，返回每个模块的结果"""
+    results = {}
+    for group in groups:
+        for name in BACKENDS.get(group, []):
+            try:
+                load(name)
+                results[name] = 'ok'
+            except Exception as e:
+                results[name] = f'error: {e}'
+    return results
+
+
+def warm_up_from_env(var: str = 'CONVERT_WARMUP') -> Dict[str, str]:
+    """根据环境变量预热，例如 CONVERT_WARMUP=image,document 或 all"""
+    value = os.environ.get(var, '').strip()
+    if not value:
+        return {}
+    groups = list(BACKENDS) if value == 'all' else [g.strip() for g in value.split(',') if g.strip()]
+    return warm_up(groups)
+
+
+def import_report() -> Dict:
+    """各后端模块的导入状态与耗时(毫秒)"""
+    modules = {}
+    for group, names in BACKENDS.items():
+        for name in names:
+            modules[name] = {
+                'group': group,
+                'loaded': name in sys.modules,
+                'importMs': round(IMPORT_TIMES[name] * 1000, 2) if name in IMPORT_TIMES else None,
+            }
+    return {
+        'modules': modules,
+        'totalImportMs': round(sum(IMPORT_TIMES.values()) * 1000, 2),
+    }
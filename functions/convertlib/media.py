@@ -0,0 +1,330 @@
+"""基于ffmpeg的音视频探测、封装转换(remux)与转码"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from convertlib import batch
+
+
+class MediaError(RuntimeError):
+    """ffmpeg/ffprobe执行失败"""
+
+
+# 各容器可以直接复制(不重新编码)的编码格式；None表示不限制
+CONTAINER_CODECS = {
+    'mp4': ({'h264', 'hevc', 'mpeg4', 'av1'}, {'aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus'}),
+    'mov': ({'h264', 'hevc', 'mpeg4', 'prores', 'mjpeg'}, {'aac', 'mp3', 'alac', 'ac3', 'pcm_s16le'}),
+    'mkv': (None, None),
+    'webm': ({'vp8', 'vp9', 'av1'}, {'vorbis', 'opus'}),
+    'avi': ({'mpeg4', 'h264', 'mjpeg', 'msmpeg4v3'}, {'mp3', 'ac3', 'pcm_s16le'}),
+    'flv': ({'h264', 'flv1'}, {'aac', 'mp3'}),
+}
+
+# 需要转码时使用的CPU编码器(视频, 音频)
+VIDEO_ENCODERS = {
+    'mp4': ('libx264', 'aac'),
+    'mov': ('libx264', 'aac'),
+    'mkv': ('libx264', 'aac'),
+    'webm': ('libvpx-vp9', 'libopus'),
+    'avi': ('mpeg4', 'libmp3lame'),
+    'flv': ('libx264', 'aac'),
+}
+
+# 音频目标格式 -> (编码器, 码率, 复用器, 可直接复制的源编码)
+AUDIO_ENCODERS = {
+    'mp3': ('libmp3lame', '192k', 'mp3', {'mp3'}),
+    'wav': ('pcm_s16le', None, 'wav', {'pcm_s16le'}),
+    'flac': ('flac', None, 'flac', {'flac'}),
+    'aac': ('aac', '128k', 'adts', {'aac'}),
+    'm4a': ('aac', '160k', 'ipod', {'aac', 'alac'}),
+    'ogg': ('libvorbis', '192k', 'ogg', {'vorbis', 'opus', 'flac'}),
+    'opus': ('libopus', '128k', 'opus', {'opus'}),
+}
+
+# 速度/质量预设
+PRESETS = {
+    'fast': {'x264': 'veryfast', 'crf': '26', 'vp9_speed': '8', 'vp9_crf': '36', 'mpeg4_q': '6'},
+    'balanced': {'x264': 'medium', 'crf': '23', 'vp9_speed': '4', 'vp9_crf': '32', 'mpeg4_q': '4'},
+    'quality': {'x264': 'slow', 'crf': '20', 'vp9_speed': '1', 'vp9_crf': '28', 'mpeg4_q': '2'},
+}
+
+DEFAULT_PRESET = os.environ.get('CONVERT_VIDEO_PRESET', 'balanced')
+
+# 分段并行转码：时长不足该值(秒)的视频直接单进程转码，分段的额外开销不划算
+SEGMENT_MIN_DURATION = float(os.environ.get('CONVERT_VIDEO_SEGMENT_MIN_DURATION', '30'))
+
+# 每段的最短时长(秒)；实际切点落在其后的第一个关键帧上
+SEGMENT_MIN_SECONDS = 5.0
+
+# 每个worker分到的段数，段越多负载越均衡
+SEGMENTS_PER_WORKER = 2
+
+
+def ffmpeg_exe() -> Optional[str]:
+    """系统ffmpeg，没有时使用moviepy自带的imageio-ffmpeg"""
+    exe = shutil.which('ffmpeg')
+    if exe:
+        return exe
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def probe(path: Path) -> Dict:
+    """读取容器、时长和各路流的编码
+
+    优先用ffprobe；imageio-ffmpeg不带ffprobe，此时解析 ffmpeg -i 的输出。
+    """
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe:
+        proc = subprocess.run(
+            [ffprobe, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', str(path)],
+            capture_output=True,
+        )
+        if proc.returncode != 0:
+            raise MediaError(proc.stderr.decode(errors='replace').strip() or 'ffprobe failed')
+        data = json.loads(proc.stdout)
+        fmt = data.get('format', {})
+        return {
+            'format': fmt.get('format_name', ''),
+            'duration': float(fmt.get('duration') or 0),
+            'streams': [
+                {'type': s.get('codec_type'), 'codec': s.get('codec_name')}
+                for s in data.get('streams', [])
+                if s.get('codec_type') in ('video', 'audio')
+            ],
+        }
+
+    exe = ffmpeg_exe()
+    if not exe:
+        raise MediaError('ffmpeg not available')
+    proc = subprocess.run([exe, '-hide_banner', '-i', str(path)], capture_output=True)
+    output = proc.stderr.decode(errors='replace')
+    fmt = re.search(r'Input #0, ([^,]+(?:,[^,\s]+)*), from', output)
+    duration = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', output)
+    streams = [
+        {'type': kind.lower(), 'codec': codec}
+        for kind, codec in re.findall(r'Stream #\d+:\d+.*?: (Video|Audio): (\w+)', output)
+    ]
+    if not streams:
+        raise MediaError('No audio or video streams found')
+    return {
+        'format': fmt.group(1) if fmt else '',
+        'duration': (int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))) if duration else 0.0,
+        'streams': streams,
+    }
+
+
+def run_ffmpeg(args: List[str], duration: float = 0.0, progress: Callable[[float], None] = None) -> None:
+    """执行ffmpeg，通过 -progress 输出把进度换算成0-1"""
+    exe = ffmpeg_exe()
+    if not exe:
+        raise MediaError('ffmpeg not available')
+    cmd = [exe, '-hide_banner', '-nostdin', '-y', '-loglevel', 'error', '-progress', 'pipe:1', '-nostats'] + args
+    # stderr写到临时文件，避免在读取进度时管道被写满
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        for line in proc.stdout:
+            if progress and duration and line.startswith(b'out_time_us='):
+                try:
+                    progress(int(line.split(b'=', 1)[1]) / 1e6 / duration)
+                except ValueError:
+                    pass
+        if proc.wait() != 0:
+            stderr.seek(0)
+            message = stderr.read().decode(errors='replace').strip()
+            raise MediaError(message or f'ffmpeg exited with {proc.returncode}')
+
+
+def _video_encoder_args(encoder: str, preset: Dict, threads: int) -> List[str]:
+    if encoder == 'libx264':
+        args = ['-c:v', 'libx264', '-preset', preset['x264'], '-crf', preset['crf'], '-pix_fmt', 'yuv420p']
+    elif encoder == 'libvpx-vp9':
+        args = ['-c:v', 'libvpx-vp9', '-b:v', '0', '-crf', preset['vp9_crf'],
+                '-deadline', 'good', '-cpu-used', preset['vp9_speed'], '-row-mt', '1']
+    else:
+        args = ['-c:v', encoder, '-q:v', preset['mpeg4_q']]
+    return args + ['-threads', str(threads)]
+
+
+def _audio_encoder_args(encoder: str) -> List[str]:
+    bitrate = {'libopus': '128k', 'libmp3lame': '192k', 'aac': '160k'}.get(encoder, '160k')
+    return ['-c:a', encoder, '-b:a', bitrate]
+
+
+def plan_video(info: Dict, target: str) -> Dict:
+    """判断每路流能否直接复制：全部可复制为remux，只转音频为partial，否则transcode"""
+    video_ok, audio_ok = CONTAINER_CODECS.get(target, (set(), set()))
+    videos = [s for s in info['streams'] if s['type'] == 'video']
+    audios = [s for s in info['streams'] if s['type'] == 'audio']
+    copy_video = bool(videos) and (video_ok is None or videos[0]['codec'] in video_ok)
+    copy_audio = all(audio_ok is None or s['codec'] in audio_ok for s in audios)
+    if copy_video and copy_audio:
+        method = 'remux'
+    elif copy_video:
+        method = 'partial'
+    else:
+        method = 'transcode'
+    return {'method': method, 'copy_video': copy_video, 'copy_audio': copy_audio, 'has_audio': bool(audios)}
+
+
+def _split_video(src: Path, workdir: Path, seconds: float) -> List[Path]:
+    """只复制视频流按时长切段，stream copy下切点自动落在关键帧上，每段时间戳从0开始"""
+    run_ffmpeg([
+        '-i', str(src), '-map', '0:v:0', '-an', '-sn', '-dn', '-c', 'copy',
+        '-f', 'segment', '-segment_time', f'{seconds:.3f}', '-reset_timestamps', '1',
+        str(workdir / 'src_%05d.mkv'),
+    ])
+    return sorted(workdir.glob('src_*.mkv'))
+
+
+def transcode_segmented(src: Path, dst: Path, target: str, info: Dict, plan: Dict, settings: Dict,
+                        threads: int = 0, workers: int = 0, progress: Callable[[float], None] = None) -> int:
+    """按关键帧切段后多个ffmpeg并发转码视频，音频整轨单独转码，最后用concat无损拼接并合入音频
+
+    每段是独立的ffmpeg进程，由线程池控制并发数；返回段数，切不出多段时返回0(调用方应单进程转码)。
+    临时文件放在dst所在目录，进程中途退出时由产物清理线程回收。
+    """
+    video_encoder, audio_encoder = VIDEO_ENCODERS[target]
+    workers = workers or batch.worker_count()
+    seconds = max(SEGMENT_MIN_SECONDS, info['duration'] / (workers * SEGMENTS_PER_WORKER))
+
+    with tempfile.TemporaryDirectory(prefix='segments_', dir=dst.parent) as tmp:
+        workdir = Path(tmp)
+        sources = _split_video(src, workdir, seconds)
+        if len(sources) < 2:
+            return 0
+
+        concurrency = min(workers, len(sources))
+        # 不指定线程数时按并发数均分CPU，避免每个ffmpeg都按全部核数开线程
+        segment_threads = threads or max(1, batch.worker_count() // concurrency)
+        done = [0.0] * len(sources)
+        lock = threading.Lock()
+
+        def encode(index: int, source: Path) -> Path:
+            output = workdir / f'out_{index:05d}.mkv'
+            duration = probe(source)['duration']
+
+            def report(fraction: float) -> None:
+                with lock:
+                    done[index] = min(1.0, fraction)
+                    total = sum(done) / len(done)
+                progress(total)
+
+            run_ffmpeg(['-i', str(source), '-map', '0:v:0']
+                       + _video_encoder_args(video_encoder, settings, segment_threads) + [str(output)],
+                       duration, report if progress else None)
+            return output
+
+        def encode_audio() -> Path:
+            output = workdir / 'audio.mka'
+            run_ffmpeg(['-i', str(src), '-map', '0:a', '-vn', '-sn', '-dn']
+                       + (['-c:a', 'copy'] if plan['copy_audio'] else _audio_encoder_args(audio_encoder))
+                       + [str(output)])
+            return output
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            audio = executor.submit(encode_audio) if plan['has_audio'] else None
+            outputs = list(executor.map(encode, range(len(sources)), sources))
+            audio_path = audio.result() if audio else None
+
+        listing = workdir / 'segments.txt'
+        listing.write_text(''.join(f"file '{path.name}'\n" for path in outputs))
+        args = ['-f', 'concat', '-safe', '0', '-i', str(listing)]
+        if audio_path:
+            args += ['-i', str(audio_path), '-map', '0:v:0', '-map', '1:a']
+        args += ['-c', 'copy']
+        if target in ('mp4', 'mov'):
+            args += ['-movflags', '+faststart']
+        run_ffmpeg(args + [str(dst)])
+    return len(outputs)
+
+
+def convert_video(src: Path, dst: Path, target: str, preset: str = None, threads: int = 0,
+                  allow_remux: bool = True, progress: Callable[[float], None] = None,
+                  parallel: bool = True, workers: int = 0) -> str:
+    """转换视频容器/编码，返回使用的方式(remux/partial/transcode/segmented)
+
+    需要重新编码视频、时长足够且有多个worker时分段并行转码(segmented)，失败时退回单进程转码。
+    """
+    target = target.lower()
+    if target not in VIDEO_ENCODERS:
+        raise MediaError(f'Unsupported video format: {target}')
+    settings = PRESETS.get(preset or DEFAULT_PRESET, PRESETS['balanced'])
+    video_encoder, audio_encoder = VIDEO_ENCODERS[target]
+
+    info = probe(src)
+    plan = plan_video(info, target) if allow_remux else {
+        'method': 'transcode', 'copy_video': False, 'copy_audio': False,
+        'has_audio': any(s['type'] == 'audio' for s in info['streams']),
+    }
+
+    def build(plan: Dict) -> List[str]:
+        args = ['-i', str(src), '-map', '0:v:0']
+        if plan['has_audio']:
+            args += ['-map', '0:a']
+        args += ['-c:v', 'copy'] if plan['copy_video'] else _video_encoder_args(video_encoder, settings, threads)
+        if plan['has_audio']:
+            args += ['-c:a', 'copy'] if plan['copy_audio'] else _audio_encoder_args(audio_encoder)
+        if target in ('mp4', 'mov'):
+            args += ['-movflags', '+faststart']
+        return args + [str(dst)]
+
+    if (parallel and not plan['copy_video'] and info['duration'] >= SEGMENT_MIN_DURATION
+            and (workers or batch.worker_count()) > 1):
+        try:
+            if transcode_segmented(src, dst, target, info, plan, settings, threads, workers, progress):
+                return 'segmented'
+        except MediaError:
+            pass
+
+    try:
+        run_ffmpeg(build(plan), info['duration'], progress)
+    except MediaError:
+        if plan['method'] == 'transcode':
+            raise
+        # 时间戳等问题导致复制失败时退回完整转码
+        plan = dict(plan, method='transcode', copy_video=False, copy_audio=False)
+        run_ffmpeg(build(plan), info['duration'], progress)
+    return plan['method']
+
+
+def convert_audio(src: Path, dst: Path, target: str, bitrate: str = None,
+                  progress: Callable[[float], None] = None) -> str:
+    """ffmpeg边解码边编码，内存占用与时长无关；编码相同时直接复制
+
+    返回使用的方式(copy/transcode)。
+    """
+    target = target.lower()
+    if target not in AUDIO_ENCODERS:
+        raise MediaError(f'Unsupported audio format: {target}')
+    encoder, default_bitrate, muxer, copyable = AUDIO_ENCODERS[target]
+
+    info = probe(src)
+    audios = [s for s in info['streams'] if s['type'] == 'audio']
+    if not audios:
+        raise MediaError('No audio stream found')
+
+    args = ['-i', str(src), '-map', '0:a:0', '-vn']
+    if audios[0]['codec'] in copyable and not bitrate:
+        method = 'copy'
+        args += ['-c:a', 'copy']
+    else:
+        method = 'transcode'
+        args += ['-c:a', encoder]
+        if bitrate or default_bitrate:
+            args += ['-b:a', bitrate or default_bitrate]
+    args += ['-f', muxer, str(dst)]
+
+    run_ffmpeg(args, info['duration'], progress)
+    return method
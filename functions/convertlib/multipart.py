@@ -0,0 +1,273 @@
+"""增量式 multipart/form-data 解析"""
+
+import base64
+import hashlib
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from convertlib import tracing
+
+# 读取请求体时每块的大小
+CHUNK_SIZE = 1024 * 1024
+
+# 普通文本字段的大小上限
+MAX_FIELD_SIZE = 64 * 1024
+
+# 单个part头部的大小上限
+MAX_HEADER_SIZE = 16 * 1024
+
+
+class MultipartError(ValueError):
+    """multipart请求体格式错误"""
+
+
+class UploadedFile:
+    """已写入磁盘的上传文件"""
+
+    def __init__(self, field_name: str, filename: str, content_type: str, path: Path):
+        self.field_name = field_name
+        self.filename = filename
+        self.content_type = content_type
+        self.path = path
+        self.size = 0
+        # 接收过程中计算的sha256，供结果缓存使用
+        self.sha256 = None
+
+
+class FileSink:
+    """把文件part的数据分块写入目标文件，同时计算sha256
+
+    指定 on_head 时先缓存文件头前 head_size 字节，调用 on_head(upload, head)
+    之后才创建文件；on_head 可以修改 upload.path，或抛出异常拒绝这次上传，
+    此时不会有任何字节写入磁盘。
+    """
+
+    def __init__(self, upload: UploadedFile, head_size: int = 0, on_head: Callable = None):
+        self.upload = upload
+        self._hash = hashlib.sha256()
+        self._on_head = on_head
+        self._head = bytearray() if on_head else None
+        self._head_size = head_size
+        self._fh = None if on_head else open(upload.path, 'wb')
+
+    def write(self, data) -> None:
+        self._hash.update(data)
+        self.upload.size += len(data)
+        if self._fh is None:
+            self._head += data
+            if len(self._head) >= self._head_size:
+                self._flush_head()
+        else:
+            start = time.perf_counter()
+            self._fh.write(data)
+            tracing.add('write', time.perf_counter() - start, len(data))
+
+    def _flush_head(self) -> None:
+        head = bytes(self._head)
+        self._head = None
+        self._on_head(self.upload, head)
+        self._fh = open(self.upload.path, 'wb')
+        start = time.perf_counter()
+        self._fh.write(head)
+        tracing.add('write', time.perf_counter() - start, len(head))
+
+    def close(self) -> None:
+        if self._fh is None:
+            self._flush_head()
+        self._fh.close()
+        self.upload.sha256 = self._hash.hexdigest()
+
+    def abort(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self.upload.path.unlink(missing_ok=True)
+
+
+def parse_boundary(content_type: str) -> Optional[str]:
+    """从Content-Type中取出boundary"""
+    for part in content_type.split(';'):
+        part = part.strip()
+        if part.startswith('boundary='):
+            return part.split('=', 1)[1].strip('"')
+    return None
+
+
+def _parse_disposition(value: str) -> Dict[str, str]:
+    params = {}
+    for item in value.split(';')[1:]:
+        if '=' not in item:
+            continue
+        key, val = item.split('=', 1)
+        val = val.strip()
+        if len(val) >= 2 and val[0] == val[-1] == '"':
+            val = val[1:-1]
+        params[key.strip().lower()] = val
+    return params
+
+
+class MultipartParser:
+    """按块喂入请求体，按边界扫描，文件part直接流式写入磁盘
+
+    file_factory(field_name, filename, content_type) 返回一个带有
+    write/close/abort 的sink；普通字段收集到 fields 中。
+    传给 sink.write 的是缓冲区的memoryview，只在调用期间有效。
+    """
+
+    _PREAMBLE, _HEADERS, _BODY, _DONE = range(4)
+
+    def __init__(self, boundary: str, file_factory: Callable, max_field_size: int = MAX_FIELD_SIZE):
+        if not boundary:
+            raise MultipartError('No boundary found')
+        self.fields: Dict[str, str] = {}
+        self.files: List[UploadedFile] = []
+        self._file_factory = file_factory
+        self._max_field_size = max_field_size
+        # 每个part之后的分隔符；第一个边界前没有CRLF，解析时补上
+        self._delimiter = b'\r\n--' + boundary.encode('latin-1')
+        self._buffer = bytearray(b'\r\n')
+        self._state = self._PREAMBLE
+        self._sink = None
+        self._field_name = None
+        self._field_value = None
+
+    def feed(self, data) -> None:
+        if self._state == self._DONE or not data:
+            return
+        self._buffer += data
+        self._process()
+
+    def close(self) -> None:
+        if self._state != self._DONE:
+            if self._sink is not None:
+                self._sink.abort()
+                self._sink = None
+            raise MultipartError('Unexpected end of multipart body')
+
+    def abort(self) -> None:
+        """放弃整个请求体(客户端断开、解析出错)：关闭正在写入的文件，删除已接收的所有文件"""
+        if self._sink is not None:
+            self._sink.abort()
+            self._sink = None
+        for upload in self.files:
+            upload.path.unlink(missing_ok=True)
+        self._state = self._DONE
+
+    def _process(self) -> None:
+        buf = self._buffer
+        delimiter = self._delimiter
+        while True:
+            if self._state == self._PREAMBLE:
+                index = buf.find(delimiter)
+                if index < 0:
+                    # 只保留可能是分隔符开头的尾部
+                    keep = len(delimiter) - 1
+                    if len(buf) > keep:
+                        del buf[:len(buf) - keep]
+                    return
+                if not self._after_delimiter(index):
+                    return
+
+            elif self._state == self._HEADERS:
+                index = buf.find(b'\r\n\r\n')
+                if index < 0:
+                    if len(buf) > MAX_HEADER_SIZE:
+                        raise MultipartError('Part headers too large')
+                    return
+                self._start_part(bytes(buf[:index]))
+                del buf[:index + 4]
+                self._state = self._BODY
+
+            elif self._state == self._BODY:
+                index = buf.find(delimiter)
+                if index < 0:
+                    # 分隔符可能跨块，保留末尾 len(delimiter)-1 字节
+                    safe = len(buf) - (len(delimiter) - 1)
+                    if safe > 0:
+                        self._emit(memoryview(buf)[:safe])
+                        del buf[:safe]
+                    return
+                if index:
+                    self._emit(memoryview(buf)[:index])
+                self._end_part()
+                if not self._after_delimiter(index):
+                    return
+
+            else:
+                buf.clear()
+                return
+
+    def _after_delimiter(self, index: int) -> bool:
+        """处理分隔符之后的 '--' 或 CRLF；数据不足时回到等待分隔符的状态并返回False"""
+        buf = self._buffer
+        tail = index + len(self._delimiter)
+        if len(buf) < tail + 2:
+            del buf[:index]
+            self._state = self._PREAMBLE
+            return False
+        marker = bytes(buf[tail:tail + 2])
+        if marker == b'--':
+            self._state = self._DONE
+            buf.clear()
+            return False
+        # 忽略边界行尾的空白
+        end = buf.find(b'\r\n', tail)
+        if end < 0:
+            del buf[:index]
+            self._state = self._PREAMBLE
+            return False
+        del buf[:end + 2]
+        self._state = self._HEADERS
+        return True
+
+    def _start_part(self, raw_headers: bytes) -> None:
+        headers = {}
+        for line in raw_headers.split(b'\r\n'):
+            if b':' in line:
+                key, value = line.split(b':', 1)
+                headers[key.decode('latin-1').strip().lower()] = value.decode('utf-8', 'replace').strip()
+
+        disposition = _parse_disposition(headers.get('content-disposition', ''))
+        name = disposition.get('name', '')
+        filename = disposition.get('filename')
+
+        if filename is not None:
+            content_type = headers.get('content-type', 'application/octet-stream')
+            self._sink = self._file_factory(name, filename, content_type)
+            self.files.append(self._sink.upload)
+        else:
+            self._field_name = name
+            self._field_value = bytearray()
+
+    def _emit(self, data: memoryview) -> None:
+        if self._sink is not None:
+            self._sink.write(data)
+        elif self._field_value is not None:
+            if len(self._field_value) + len(data) > self._max_field_size:
+                raise MultipartError(f'Field too large: {self._field_name}')
+            self._field_value += data
+
+    def _end_part(self) -> None:
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+        elif self._field_value is not None:
+            self.fields[self._field_name] = self._field_value.decode('utf-8', 'replace').strip()
+            self._field_name = None
+            self._field_value = None
+
+
+def iter_event_body(event: Dict, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """按块产出Netlify事件中的请求体，base64按块解码，避免整体复制"""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded', False):
+        # base64每4个字符对应3个字节，str和bytes都可直接切片解码
+        step = max(4, chunk_size // 3 * 4)
+        for start in range(0, len(body), step):
+            yield base64.b64decode(body[start:start + step])
+    else:
+        if isinstance(body, str):
+            body = body.encode()
+        view = memoryview(body)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
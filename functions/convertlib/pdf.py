@@ -0,0 +1,290 @@
+"""PDF页码范围解析、按页分片的并行文本提取，以及流式的合并与拆分"""
+
+import math
+import zipfile
+from collections import deque
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from convertlib import batch, lazy
+
+# 页数少于该值时直接在当前进程提取，进程间通信得不偿失
+PARALLEL_MIN_PAGES = 32
+
+# 每个worker分到的分片数，分片越小负载越均衡
+SHARDS_PER_WORKER = 2
+
+# 流式写入PDF时的缓冲大小
+WRITE_BUFFER = 1024 * 1024
+
+
+def parse_page_range(spec: str, page_count: int) -> List[int]:
+    """把 "1-3,5,8-" 这样的页码范围(从1开始)转成从0开始的页索引
+
+    空字符串表示全部页。
+    """
+    if not spec or not spec.strip():
+        return list(range(page_count))
+
+    pages = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, _, last = part.partition('-')
+            start = int(first) if first.strip() else 1
+            end = int(last) if last.strip() else page_count
+        else:
+            start = end = int(part)
+        if start < 1 or end > page_count or start > end:
+            raise ValueError(f'Invalid page range: {part} (document has {page_count} pages)')
+        pages.extend(range(start - 1, end))
+    if not pages:
+        raise ValueError(f'Invalid page range: {spec}')
+    return pages
+
+
+def page_count(path: Path) -> int:
+    return len(lazy.load('PyPDF2').PdfReader(path).pages)
+
+
+def _extract_shard(path: str, pages: List[int]) -> List[str]:
+    """在worker进程中打开PDF，提取一段页面的文本"""
+    reader = lazy.load('PyPDF2').PdfReader(path)
+    return [reader.pages[i].extract_text() or '' for i in pages]
+
+
+def iter_page_text(path: Path, pages: List[int], parallel: bool = True) -> Iterator[str]:
+    """按页序产出文本；页数多时把页面分片交给进程池"""
+    if not parallel or len(pages) < PARALLEL_MIN_PAGES:
+        # 逐页提取并产出，不把整份文档的文本先攒在内存里
+        reader = lazy.load('PyPDF2').PdfReader(path)
+        for i in pages:
+            yield reader.pages[i].extract_text() or ''
+        return
+
+    shard_count = min(len(pages), batch.worker_count() * SHARDS_PER_WORKER)
+    shard_size = math.ceil(len(pages) / shard_count)
+    pool = batch.get_pool()
+    futures = [
+        pool.submit(_extract_shard, str(path), pages[i:i + shard_size])
+        for i in range(0, len(pages), shard_size)
+    ]
+    # 按提交顺序取结果，前面的分片完成后即可开始写入
+    for future in futures:
+        yield from future.result()
+
+
+class PdfSource:
+    """一个输入PDF：页面列表，以及复制时不能跟随的页面树节点和文档目录
+
+    传文件对象时PyPDF2按需seek读取，不会像传路径那样把整个文件读进内存。
+    """
+
+    def __init__(self, fh: BinaryIO):
+        PyPDF2 = lazy.load('PyPDF2')
+        IndirectObject = lazy.load('PyPDF2.generic').IndirectObject
+        reader = PyPDF2.PdfReader(fh)
+        if reader.is_encrypted and not reader.decrypt(''):
+            raise ValueError('Encrypted PDF requires a password')
+        self.pages = list(reader.pages)
+        self.page_ids = {page.indirect_reference.idnum for page in self.pages}
+
+        # 原页面树节点和文档目录不复制，否则一个引用就会带进整份文档
+        root = reader.trailer.raw_get('/Root')
+        self.skipped = {root.idnum} if isinstance(root, IndirectObject) else set()
+        for page in self.pages:
+            parent = page.raw_get('/Parent') if '/Parent' in page else None
+            while isinstance(parent, IndirectObject) and parent.idnum not in self.skipped:
+                self.skipped.add(parent.idnum)
+                node = parent.get_object()
+                parent = node.raw_get('/Parent') if '/Parent' in node else None
+
+
+class _Output:
+    """带缓冲的输出，记录已写出的字节数作为对象偏移量(zip条目等不可seek的流也能用)"""
+
+    def __init__(self, out: BinaryIO):
+        self._out = out
+        self._buffer = bytearray()
+        self.offset = 0
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        self.offset += len(data)
+        if len(self._buffer) >= WRITE_BUFFER:
+            self.flush()
+
+    def flush(self) -> None:
+        self._out.write(self._buffer)
+        self._buffer.clear()
+
+
+class PdfStreamWriter:
+    """逐个写出间接对象的PDF写入器
+
+    从输入中复制页面对象及其引用的资源(内容流按原编码原样复制，不重新渲染)，
+    每个对象写出后即不再持有，内存只与当前输入有关，与已写出的页数和输入个数无关。
+    书签、表单等挂在文档目录上的结构不复制，指向未选中页面的引用写为null。
+    """
+
+    def __init__(self, out: BinaryIO):
+        self._out = _Output(out)
+        # 对象号 -> 偏移量；1为页面树，2为文档目录，最后写出
+        self._offsets = [0, 0, 0]
+        self._kids: List[int] = []
+        self._out.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def _allocate(self) -> int:
+        self._offsets.append(0)
+        return len(self._offsets) - 1
+
+    def add_pages(self, source: PdfSource, pages: Sequence[int]) -> None:
+        """按顺序追加source中的页(从0开始的索引，可重复)"""
+        selected = []
+        page_numbers: Dict[int, int] = {}
+        for index in pages:
+            page = source.pages[index]
+            number = self._allocate()
+            page_numbers.setdefault(page.indirect_reference.idnum, number)
+            selected.append((page, number))
+
+        numbers: Dict[Tuple[int, int], int] = {}
+        queue = deque()
+
+        def resolve(ref) -> Optional[int]:
+            if ref.idnum in source.page_ids:
+                return page_numbers.get(ref.idnum)
+            if ref.idnum in source.skipped:
+                return None
+            key = (ref.idnum, ref.generation)
+            number = numbers.get(key)
+            if number is None:
+                number = numbers[key] = self._allocate()
+                queue.append((ref, number))
+            return number
+
+        for page, number in selected:
+            self._object(number, page, resolve, parent=1)
+            self._kids.append(number)
+        while queue:
+            ref, number = queue.popleft()
+            self._object(number, ref.get_object(), resolve)
+
+    def _object(self, number: int, obj, resolve: Callable, parent: Optional[int] = None) -> None:
+        self._offsets[number] = self._out.offset
+        self._out.write(b'%d 0 obj\n' % number)
+        self._serialize(obj, resolve, parent)
+        self._out.write(b'\nendobj\n')
+
+    def _serialize(self, obj, resolve: Callable, parent: Optional[int] = None) -> None:
+        """按PyPDF2对象的原样写出，间接引用换成新对象号"""
+        generic = lazy.load('PyPDF2.generic')
+        out = self._out
+        if obj is None:
+            out.write(b'null')
+        elif isinstance(obj, generic.IndirectObject):
+            number = resolve(obj)
+            out.write(b'null' if number is None else b'%d 0 R' % number)
+        elif isinstance(obj, generic.ArrayObject):
+            out.write(b'[')
+            for item in obj:
+                out.write(b' ')
+                self._serialize(item, resolve)
+            out.write(b' ]')
+        elif isinstance(obj, generic.DictionaryObject):
+            is_stream = isinstance(obj, generic.StreamObject)
+            out.write(b'<<')
+            for key, value in obj.items():
+                if (is_stream and key == '/Length') or (parent is not None and key == '/Parent'):
+                    continue
+                out.write(b'\n')
+                key.write_to_stream(out, None)
+                out.write(b' ')
+                self._serialize(value, resolve)
+            if parent is not None:
+                out.write(b'\n/Parent %d 0 R' % parent)
+            if is_stream:
+                out.write(b'\n/Length %d' % len(obj._data))
+            out.write(b'\n>>')
+            if is_stream:
+                out.write(b'\nstream\n')
+                out.write(obj._data)
+                out.write(b'\nendstream')
+        else:
+            obj.write_to_stream(out, None)
+
+    def close(self) -> int:
+        """写出页面树、文档目录和交叉引用表，返回总页数"""
+        out = self._out
+        self._offsets[1] = out.offset
+        out.write(b'1 0 obj\n<< /Type /Pages /Count %d /Kids [' % len(self._kids))
+        for number in self._kids:
+            out.write(b' %d 0 R' % number)
+        out.write(b' ] >>\nendobj\n')
+        self._offsets[2] = out.offset
+        out.write(b'2 0 obj\n<< /Type /Catalog /Pages 1 0 R >>\nendobj\n')
+
+        xref = out.offset
+        out.write(b'xref\n0 %d\n0000000000 65535 f \n' % len(self._offsets))
+        for offset in self._offsets[1:]:
+            out.write(b'%010d 00000 n \n' % offset)
+        out.write(b'trailer\n<< /Size %d /Root 2 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(self._offsets), xref))
+        out.flush()
+        return len(self._kids)
+
+
+def merge_pdfs(sources: Sequence[Tuple[Path, str]], dst: Path,
+               progress: Callable[[float], None] = None) -> int:
+    """按顺序合并 (路径, 页码范围) 列表，返回总页数；同一时间只打开一个输入"""
+    with open(dst, 'wb') as f:
+        writer = PdfStreamWriter(f)
+        for index, (path, spec) in enumerate(sources):
+            with open(path, 'rb') as fh:
+                try:
+                    source = PdfSource(fh)
+                    pages = parse_page_range(spec, len(source.pages))
+                except ValueError as e:
+                    raise ValueError(f'File {index + 1}: {e}')
+                writer.add_pages(source, pages)
+            if progress:
+                progress((index + 1) / len(sources))
+        return writer.close()
+
+
+def split_groups(page_count: int, ranges: str = '', pages: str = '', every: int = 1) -> List[List[int]]:
+    """拆分方案：ranges为用分号分隔的多个页码范围(如 "1-3;4-10;11-")，每个范围一个文件；
+    否则在pages选中的页中每every页一个文件
+    """
+    if ranges and ranges.strip():
+        return [parse_page_range(part, page_count) for part in ranges.split(';') if part.strip()]
+    if every < 1:
+        raise ValueError('every must be a positive integer')
+    selected = parse_page_range(pages, page_count)
+    return [selected[i:i + every] for i in range(0, len(selected), every)]
+
+
+def split_pdf(src: Path, dst: Path, stem: str, ranges: str = '', pages: str = '', every: int = 1,
+              progress: Callable[[float], None] = None) -> List[Dict]:
+    """按拆分方案把各部分直接流式写入zip条目，返回每个文件的名称、页码和页数
+
+    PDF中的内容流和图片通常已经压缩，zip条目不再压缩。
+    """
+    parts = []
+    with open(src, 'rb') as fh, zipfile.ZipFile(dst, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        source = PdfSource(fh)
+        groups = split_groups(len(source.pages), ranges, pages, every)
+        width = max(3, len(str(len(groups))))
+        for index, group in enumerate(groups):
+            first, last = group[0] + 1, group[-1] + 1
+            label = f'p{first}' if len(group) == 1 else f'p{first}-{last}'
+            name = f'{stem}_{index + 1:0{width}d}_{label}.pdf'
+            with archive.open(name, 'w', force_zip64=True) as entry:
+                writer = PdfStreamWriter(entry)
+                writer.add_pages(source, group)
+                writer.close()
+            parts.append({'name': name, 'firstPage': first, 'lastPage': last, 'pages': len(group)})
+            if progress:
+                progress((index + 1) / len(groups))
+    return parts
@@ -0,0 +1,102 @@
+"""根据文件头的魔数识别真实格式"""
+
+from typing import Optional
+
+# 识别所需的文件头长度
+SNIFF_BYTES = 8192
+
+# 格式 -> 类别
+FORMAT_KINDS = {
+    'jpg': 'image', 'jpeg': 'image', 'png': 'image', 'gif': 'image', 'webp': 'image',
+    'bmp': 'image', 'tiff': 'image', 'tif': 'image',
+    'pdf': 'document', 'doc': 'document', 'docx': 'document', 'xlsx': 'document',
+    'pptx': 'document', 'epub': 'document', 'txt': 'document', 'html': 'document', 'rtf': 'document',
+    'mp3': 'audio', 'wav': 'audio', 'flac': 'audio', 'aac': 'audio', 'ogg': 'audio',
+    'opus': 'audio', 'm4a': 'audio',
+    'mp4': 'video', 'avi': 'video', 'mkv': 'video', 'mov': 'video', 'webm': 'video', 'flv': 'video',
+}
+
+
+class UnsupportedConversion(ValueError):
+    """源格式无法转换为目标格式"""
+
+
+def _sniff_zip(head: bytes) -> str:
+    """Office/EPUB都是ZIP，靠前几个条目名区分"""
+    if b'mimetypeapplication/epub+zip' in head:
+        return 'epub'
+    if b'word/' in head:
+        return 'docx'
+    if b'xl/' in head:
+        return 'xlsx'
+    if b'ppt/' in head:
+        return 'pptx'
+    return 'zip'
+
+
+def _sniff_ftyp(head: bytes) -> str:
+    brand = head[8:12]
+    if brand in (b'M4A ', b'M4B '):
+        return 'm4a'
+    if brand == b'qt  ':
+        return 'mov'
+    return 'mp4'
+
+
+def _is_text(head: bytes) -> bool:
+    if not head or b'\x00' in head:
+        return False
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # 文件头可能截断在多字节字符中间
+        return e.start >= len(head) - 3 and e.reason == 'unexpected end of data'
+    return True
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """返回格式扩展名(不带点)，无法识别时返回None"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and len(head) >= 12:
+        return {b'WEBP': 'webp', b'WAVE': 'wav', b'AVI ': 'avi'}.get(head[8:12])
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    if head.startswith(b'BM') and len(head) >= 26 and head[6:10] == b'\x00\x00\x00\x00':
+        return 'bmp'
+    if head.startswith(b'%PDF-'):
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04'):
+        return _sniff_zip(head)
+    if head.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return 'doc'
+    if head.startswith(b'{\\rtf'):
+        return 'rtf'
+    if head.startswith(b'fLaC'):
+        return 'flac'
+    if head.startswith(b'OggS'):
+        return 'opus' if b'OpusHead' in head[:128] else 'ogg'
+    if head[4:8] == b'ftyp':
+        return _sniff_ftyp(head)
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'webm' if b'webm' in head[:64] else 'mkv'
+    if head.startswith(b'FLV\x01'):
+        return 'flv'
+    if head.startswith(b'ID3'):
+        return 'mp3'
+    if len(head) >= 2 and head[0] == 0xff:
+        # MPEG音频帧同步：layer III为mp3，layer位为0的是AAC ADTS
+        if head[1] & 0xf6 == 0xf0:
+            return 'aac'
+        if head[1] & 0xe0 == 0xe0 and head[1] & 0x06 == 0x02:
+            return 'mp3'
+    if _is_text(head):
+        start = head.lstrip()[:15].lower()
+        if start.startswith(b'<!doctype html') or start.startswith(b'<html'):
+            return 'html'
+        return 'txt'
+    return None
@@ -0,0 +1,315 @@
+"""分阶段计时：每个请求一个Trace，记录各阶段耗时、处理字节数和内存
+
+阶段可以嵌套，记录的是扣除子阶段后的自身耗时，各阶段相加约等于请求总耗时；同名阶段在一个请求内
+累加(如逐块解码)，请求结束时每个阶段计入一次进程级直方图，以Prometheus文本格式导出。
+不在请求内(异步任务线程)时每次调用直接计入直方图。
+内存在阶段进入和退出时读取当前常驻内存，记录采样到的最大值(含子阶段的采样)和退出时相对进入时的增量；
+同一进程里并发的请求会互相影响这两个值。
+"""
+
+import contextvars
+import functools
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+# 阶段耗时直方图的桶(秒)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current: contextvars.ContextVar = contextvars.ContextVar('convert_trace', default=None)
+
+
+_PAGE_MB = (os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096) / 1024 / 1024
+
+
+def peak_rss_mb() -> float:
+    """进程启动以来的内存峰值(Linux下ru_maxrss单位为KB)"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def current_rss_mb() -> Optional[float]:
+    """当前常驻内存(/proc/self/statm)；不是Linux时返回None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Stage:
+    __slots__ = ('name', 'start', 'child', 'bytes', 'rss', 'peak')
+
+    def __init__(self, name: str, nbytes: int = 0, rss: Optional[float] = None):
+        self.name = name
+        self.start = time.perf_counter()
+        self.child = 0.0
+        self.bytes = nbytes
+        self.rss = rss
+        self.peak = rss
+
+
+class Trace:
+    def __init__(self, route: str):
+        self.route = route
+        self.start = time.perf_counter()
+        self.stages: Dict[str, Dict] = {}
+        # 客户端要求时在JSON响应体里附带timings
+        self.include_json = False
+        self._stack = []
+
+    def add(self, name: str, seconds: float, nbytes: int = 0, rss_mb: Optional[float] = None,
+            rss_delta_mb: float = 0.0) -> None:
+        """记录一段没有子阶段的耗时；在其他阶段内时从外层阶段的自身耗时中扣除"""
+        if self._stack:
+            self._stack[-1].child += seconds
+        self._record(name, seconds, nbytes, rss_mb, rss_delta_mb)
+
+    def _record(self, name: str, seconds: float, nbytes: int, rss_mb: Optional[float], rss_delta_mb: float) -> None:
+        """同名阶段累加(如逐块解码)"""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {'seconds': 0.0, 'bytes': 0, 'count': 0, 'rssMb': None, 'rssDeltaMb': 0.0}
+        stage['seconds'] += seconds
+        stage['bytes'] += nbytes
+        stage['count'] += 1
+        if rss_mb is not None:
+            stage['rssMb'] = max(stage['rssMb'] or 0.0, rss_mb)
+        stage['rssDeltaMb'] += rss_delta_mb
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        entries = []
+        for name, stage in self.stages.items():
+            entry = f"{name};dur={stage['seconds'] * 1000:.1f}"
+            if stage['bytes']:
+                entry += f';desc="{stage["bytes"]} bytes"'
+            entries.append(entry)
+        entries.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(entries)
+
+    def summary(self) -> Dict:
+        return {
+            'totalMs': round(self.elapsed() * 1000, 2),
+            'peakRssMb': peak_rss_mb(),
+            'stages': [
+                {'name': name, 'ms': round(stage['seconds'] * 1000, 2), 'bytes': stage['bytes'],
+                 'count': stage['count'],
+                 'rssMb': round(stage['rssMb'], 1) if stage['rssMb'] is not None else None,
+                 'rssDeltaMb': round(stage['rssDeltaMb'], 1)}
+                for name, stage in self.stages.items()
+            ],
+        }
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'sum', 'count')
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value) -> str:
+    """Prometheus文本格式的标签值转义：反斜杠、双引号、换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+class Metrics:
+    """进程级汇总：阶段耗时直方图、阶段字节数、按路由和状态码的请求数与耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, _Histogram] = {}
+        self._stage_bytes: Dict[str, int] = {}
+        self._requests: Dict[tuple, int] = {}
+        self._request_seconds: Dict[str, _Histogram] = {}
+
+    def observe_stage(self, name: str, seconds: float, nbytes: int = 0) -> None:
+        with self._lock:
+            histogram = self._stages.get(name)
+            if histogram is None:
+                histogram = self._stages[name] = _Histogram()
+            histogram.observe(seconds)
+            self._stage_bytes[name] = self._stage_bytes.get(name, 0) + nbytes
+
+    def observe_request(self, route: str, status: int, seconds: float) -> None:
+        with self._lock:
+            key = (route, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._request_seconds.get(route)
+            if histogram is None:
+                histogram = self._request_seconds[route] = _Histogram()
+            histogram.observe(seconds)
+
+    def _render_histogram(self, lines: list, metric: str, label: str, histograms: Dict[str, _Histogram]) -> None:
+        for key, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.buckets):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{_labels(**{label: key, "le": bound})}}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{_labels(**{label: key, "le": "+Inf"})}}} {histogram.count}')
+            lines.append(f'{metric}_sum{{{_labels(**{label: key})}}} {histogram.sum:.6f}')
+            lines.append(f'{metric}_count{{{_labels(**{label: key})}}} {histogram.count}')
+
+    def render(self) -> str:
+        """Prometheus文本格式(0.0.4)"""
+        with self._lock:
+            lines = [
+                '# HELP convert_stage_duration_seconds Self time spent in each conversion stage.',
+                '# TYPE convert_stage_duration_seconds histogram',
+            ]
+            self._render_histogram(lines, 'convert_stage_duration_seconds', 'stage', self._stages)
+            lines += [
+                '# HELP convert_stage_bytes_total Bytes processed by each conversion stage.',
+                '# TYPE convert_stage_bytes_total counter',
+            ]
+            for name, nbytes in sorted(self._stage_bytes.items()):
+                lines.append(f'convert_stage_bytes_total{{{_labels(stage=name)}}} {nbytes}')
+            lines += [
+                '# HELP convert_requests_total Requests by route and status code.',
+                '# TYPE convert_requests_total counter',
+            ]
+            for (route, status), count in sorted(self._requests.items()):
+                lines.append(f'convert_requests_total{{{_labels(route=route, status=status)}}} {count}')
+            lines += [
+                '# HELP convert_request_duration_seconds Request duration by route.',
+                '# TYPE convert_request_duration_seconds histogram',
+            ]
+            self._render_histogram(lines, 'convert_request_duration_seconds', 'route', self._request_seconds)
+        lines += [
+            '# HELP convert_process_peak_rss_bytes Peak resident set size of the process.',
+            '# TYPE convert_process_peak_rss_bytes gauge',
+            f'convert_process_peak_rss_bytes {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def request(route: str) -> Iterator[Trace]:
+    """一次请求的Trace，期间(同一线程/协程内)记录的阶段都计入其中；结束后调用finish"""
+    trace = Trace(route)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def finish(trace: Trace, response: Dict) -> Dict:
+    """记录请求指标，给响应加上Server-Timing头；客户端要求时在JSON响应体里附带timings"""
+    METRICS.observe_request(trace.route, response.get('statusCode', 0), trace.elapsed())
+    for name, stage_totals in trace.stages.items():
+        METRICS.observe_stage(name, stage_totals['seconds'], stage_totals['bytes'])
+    if trace.include_json and response.get('headers', {}).get('Content-Type') == 'application/json':
+        try:
+            body = json.loads(response.get('body') or '{}')
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            body['timings'] = trace.summary()
+            response['body'] = json.dumps(body)
+    headers = response.setdefault('headers', {})
+    headers['Server-Timing'] = trace.server_timing()
+    headers['Timing-Allow-Origin'] = '*'
+    return response
+
+
+def add(name: str, seconds: float, nbytes: int = 0) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, seconds, nbytes)
+    else:
+        METRICS.observe_stage(name, seconds, nbytes)
+
+
+@contextmanager
+def stage(name: str, nbytes: int = 0) -> Iterator[_Stage]:
+    """with stage('convert') as s: ...；可在块内设置 s.bytes"""
+    trace = _current.get()
+    current_stage = _Stage(name, nbytes, current_rss_mb() if trace is not None else None)
+    if trace is not None:
+        trace._stack.append(current_stage)
+    try:
+        yield current_stage
+    finally:
+        seconds = time.perf_counter() - current_stage.start
+        self_seconds = max(0.0, seconds - current_stage.child)
+        if trace is None:
+            METRICS.observe_stage(name, self_seconds, current_stage.bytes)
+        else:
+            trace._stack.pop()
+            rss = current_rss_mb()
+            if rss is None or current_stage.rss is None:
+                trace._record(name, self_seconds, current_stage.bytes, None, 0.0)
+            else:
+                current_stage.peak = max(current_stage.peak, rss)
+                trace._record(name, self_seconds, current_stage.bytes, current_stage.peak, rss - current_stage.rss)
+            # 外层阶段扣除的是本阶段的全部耗时(含其子阶段)，否则子阶段的耗时会被重复计入外层
+            if trace._stack:
+                parent = trace._stack[-1]
+                parent.child += seconds
+                if parent.peak is not None and current_stage.peak is not None:
+                    parent.peak = max(parent.peak, current_stage.peak)
+
+
+def traced(name: str):
+    """转换函数的装饰器：第一个参数是输入文件时按其大小记录处理字节数"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name) as s:
+                if args and isinstance(args[0], Path):
+                    try:
+                        s.bytes = args[0].stat().st_size
+                    except OSError:
+                        pass
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_iter(name: str, iterable: Iterable) -> Iterator:
+    """计入每次取下一个元素的耗时(如按块base64解码)，元素长度计为字节数；结束时合计记录一次"""
+    iterator = iter(iterable)
+    seconds = 0.0
+    nbytes = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+            nbytes += len(item)
+            yield item
+    finally:
+        add(name, seconds, nbytes)
@@ -0,0 +1,250 @@
+"""可续传的分块上传：init -> 按偏移量逐块追加(可带校验和) -> complete
+
+上传中的文件和状态放在产物目录的 .partial/ 下(upload_<id>.part / upload_<id>.json)，
+每次追加都会更新mtime，超过TTL没有动静的上传由产物清理线程删除。
+整个文件的sha256在追加时增量计算，完成时不必重新读取文件；进程重启后首次续传时
+才从磁盘重算一次已接收部分的哈希。
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# 进程重启后重算哈希时每次读取的大小
+REHASH_BLOCK = 1024 * 1024
+
+
+class UploadNotFound(KeyError):
+    """上传不存在或已过期"""
+
+
+class UploadTooLarge(ValueError):
+    """超过单块或整个文件的大小上限"""
+
+
+class OffsetMismatch(ValueError):
+    """块的偏移量与已接收的字节数不一致，客户端应从 offset 处续传"""
+
+    def __init__(self, offset: int):
+        super().__init__(f'Expected offset {offset}')
+        self.offset = offset
+
+
+class ChecksumMismatch(ValueError):
+    """块或整个文件的sha256与客户端提供的不一致"""
+
+
+class UploadIncomplete(ValueError):
+    """还没有收到全部字节"""
+
+
+class ChunkedUploads:
+    def __init__(self, root: Path, chunk_size: int, max_bytes: int):
+        self.root = Path(root)
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._upload_locks: Dict[str, threading.Lock] = {}
+        # upload_id -> (已接收字节数, 整个文件的sha256对象)
+        self._hashers: Dict[str, Tuple[int, object]] = {}
+        self._counters = {'started': 0, 'chunks': 0, 'bytes': 0, 'retries': 0, 'rejected': 0,
+                          'completed': 0, 'rehashed': 0}
+
+    def _data_path(self, upload_id: str) -> Path:
+        return self.root / f'upload_{upload_id}.part'
+
+    def _state_path(self, upload_id: str) -> Path:
+        return self.root / f'upload_{upload_id}.json'
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            lock = self._upload_locks.get(upload_id)
+            if lock is None:
+                lock = self._upload_locks[upload_id] = threading.Lock()
+            return lock
+
+    def _load(self, upload_id: str) -> Dict:
+        if not _ID_RE.match(upload_id or ''):
+            raise UploadNotFound(upload_id)
+        try:
+            with open(self._state_path(upload_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # 已被清理线程删除的上传
+            self._forget(upload_id)
+            raise UploadNotFound(upload_id)
+
+    def _save(self, state: Dict) -> None:
+        path = self._state_path(state['id'])
+        tmp = path.with_name(f'{path.name}.tmp{os.getpid()}_{threading.get_ident()}')
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def start(self, filename: str, size: int, sha256: Optional[str] = None) -> Dict:
+        if size <= 0:
+            raise ValueError('size must be positive')
+        if size > self.max_bytes:
+            raise UploadTooLarge(f'File exceeds {self.max_bytes} bytes')
+        self.root.mkdir(parents=True, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        self._data_path(upload_id).touch()
+        state = {
+            'id': upload_id,
+            'filename': Path(filename or 'upload').name,
+            'size': size,
+            'offset': 0,
+            'sha256': sha256.lower() if sha256 else None,
+            'chunkSize': self.chunk_size,
+            'created': time.time(),
+            # 偏移量 -> 该块的sha256，用于识别客户端重发的已接收块
+            'chunks': {},
+        }
+        self._save(state)
+        self._hashers[upload_id] = (0, hashlib.sha256())
+        self._count('started')
+        return self.describe(state)
+
+    def status(self, upload_id: str) -> Dict:
+        return self.describe(self._load(upload_id))
+
+    @staticmethod
+    def describe(state: Dict) -> Dict:
+        return {
+            'uploadId': state['id'],
+            'fileName': state['filename'],
+            'size': state['size'],
+            'offset': state['offset'],
+            'chunkSize': state['chunkSize'],
+            'complete': state['offset'] == state['size'],
+        }
+
+    def _hasher(self, state: Dict):
+        """已接收部分的sha256；不在内存中(进程重启、由别的进程接收)时从磁盘重算"""
+        cached = self._hashers.get(state['id'])
+        if cached is not None and cached[0] == state['offset']:
+            return cached[1]
+        hasher = hashlib.sha256()
+        remaining = state['offset']
+        with open(self._data_path(state['id']), 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(REHASH_BLOCK, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        self._count('rehashed')
+        return hasher
+
+    def append(self, upload_id: str, offset: int, chunks: Iterable[bytes], checksum: Optional[str] = None) -> Dict:
+        """把一块数据写到offset处
+
+        offset必须等于已接收的字节数；重发已经确认过的块(偏移量和校验和都一致)直接返回当前状态。
+        校验和不一致或超过大小时丢弃这一块，已接收的部分不受影响。
+        """
+        with self._upload_lock(upload_id):
+            state = self._load(upload_id)
+            checksum = checksum.lower() if checksum else None
+            if offset != state['offset']:
+                if offset < state['offset'] and checksum and state['chunks'].get(str(offset)) == checksum:
+                    self._count('retries')
+                    return self.describe(state)
+                raise OffsetMismatch(state['offset'])
+
+            whole = self._hasher(state).copy()
+            chunk_hash = hashlib.sha256()
+            written = 0
+            limit = min(self.chunk_size, state['size'] - offset)
+            path = self._data_path(upload_id)
+            with open(path, 'r+b') as f:
+                f.seek(offset)
+                try:
+                    for data in chunks:
+                        written += len(data)
+                        if written > limit:
+                            raise UploadTooLarge(f'Chunk exceeds {limit} bytes')
+                        f.write(data)
+                        chunk_hash.update(data)
+                        whole.update(data)
+                    digest = chunk_hash.hexdigest()
+                    if checksum and checksum != digest:
+                        raise ChecksumMismatch('Chunk checksum mismatch')
+                except ValueError:
+                    f.truncate(offset)
+                    self._count('rejected')
+                    raise
+                f.truncate(offset + written)
+
+            state['offset'] = offset + written
+            if written:
+                state['chunks'][str(offset)] = digest
+            self._save(state)
+            self._hashers[upload_id] = (state['offset'], whole)
+            self._count('chunks')
+            self._count('bytes', written)
+            return self.describe(state)
+
+    def complete(self, upload_id: str, destination: Path, sha256: Optional[str] = None) -> Dict:
+        """确认全部接收且哈希一致后，把文件rename到destination(不复制、不重新读取)
+
+        返回 {'filename', 'size', 'sha256', 'path'}；整个文件哈希不一致时删除这次上传。
+        """
+        with self._upload_lock(upload_id):
+            state = self._load(upload_id)
+            if state['offset'] != state['size']:
+                raise UploadIncomplete(f"Received {state['offset']} of {state['size']} bytes")
+            digest = self._hasher(state).hexdigest()
+            expected = (sha256 or state['sha256'] or '').lower()
+            if expected and expected != digest:
+                self.discard(upload_id)
+                raise ChecksumMismatch('File checksum mismatch')
+            os.replace(self._data_path(upload_id), destination)
+            self.discard(upload_id)
+            self._count('completed')
+            return {'filename': state['filename'], 'size': state['size'], 'sha256': digest, 'path': destination}
+
+    def head(self, upload_id: str, size: int) -> bytes:
+        """已接收部分的文件头，用于识别格式"""
+        self._load(upload_id)
+        with open(self._data_path(upload_id), 'rb') as f:
+            return f.read(size)
+
+    def discard(self, upload_id: str) -> None:
+        self._data_path(upload_id).unlink(missing_ok=True)
+        self._state_path(upload_id).unlink(missing_ok=True)
+        self._forget(upload_id)
+
+    def _forget(self, upload_id: str) -> None:
+        self._hashers.pop(upload_id, None)
+        with self._lock:
+            self._upload_locks.pop(upload_id, None)
+
+    def prune(self) -> int:
+        """丢弃状态文件已不存在(过期后被清理线程删除)的上传的内存状态，返回丢弃的个数"""
+        with self._lock:
+            upload_ids = set(self._hashers) | set(self._upload_locks)
+        removed = 0
+        for upload_id in upload_ids:
+            if not self._state_path(upload_id).exists():
+                self._forget(upload_id)
+                removed += 1
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        counters['chunkSize'] = self.chunk_size
+        counters['maxBytes'] = self.max_bytes
+        return counters
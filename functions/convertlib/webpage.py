@@ -0,0 +1,311 @@
+"""HTML转Markdown：lxml解析，单次遍历输出标题、链接、列表、表格与代码块"""
+
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from convertlib import lazy
+
+# 不输出任何内容的元素
+DROP_TAGS = {
+    'script', 'style', 'noscript', 'template', 'svg', 'math', 'iframe', 'object', 'embed',
+    'canvas', 'form', 'button', 'input', 'select', 'textarea', 'head', 'link', 'meta',
+}
+
+# 导航、侧栏等；按整页输出(没有找到正文)时页眉页脚也去掉
+BOILERPLATE_TAGS = {'nav', 'aside'}
+PAGE_CHROME_TAGS = {'header', 'footer'}
+
+CONTAINER_TAGS = {
+    'html', 'body', 'div', 'section', 'article', 'main', 'header', 'footer', 'figure',
+    'figcaption', 'details', 'summary', 'center', 'address', 'fieldset', 'hgroup',
+}
+HEADING_TAGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+BLOCK_TAGS = CONTAINER_TAGS | set(HEADING_TAGS) | {
+    'p', 'ul', 'ol', 'pre', 'blockquote', 'table', 'hr', 'dl', 'nav', 'aside',
+}
+
+# 正文候选块至少要有这么多段落文字，否则输出整页
+MIN_CONTENT_CHARS = 200
+
+_LIST_ITEM_RE = re.compile(r'(- |\d+\. )')
+
+# 文本节点里的换行/制表符先换成空格(只有<br>产生换行)，同时转义Markdown特殊字符；
+# 一次translate完成，连续空格在整段拼好后统一折叠
+_TEXT_TABLE = str.maketrans({
+    **{c: '\\' + c for c in '\\*_`[]'},
+    **{c: ' ' for c in '\n\r\t\f\v'},
+})
+
+
+def _text(value: Optional[str]) -> str:
+    """文本节点：转义Markdown特殊字符，换行当作空格"""
+    return value.translate(_TEXT_TABLE) if value else ''
+
+
+def _collapse(value: str) -> str:
+    return ' '.join(value.split())
+
+
+def _squeeze(text: str) -> str:
+    """整理一段行内文本：折叠空白；<br>产生的换行输出为硬换行"""
+    if '\n' not in text:
+        return ' '.join(text.split())
+    lines = (' '.join(line.split()) for line in text.split('\n'))
+    return '  \n'.join(line for line in lines if line)
+
+
+def _wrap_inline(marker: str, text: str) -> str:
+    """把首尾空白移到强调标记外面，否则Markdown不识别"""
+    core = text.strip()
+    if not core:
+        return text
+    lead = ' ' if text[:1].isspace() else ''
+    trail = ' ' if text[-1:].isspace() else ''
+    return f'{lead}{marker}{core}{marker}{trail}'
+
+
+def _hidden(el) -> bool:
+    return (el.get('hidden') is not None or el.get('aria-hidden') == 'true'
+            or 'display:none' in (el.get('style') or '').replace(' ', ''))
+
+
+class _Renderer:
+    def __init__(self, base_url: Optional[str], drop: set):
+        self.base_url = base_url
+        self.drop = drop
+        self._urls: Dict[str, Optional[str]] = {}
+
+    def _href(self, value: Optional[str]) -> Optional[str]:
+        """解析为绝对地址；导航链接在同一页里反复出现，结果按原值缓存"""
+        if value in self._urls:
+            return self._urls[value]
+        raw = value
+        value = (value or '').strip()
+        url = None
+        if value and not value.startswith(('#', 'javascript:', 'data:')):
+            url = urljoin(self.base_url, value) if self.base_url else value
+            url = url.replace(' ', '%20').replace(')', '%29')
+        self._urls[raw] = url
+        return url
+
+    def blocks(self, el) -> List[str]:
+        """把元素的内容渲染成块列表；相邻的行内内容合并为一个段落"""
+        blocks = []
+        inline = [_text(el.text)]
+
+        def flush():
+            paragraph = _squeeze(''.join(inline))
+            inline.clear()
+            if paragraph:
+                blocks.append(paragraph)
+
+        for child in el:
+            tag = child.tag
+            if isinstance(tag, str) and tag not in self.drop and not _hidden(child):
+                if tag in BLOCK_TAGS:
+                    flush()
+                    block = self.block(child)
+                    if block:
+                        blocks.append(block)
+                else:
+                    inline.append(self.inline(child))
+            inline.append(_text(child.tail))
+        flush()
+        return blocks
+
+    def block(self, el) -> str:
+        tag = el.tag
+        if tag in HEADING_TAGS:
+            text = _squeeze(self.inline_children(el)).replace('  \n', ' ')
+            return f"{'#' * HEADING_TAGS[tag]} {text}" if text else ''
+        if tag in ('ul', 'ol'):
+            return self.list_block(el)
+        if tag == 'pre':
+            return self.code_block(el)
+        if tag == 'blockquote':
+            body = '\n\n'.join(self.blocks(el))
+            return '\n'.join(f'> {line}' if line else '>' for line in body.split('\n'))
+        if tag == 'table':
+            return self.table_block(el)
+        if tag == 'hr':
+            return '---'
+        if tag == 'dl':
+            return self.definition_block(el)
+        return '\n\n'.join(self.blocks(el))
+
+    def list_block(self, el) -> str:
+        ordered = el.tag == 'ol'
+        try:
+            number = int(el.get('start', '1'))
+        except ValueError:
+            number = 1
+        items = []
+        for li in el:
+            if li.tag != 'li' or _hidden(li):
+                continue
+            marker = f'{number}. ' if ordered else '- '
+            number += 1
+            body = ''
+            for block in self.blocks(li):
+                # 嵌套列表紧跟在上一行之后，不空行
+                separator = '\n' if _LIST_ITEM_RE.match(block) else '\n\n'
+                body = f'{body}{separator}{block}' if body else block
+            indent = ' ' * len(marker)
+            lines = body.split('\n')
+            items.append('\n'.join([marker + lines[0]] + [indent + line if line else '' for line in lines[1:]]))
+        return '\n'.join(items)
+
+    def code_block(self, el) -> str:
+        code = ''.join(el.itertext()).strip('\n')
+        if not code.strip():
+            return ''
+        language = ''
+        for node in (el, el.find('code')):
+            if node is not None:
+                for cls in (node.get('class') or '').split():
+                    if cls.startswith(('language-', 'lang-')):
+                        language = cls.split('-', 1)[1]
+        fence = '````' if '```' in code else '```'
+        return f'{fence}{language}\n{code}\n{fence}'
+
+    def table_block(self, el) -> str:
+        rows = []
+        for tr in el.iter('tr'):
+            cells = [
+                _squeeze(self.inline_children(cell)).replace('  \n', ' ').replace('|', '\\|')
+                for cell in tr if cell.tag in ('td', 'th')
+            ]
+            if cells:
+                rows.append(cells)
+        if not rows:
+            return ''
+        width = max(len(row) for row in rows)
+        lines = []
+        for index, row in enumerate(rows):
+            row = row + [''] * (width - len(row))
+            lines.append('| ' + ' | '.join(row) + ' |')
+            if index == 0:
+                lines.append('|' + ' --- |' * width)
+        return '\n'.join(lines)
+
+    def definition_block(self, el) -> str:
+        lines = []
+        for child in el:
+            text = _squeeze(self.inline_children(child)).replace('  \n', ' ')
+            if not text:
+                continue
+            if child.tag == 'dt':
+                lines.append(f'**{text}**')
+            elif child.tag == 'dd':
+                lines.append(f': {text}')
+        return '\n'.join(lines)
+
+    def inline_children(self, el) -> str:
+        parts = [_text(el.text)]
+        for child in el:
+            tag = child.tag
+            if isinstance(tag, str) and tag not in self.drop and not _hidden(child):
+                parts.append(self.inline(child))
+            parts.append(_text(child.tail))
+        return ''.join(parts)
+
+    def inline(self, el) -> str:
+        tag = el.tag
+        if tag == 'br':
+            return '\n'
+        if tag == 'img':
+            src = self._href(el.get('src'))
+            return f"![{_text(el.get('alt'))}]({src})" if src else ''
+        if tag in ('code', 'kbd', 'samp', 'tt'):
+            code = ' '.join(''.join(el.itertext()).split())
+            if not code.strip():
+                return code
+            if '`' in code:
+                return f'`` {code} ``'
+            return f'`{code}`'
+
+        text = self.inline_children(el)
+        if tag == 'a':
+            href = self._href(el.get('href'))
+            if href and text.strip():
+                return f'[{text.strip()}]({href})'
+            return text
+        if tag in ('strong', 'b'):
+            return _wrap_inline('**', text)
+        if tag in ('em', 'i', 'cite'):
+            return _wrap_inline('*', text)
+        if tag in ('del', 's', 'strike'):
+            return _wrap_inline('~~', text)
+        if tag in BLOCK_TAGS or tag == 'li':
+            # 行内元素里嵌套的块元素只保留文字，前后断开
+            return f' {text} '
+        return text
+
+
+def _main_content(doc):
+    """找正文所在的元素；没有明确标记时按段落文字量给祖先元素打分"""
+    for path in ('//main', '//*[@role="main"]', '//article'):
+        found = doc.xpath(path)
+        if len(found) == 1:
+            return found[0]
+
+    scores: Dict = {}
+    for p in doc.iter('p', 'pre', 'blockquote'):
+        length = len(''.join(p.itertext()))
+        if length < 25:
+            continue
+        parent = p.getparent()
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + length
+        grandparent = parent.getparent()
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0) + length / 2
+    if scores:
+        best, score = max(scores.items(), key=lambda item: item[1])
+        if score >= MIN_CONTENT_CHARS:
+            return best
+    return None
+
+
+def html_to_markdown(content: bytes, base_url: Optional[str] = None, encoding: Optional[str] = None,
+                     collect_links: bool = False) -> Dict:
+    """返回 {'title': 标题, 'markdown': 正文Markdown}
+
+    collect_links 时另外返回 links：整页(含导航)所有<a href>的绝对地址，供抓取整站使用。
+    """
+    # 用lxml.etree而不是lxml.html：后者给每个元素做自定义类查找，遍历时开销明显
+    etree = lazy.load('lxml.etree')
+    parser = etree.HTMLParser(encoding=encoding, remove_comments=True, remove_pis=True, no_network=True)
+    try:
+        doc = etree.fromstring(content, parser=parser)
+    except (etree.LxmlError, ValueError):
+        doc = None
+    if doc is None:
+        # 空文档或无法解析
+        return {'title': '', 'markdown': '', 'links': []} if collect_links else {'title': '', 'markdown': ''}
+
+    title_el = doc.find('.//title')
+    title = _collapse(''.join(title_el.itertext())) if title_el is not None else ''
+    base = doc.find('.//base[@href]')
+    if base is not None:
+        base_url = urljoin(base_url or '', base.get('href'))
+
+    root = _main_content(doc)
+    drop = DROP_TAGS | BOILERPLATE_TAGS
+    if root is None:
+        root = doc.find('body')
+        if root is None:
+            root = doc
+        drop = drop | PAGE_CHROME_TAGS
+
+    renderer = _Renderer(base_url, drop)
+    blocks = renderer.block(root) if root.tag in BLOCK_TAGS else '\n\n'.join(renderer.blocks(root))
+    if not title:
+        h1 = root.find('.//h1')
+        title = _collapse(''.join(h1.itertext())) if h1 is not None else ''
+    result = {'title': title, 'markdown': blocks}
+    if collect_links:
+        result['links'] = [url for url in (renderer._href(a.get('href')) for a in doc.iter('a')) if url]
+    return result
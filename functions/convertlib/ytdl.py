@@ -0,0 +1,237 @@
+"""yt-dlp封装：按视频id缓存的信息提取、格式列表与下载参数"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from convertlib import lazy
+
+AUDIO_TARGETS = {'mp3', 'm4a', 'wav'}
+
+# 分片(HLS/DASH)下载的并发数上限
+MAX_FRAGMENTS = 16
+
+# 按HTTP Range分块下载，避免单个大请求被服务器限速
+HTTP_CHUNK_SIZE = 10 * 1024 * 1024
+
+_extractors = None
+_extractors_lock = threading.Lock()
+
+
+class UnknownFormat(ValueError):
+    """客户端指定的格式id不在提取到的格式列表中"""
+
+
+def _extractor_classes():
+    global _extractors
+    if _extractors is None:
+        with _extractors_lock:
+            if _extractors is None:
+                extractor = lazy.load('yt_dlp.extractor')
+                _extractors = [ie for ie in extractor.gen_extractor_classes() if ie.ie_key() != 'Generic']
+    return _extractors
+
+
+def video_key(url: str) -> str:
+    """不联网得到缓存键：能由提取器从URL解析出id时用 提取器:id，否则用URL的哈希
+
+    同一视频的不同URL写法(短链接、带时间参数等)共用一个缓存条目。
+    """
+    for ie in _extractor_classes():
+        if ie.suitable(url):
+            temp_id = ie.get_temp_id(url)
+            if temp_id:
+                return f'{ie.ie_key()}:{temp_id}'
+            break
+    return 'url:' + hashlib.sha256(url.strip().encode()).hexdigest()
+
+
+class InfoCache:
+    """extract_info结果的磁盘缓存
+
+    格式里的直链通常几小时后失效，TTL应短于此；下载失败时调用方用新提取的信息重试。
+    """
+
+    def __init__(self, root: Path, ttl: float, enabled: bool = True):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.enabled = enabled and ttl > 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0}
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                raise FileNotFoundError
+            with open(path) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            self._count('misses')
+            return None
+        self._count('hits')
+        return info
+
+    def put(self, key: str, info: Dict) -> None:
+        if not self.enabled:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_name(f'{path.name}.tmp{os.getpid()}_{threading.get_ident()}')
+        with open(tmp, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp, path)
+        self._count('stores')
+
+    def invalidate(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        counters['enabled'] = self.enabled
+        counters['ttl'] = self.ttl
+        return counters
+
+
+def extract_info(ydl, url: str, cache: InfoCache, refresh: bool = False) -> Dict:
+    """返回可直接交给 process_ie_result 的信息字典，info['_cached'] 标记是否来自缓存"""
+    key = video_key(url)
+    info = None if refresh else cache.get(key)
+    cached = info is not None
+    if info is None:
+        info = ydl.sanitize_info(ydl.extract_info(url, download=False, process=True))
+        try:
+            cache.put(key, info)
+        except OSError:
+            # 缓存写入失败不影响本次下载
+            pass
+    info = dict(info)
+    info['_cached'] = cached
+    return info
+
+
+def summarize_formats(info: Dict) -> List[Dict]:
+    """供客户端选择的格式列表(从最好到最差)"""
+    formats = []
+    for f in reversed(info.get('formats') or []):
+        vcodec = f.get('vcodec')
+        acodec = f.get('acodec')
+        formats.append({
+            'formatId': f.get('format_id'),
+            'ext': f.get('ext'),
+            'resolution': f.get('resolution') or (f"{f['width']}x{f['height']}" if f.get('width') and f.get('height') else None),
+            'fps': f.get('fps'),
+            'vcodec': None if vcodec == 'none' else vcodec,
+            'acodec': None if acodec == 'none' else acodec,
+            'bitrate': f.get('tbr'),
+            'filesize': f.get('filesize') or f.get('filesize_approx'),
+            'protocol': f.get('protocol'),
+            'note': f.get('format_note'),
+        })
+    return formats
+
+
+def probe_summary(info: Dict) -> Dict:
+    return {
+        'id': info.get('id'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+        'uploader': info.get('uploader'),
+        'thumbnail': info.get('thumbnail'),
+        'extractor': info.get('extractor_key') or info.get('extractor'),
+        'formats': summarize_formats(info),
+    }
+
+
+def format_selector(target_format: str, format_id: Optional[str], info: Optional[Dict] = None) -> str:
+    """客户端指定的格式id(可用'+'合并音视频)必须出现在提取到的格式列表中"""
+    if format_id:
+        if info is not None:
+            available = {f.get('format_id') for f in info.get('formats') or []}
+            unknown = [part for part in format_id.split('+') if part not in available]
+            if unknown:
+                raise UnknownFormat(f"Unknown format id: {', '.join(unknown)}")
+        return format_id
+    if target_format in AUDIO_TARGETS:
+        return 'bestaudio/best'
+    return 'best[ext=mp4]/best' if target_format == 'mp4' else 'bestaudio/best'
+
+
+def download_options(outtmpl: str, target_format: str, fragments: int = 4,
+                     rate_limit: Optional[int] = None, throttled_rate: Optional[int] = None) -> Dict:
+    """下载用的ydl_opts(不含format和进度回调)"""
+    opts = {
+        'outtmpl': outtmpl,
+        'noplaylist': True,
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'concurrent_fragment_downloads': max(1, min(fragments, MAX_FRAGMENTS)),
+        'http_chunk_size': HTTP_CHUNK_SIZE,
+        'retries': 3,
+        'fragment_retries': 5,
+    }
+    if rate_limit:
+        opts['ratelimit'] = rate_limit
+    if throttled_rate:
+        # 速度持续低于该值时重新提取直链
+        opts['throttledratelimit'] = throttled_rate
+    if target_format in AUDIO_TARGETS:
+        opts['postprocessors'] = [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': target_format if target_format != 'm4a' else 'aac',
+            'preferredquality': '192',
+        }]
+    elif target_format in ('mp4', 'webm', 'mkv'):
+        # 分开下载的音视频合并成目标容器
+        opts['merge_output_format'] = target_format
+    return opts
+
+
+def parse_rate(value: Optional[str]) -> Optional[int]:
+    """'500K'、'2M' 之类的速率，无效时抛出ValueError"""
+    if not value:
+        return None
+    rate = lazy.load('yt_dlp.utils').parse_bytes(value)
+    if not rate:
+        raise ValueError(f'Invalid rate: {value}')
+    return rate
+
+
+def download(url: str, target_format: str, opts: Dict, cache: InfoCache, format_id: Optional[str] = None,
+             refresh: bool = False) -> Dict:
+    """提取(或取缓存)后下载；缓存的直链已失效导致下载失败时重新提取一次
+
+    与 yt-dlp 的 --load-info-json 相同，下载时把提取结果交给 process_ie_result，
+    格式选择在这一步按 format 重新进行。
+    """
+    yt_dlp = lazy.load('yt_dlp')
+    with yt_dlp.YoutubeDL({k: v for k, v in opts.items() if k not in ('progress_hooks', 'postprocessors')}) as extractor:
+        info = extract_info(extractor, url, cache, refresh=refresh)
+        for attempt in (1, 2):
+            download_opts = dict(opts, format=format_selector(target_format, format_id, info))
+            try:
+                with yt_dlp.YoutubeDL(download_opts) as ydl:
+                    result = ydl.process_ie_result({k: v for k, v in info.items() if k != '_cached'}, download=True)
+                result['_cached'] = info['_cached']
+                return result
+            except yt_dlp.utils.DownloadError:
+                if attempt == 2 or not info['_cached']:
+                    raise
+                cache.invalidate(video_key(url))
+                info = extract_info(extractor, url, cache, refresh=True)
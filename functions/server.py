@@ -0,0 +1,399 @@
+"""自托管部署用的ASGI应用，与Netlify handler共用同一套转换函数
+
+用法:
+    cd functions && uvicorn server:app --host 0.0.0.0 --port 8000
+
+与每次调用都重新初始化的handler相比：
+- 文件转换(包括 async=true 的异步任务)交给常驻的进程池执行，工作进程启动时预先导入PIL、reportlab等重量级库
+  (CONVERT_SERVER_WORKERS 进程数，CONVERT_SERVER_WARMUP 预热的转换类型，默认all)；
+- 上传边接收边解析写盘，下载用aiofiles按块读取并流式返回，支持Range和条件请求；
+- 事件循环只做IO，URL抓取、批量转换等等待IO为主的操作放到线程池。
+"""
+
+import asyncio
+import base64
+import contextvars
+import functools
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+import aiofiles
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+import convert
+from convertlib import batch, downloads, lazy, multipart, tracing, uploads
+
+SERVER_WORKERS = int(os.environ.get('CONVERT_SERVER_WORKERS', '0')) or batch.worker_count()
+_warmup = os.environ.get('CONVERT_SERVER_WARMUP', 'all').strip()
+SERVER_WARMUP = list(lazy.BACKENDS) if _warmup == 'all' else [g.strip() for g in _warmup.split(',') if g.strip()]
+
+# 请求体攒到这么大再交给解析线程，减少线程切换
+FEED_SIZE = 1024 * 1024
+
+# 流式下载每次读取的大小
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_info: Dict = {}
+
+
+def _init_worker(groups) -> None:
+    """工作进程启动时导入转换用的重量级库，之后每个请求都是热的"""
+    lazy.warm_up(groups)
+
+
+def _ping() -> Dict:
+    # 停留片刻，保证预热时每个任务落在不同的工作进程上
+    time.sleep(0.05)
+    return {'pid': os.getpid(), 'imports': lazy.import_report()}
+
+
+def run_in_worker(fn, args, kwargs, uploads):
+    """工作进程内执行转换，返回响应和各阶段耗时，由主进程并入请求的Trace"""
+    with tracing.request('worker') as trace:
+        response = convert.discarding_uploads(uploads, fn, *args, **kwargs)
+    return response, trace.stages
+
+
+def run_job_in_worker(job_id, fn, args, kwargs):
+    """工作进程内执行异步任务，进度直接写入共享的任务存储"""
+    with tracing.request('job') as trace:
+        response = fn(*args, progress=convert.JOB_QUEUE.progress_callback(job_id), **kwargs)
+    return response, trace.stages
+
+
+def _make_pool() -> ProcessPoolExecutor:
+    # spawn而不是fork：主进程里已有事件循环和清理线程
+    return ProcessPoolExecutor(
+        max_workers=SERVER_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(SERVER_WARMUP,),
+    )
+
+
+async def _start_pool() -> None:
+    """创建进程池并让所有工作进程完成启动和预热"""
+    global _pool
+    _pool = _make_pool()
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    workers = await asyncio.gather(*(loop.run_in_executor(_pool, _ping) for _ in range(SERVER_WORKERS)))
+    _pool_info.update({
+        'workers': SERVER_WORKERS,
+        'warmup': SERVER_WARMUP,
+        'startupMs': round((time.perf_counter() - start) * 1000, 2),
+        'pids': sorted({worker['pid'] for worker in workers}),
+        'restarts': _pool_info.get('restarts', 0),
+    })
+
+
+async def _in_thread(fn, *args, **kwargs):
+    """在线程池中执行，沿用当前请求的Trace"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(context.run, fn, *args, **kwargs))
+
+
+async def _in_worker(fn, args, kwargs, uploads):
+    try:
+        response, stages = await asyncio.get_running_loop().run_in_executor(
+            _pool, run_in_worker, fn, args, kwargs, uploads
+        )
+    except BrokenProcessPool:
+        # 工作进程崩溃(如内存不足被杀)：换一个新的进程池，本次请求返回500
+        _replace_pool(uploads)
+        raise
+    trace = tracing.current()
+    if trace is not None:
+        for name, stage in stages.items():
+            trace.add(name, stage['seconds'], stage['bytes'], stage['rssMb'], stage['rssDeltaMb'])
+    return response
+
+
+def _replace_pool(uploads) -> None:
+    global _pool
+    for upload in uploads:
+        upload.path.unlink(missing_ok=True)
+    _pool_info['restarts'] = _pool_info.get('restarts', 0) + 1
+    _pool = _make_pool()
+
+
+def _run_job(job_id, fn, args, kwargs, progress):
+    """JOB_QUEUE.runner：有输入文件的异步转换交给进程池，任务线程只等待结果
+
+    URL转换、下载仍在任务线程里执行；批量转换自己使用进程池，PDF合并以流式读写为主，也在任务线程里执行。
+    """
+    if not (fn is convert.discarding_uploads and args[1] is convert.handle_conversion_sync and args[2] is not None):
+        return fn(*args, progress=progress, **kwargs)
+    pool = _pool
+    try:
+        response, stages = pool.submit(run_job_in_worker, job_id, fn, args, kwargs).result()
+    except BrokenProcessPool:
+        if pool is _pool:
+            _replace_pool(args[0])
+        raise
+    # 不在请求内，计入进程级指标
+    for name, stage in stages.items():
+        tracing.add(name, stage['seconds'], stage['bytes'])
+    return response
+
+
+@asynccontextmanager
+async def lifespan(app):
+    convert.ARTIFACTS.start_sweeper()
+    await _start_pool()
+    convert.JOB_QUEUE.runner = _run_job
+    yield
+    convert.JOB_QUEUE.runner = None
+    _pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+
+def _to_response(response: Dict) -> Response:
+    """handler风格的响应字典 -> ASGI响应"""
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        body = base64.b64decode(body)
+    return Response(content=body, status_code=response['statusCode'], headers=response.get('headers') or {})
+
+
+def _json_error(status_code: int, error: str) -> Dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+        },
+        'body': json.dumps({'error': error})
+    }
+
+
+@app.post('/api/convert')
+async def convert_upload(request: Request):
+    with tracing.request('POST /api/convert') as trace:
+        trace.include_json = request.query_params.get('trace') == 'true'
+        try:
+            response = await _convert_upload(request)
+        except Exception as e:
+            response = _json_error(500, f'Conversion failed: {str(e)}')
+        return _to_response(tracing.finish(trace, response))
+
+
+async def _convert_upload(request: Request) -> Dict:
+    content_type = request.headers.get('content-type', '')
+    if 'multipart/form-data' not in content_type:
+        return _json_error(400, 'Invalid content type')
+    boundary = multipart.parse_boundary(content_type)
+    if not boundary:
+        return _json_error(400, 'No boundary found')
+
+    file_id = str(uuid.uuid4())
+    parser = convert.upload_parser(boundary, file_id)
+
+    # 边接收边解析；写盘在线程里进行，不阻塞事件循环
+    buffer = bytearray()
+    received = 0
+    receive_seconds = 0.0
+    try:
+        stream = request.stream().__aiter__()
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                receive_seconds += time.perf_counter() - start
+            buffer += chunk
+            received += len(chunk)
+            if len(buffer) >= FEED_SIZE:
+                data = bytes(buffer)
+                buffer.clear()
+                with tracing.stage('parse', len(data)):
+                    await _in_thread(parser.feed, data)
+        with tracing.stage('parse', len(buffer)):
+            await _in_thread(parser.feed, bytes(buffer))
+            parser.close()
+    except ValueError as e:
+        return convert.upload_error_response(parser, e)
+    except ClientDisconnect:
+        parser.abort()
+        return _json_error(400, 'Client disconnected')
+    finally:
+        tracing.add('receive', receive_seconds, received)
+
+    response, call = convert.plan_conversion(parser.files, parser.fields, file_id)
+    if response:
+        return response
+    return await _dispatch(call, parser.files)
+
+
+async def _dispatch(call, files) -> Dict:
+    fn, args, kwargs = call
+    if fn is convert.handle_conversion_sync and args[0] is not None:
+        # 有输入文件的转换是CPU密集的，交给预热过的工作进程
+        return await _in_worker(fn, args, kwargs, files)
+    # URL转换、抓取、下载以等待网络为主；批量转换自己使用进程池
+    return await _in_thread(convert.discarding_uploads, files, fn, *args, **kwargs)
+
+
+@app.post('/api/uploads/{upload_id}/complete')
+async def upload_complete(upload_id: str, request: Request):
+    with tracing.request('POST /api/uploads') as trace:
+        trace.include_json = request.query_params.get('trace') == 'true'
+        try:
+            response, call, files = await _in_thread(convert.complete_upload, upload_id, await request.json())
+            if not response:
+                response = await _dispatch(call, files)
+        except (KeyError, ValueError) as e:
+            response = convert.upload_error(e)
+        except Exception as e:
+            response = _json_error(500, f'Conversion failed: {str(e)}')
+        return _to_response(tracing.finish(trace, response))
+
+
+@app.post('/api/uploads/{upload_id}')
+async def upload_chunk(upload_id: str, request: Request):
+    with tracing.request('POST /api/uploads') as trace:
+        chunks = []
+        received = 0
+        try:
+            offset = int(request.query_params.get('offset', ''))
+            async for chunk in request.stream():
+                received += len(chunk)
+                # 单块大小有上限，超出时不必收完
+                if received > convert.UPLOADS.chunk_size:
+                    raise uploads.UploadTooLarge(f'Chunk exceeds {convert.UPLOADS.chunk_size} bytes')
+                chunks.append(chunk)
+            with tracing.stage('write'):
+                status = await _in_thread(
+                    convert.UPLOADS.append, upload_id, offset, chunks, request.headers.get('x-chunk-sha256')
+                )
+            response = {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Cache-Control': 'no-cache',
+                },
+                'body': json.dumps(status)
+            }
+        except (KeyError, ValueError) as e:
+            response = convert.upload_error(e)
+        except ClientDisconnect:
+            response = _json_error(400, 'Client disconnected')
+        return _to_response(tracing.finish(trace, response))
+
+
+@app.post('/api/uploads')
+async def upload_start(request: Request):
+    event = dict(_event(request, '/api/uploads'), body=(await request.body()).decode('utf-8', 'replace'))
+    return _to_response(await _in_thread(convert.handler, event, None))
+
+
+@app.get('/api/download/{filename}')
+async def download(filename: str, request: Request):
+    with tracing.request('GET /api/download') as trace:
+        file_path = convert.ARTIFACTS.open(filename)
+        if file_path is None:
+            return _to_response(tracing.finish(trace, _json_error(404, 'File not found')))
+        return _stream_file(request, trace, file_path, filename)
+
+
+@app.get('/api/objects/{filename}')
+async def download_object(filename: str, request: Request):
+    # 预签名的对象存储下载，大文件不经过函数响应体
+    with tracing.request('GET /api/objects') as trace:
+        query = request.query_params
+        if not convert.OBJECT_STORE.verify(filename, query.get('expires'), query.get('signature')):
+            return _to_response(tracing.finish(trace, _json_error(403, 'Invalid or expired signature')))
+        object_path = convert.OBJECT_STORE.path_for(filename)
+        if not object_path.is_file():
+            return _to_response(tracing.finish(trace, _json_error(404, 'File not found')))
+        return _stream_file(request, trace, object_path, filename)
+
+
+def _stream_file(request: Request, trace, file_path: Path, filename: str):
+    """与 convert.serve_file 相同的缓存和Range处理，内容按块异步读取"""
+    request_headers = {k.lower(): v for k, v in request.headers.items()}
+    stat = file_path.stat()
+    etag = downloads.etag_for(stat)
+    headers = {
+        'Content-Type': convert.get_mime_type(filename),
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Access-Control-Allow-Origin': '*',
+        'Cache-Control': 'no-cache',
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': downloads.last_modified_for(stat),
+    }
+
+    if downloads.is_not_modified(request_headers, etag, stat):
+        return _to_response(tracing.finish(trace, {'statusCode': 304, 'headers': headers, 'body': ''}))
+
+    try:
+        byte_range = downloads.parse_range(request_headers, stat.st_size, etag)
+    except downloads.RangeNotSatisfiable:
+        headers['Content-Range'] = f'bytes */{stat.st_size}'
+        return _to_response(tracing.finish(trace, {'statusCode': 416, 'headers': headers, 'body': ''}))
+
+    if byte_range:
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        status_code = 206
+    else:
+        start, end = 0, stat.st_size - 1
+        status_code = 200
+    headers['Content-Length'] = str(end - start + 1)
+
+    async def body():
+        remaining = end - start + 1
+        async with aiofiles.open(file_path, 'rb') as f:
+            await f.seek(start)
+            while remaining > 0:
+                chunk = await f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    # Server-Timing只包含开始发送之前的部分
+    response = tracing.finish(trace, {'statusCode': status_code, 'headers': headers})
+    return StreamingResponse(body(), status_code=status_code, headers=response['headers'])
+
+
+@app.get('/api/status')
+async def status(request: Request):
+    response = await _in_thread(convert.handler, _event(request, '/api/status'), None)
+    body = json.loads(response['body'])
+    body['server'] = dict(_pool_info)
+    response['body'] = json.dumps(body)
+    return _to_response(response)
+
+
+def _event(request: Request, path: str) -> Dict:
+    return {
+        'httpMethod': request.method,
+        'path': path,
+        'headers': dict(request.headers),
+        'queryStringParameters': dict(request.query_params),
+    }
+
+
+@app.get('/api/{path:path}')
+async def passthrough(path: str, request: Request):
+    # 任务状态、指标、预热、对象存储等轻量接口直接复用handler
+    response = await _in_thread(convert.handler, _event(request, f'/api/{path}'), None)
+    return _to_response(response)
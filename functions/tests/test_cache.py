@@ -0,0 +1,22 @@
+"""ResultCache：缓存键按实际转换类型计入后端版本，不影响输出的参数不参与"""
+
+from convertlib import cache
+
+
+def test_key_depends_on_resolved_kind(tmp_path, monkeypatch):
+    result_cache = cache.ResultCache(tmp_path, max_bytes=1024)
+    params = {'targetFormat': 'png', 'conversionType': 'document'}
+    image_key = result_cache.key('abc', params, 'image')
+    assert image_key != result_cache.key('abc', params, 'document')
+
+    # 后端升级后同一输入不再命中旧条目
+    monkeypatch.setitem(cache._backend_versions, 'image', 'Pillow=999')
+    assert result_cache.key('abc', params, 'image') != image_key
+
+
+def test_key_ignores_output_neutral_params(tmp_path):
+    result_cache = cache.ResultCache(tmp_path, max_bytes=1024)
+    params = {'targetFormat': 'png'}
+    key = result_cache.key('abc', params, 'image')
+    assert result_cache.key('abc', dict(params, trace='true', parallel='false'), 'image') == key
+    assert result_cache.key('abc', dict(params, quality='50'), 'image') != key
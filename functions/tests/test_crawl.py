@@ -0,0 +1,164 @@
+"""crawl：用本地 http.server 提供的小站点测试抓取范围、robots.txt、去重和站点地图展开"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('lxml')
+
+from convertlib import crawl, fetch  # noqa: E402
+
+PAGE = '<html><head><title>{title}</title></head><body><h1>{title}</h1><p>{text}</p>{links}</body></html>'
+
+
+def page(title, *links, text=None):
+    anchors = ''.join(f'<a href="{href}">{href}</a>' for href in links)
+    return 200, 'text/html; charset=utf-8', PAGE.format(title=title, text=text or f'Body of {title}', links=anchors)
+
+
+def site(robots, other_host=''):
+    """/docs/ 为起始目录；/docs/copy.html 与 /docs/a.html 内容相同；/blog/ 在起始目录之外"""
+    return {
+        '/robots.txt': robots,
+        '/docs/': page('Docs', 'a.html', 'b.html', 'a.html#top', '/docs/b.html', 'image.png', '../blog/x.html',
+                       f'{other_host}/docs/elsewhere.html', 'copy.html', 'private/secret.html'),
+        '/docs/a.html': page('Page A', '/docs/', 'b.html', text='Same text'),
+        '/docs/copy.html': page('Page A', '/docs/', 'b.html', text='Same text'),
+        '/docs/b.html': page('Page B', 'a.html'),
+        '/docs/private/secret.html': page('Secret'),
+        '/docs/image.png': (200, 'image/png', 'not really a png'),
+        '/blog/x.html': page('Blog'),
+        '/sitemap.xml': (200, 'application/xml', (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            '<sitemap><loc>{base}/sitemap-pages.xml</loc></sitemap>'
+            '</sitemapindex>'
+        )),
+        '/sitemap-pages.xml': (200, 'application/xml', (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            '<url><loc>{base}/docs/a.html</loc></url>'
+            '<url><loc>{base}/blog/x.html</loc></url>'
+            '<url><loc>{base}/docs/a.html#again</loc></url>'
+            '</urlset>'
+        )),
+    }
+
+
+class ListSink:
+    def __init__(self):
+        self.pages = []
+        self.closed = False
+
+    def add(self, url, title, markdown):
+        self.pages.append((url, title))
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """启动一个本地站点，返回 (基础URL, 请求过的路径列表)"""
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1,localhost')
+    monkeypatch.setenv('no_proxy', '127.0.0.1,localhost')
+    servers = []
+
+    def start(routes):
+        requested = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requested.append(self.path)
+                status, content_type, body = routes.get(self.path, (404, 'text/plain', 'not found'))
+                data = body.replace('{base}', base).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return base, requested
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    return fetch.Fetcher(fetch.HttpCache(tmp_path, max_bytes=1024 * 1024, enabled=False), max_bytes=1024 * 1024)
+
+
+def run(fetcher, url, **options):
+    sink = ListSink()
+    stats = crawl.crawl(fetcher, url, sink, delay=0, concurrency=4, **options)
+    assert sink.closed
+    return sink, stats
+
+
+def test_crawl_stays_in_scope_and_dedups(serve, fetcher):
+    other, other_requested = serve(site((404, 'text/plain', '')))
+    base, requested = serve(site((404, 'text/plain', 'not found'), other_host=other))
+
+    sink, stats = run(fetcher, f'{base}/docs/')
+    assert sorted(title for _, title in sink.pages) == ['Docs', 'Page A', 'Page B', 'Secret']
+    # copy.html 与 a.html 转换结果相同，只保留先抓到的一份
+    assert stats['pages'] == 4
+    assert stats['duplicates'] == 1
+    assert stats['errors'] == 0
+    # 片段和相对/绝对写法指向同一页面，每个页面只请求一次；范围外的链接和非网页扩展名不请求
+    pages = [path for path in requested if path != '/robots.txt']
+    assert sorted(pages) == ['/docs/', '/docs/a.html', '/docs/b.html', '/docs/copy.html', '/docs/private/secret.html']
+    assert other_requested == []
+
+
+def test_crawl_respects_max_pages(serve, fetcher):
+    base, _ = serve(site((404, 'text/plain', '')))
+    sink, stats = run(fetcher, f'{base}/docs/', max_pages=2)
+    assert len(sink.pages) == 2
+    assert stats['truncated'] is True
+
+
+def test_robots_disallow_rules(serve, fetcher):
+    robots = (200, 'text/plain', 'User-agent: *\nDisallow: /docs/private/\n')
+    base, requested = serve(site(robots))
+    sink, stats = run(fetcher, f'{base}/docs/')
+    assert 'Secret' not in [title for _, title in sink.pages]
+    assert stats['robotsBlocked'] == 1
+    assert '/docs/private/secret.html' not in requested
+
+
+def test_robots_4xx_allows_everything(serve, fetcher):
+    base, _ = serve(site((403, 'text/plain', 'forbidden')))
+    sink, stats = run(fetcher, f'{base}/docs/')
+    assert stats['robotsBlocked'] == 0
+    assert stats['pages'] == 4
+
+
+def test_robots_5xx_disallows_everything(serve, fetcher):
+    base, requested = serve(site((500, 'text/plain', 'server error')))
+    sink, stats = run(fetcher, f'{base}/docs/')
+    assert sink.pages == []
+    assert stats['robotsBlocked'] == 1
+    assert requested == ['/robots.txt']
+
+
+def test_sitemap_index_is_expanded(serve, fetcher):
+    base, requested = serve(site((404, 'text/plain', '')))
+    sink, stats = run(fetcher, f'{base}/sitemap.xml')
+    # 站点地图模式不限于起始目录，列出的页面不再跟随链接
+    assert sorted(title for _, title in sink.pages) == ['Blog', 'Page A']
+    assert '/sitemap-pages.xml' in requested
+    assert '/docs/b.html' not in requested
+    assert stats['errors'] == 0
@@ -0,0 +1,52 @@
+"""文档转PDF：按窗口喂给platypus的排版完整，ASCII85开关只在生成期间关闭"""
+
+from PyPDF2 import PdfReader
+from reportlab import rl_config
+
+from convertlib import documents
+
+
+def _pdf_text(path):
+    reader = PdfReader(str(path))
+    return len(reader.pages), ''.join(page.extract_text() for page in reader.pages)
+
+
+def test_paragraphs_beyond_window_are_all_rendered(tmp_path):
+    count = documents.FLOWABLE_WINDOW * 3 + 5
+    paragraphs = ((f'Paragraph {i} ' + 'word ' * 60, 'Heading1' if i % 10 == 0 else 'Normal')
+                  for i in range(count))
+    dst = tmp_path / 'out.pdf'
+    documents.paragraphs_to_pdf(paragraphs, dst, 'Helvetica')
+
+    pages, text = _pdf_text(dst)
+    assert pages > 1
+    for i in (0, documents.FLOWABLE_WINDOW, count - 1):
+        assert f'Paragraph {i} ' in text
+
+
+def test_long_paragraph_split_across_pages(tmp_path):
+    # 单段跨多页时拆分后的剩余部分仍要排完
+    dst = tmp_path / 'out.pdf'
+    documents.paragraphs_to_pdf(iter([('start ' + 'filler ' * 3000 + 'end', 'Normal')]), dst, 'Helvetica')
+
+    pages, text = _pdf_text(dst)
+    assert pages > 1
+    assert text.rstrip().endswith('end')
+
+
+def test_empty_document_has_one_page(tmp_path):
+    dst = tmp_path / 'out.pdf'
+    documents.paragraphs_to_pdf(iter([('   ', 'Normal')]), dst, 'Helvetica')
+    assert _pdf_text(dst)[0] == 1
+
+
+def test_a85_setting_restored(tmp_path, monkeypatch):
+    monkeypatch.setattr(rl_config, 'useA85', 1)
+    src = tmp_path / 'in.txt'
+    src.write_text('hello\n' * 100)
+    documents.text_to_pdf(src, tmp_path / 'out.pdf')
+    documents.paragraphs_to_pdf(iter([('hello', 'Normal')]), tmp_path / 'out2.pdf', 'Helvetica')
+
+    assert rl_config.useA85 == 1
+    assert b'ASCII85Decode' not in (tmp_path / 'out.pdf').read_bytes()
+    assert b'ASCII85Decode' not in (tmp_path / 'out2.pdf').read_bytes()
@@ -0,0 +1,32 @@
+"""Range请求：无效的Range忽略(200)，有效但无法满足的才是416"""
+
+import pytest
+
+from convertlib import downloads
+
+
+def _range(value, size=100):
+    return downloads.parse_range({'range': value}, size, '"etag"')
+
+
+def test_valid_ranges():
+    assert _range('bytes=0-9') == (0, 9)
+    assert _range('bytes=90-') == (90, 99)
+    assert _range('bytes=-10') == (90, 99)
+    assert _range('bytes=50-500') == (50, 99)
+    assert _range('bytes=-500') == (0, 99)
+
+
+@pytest.mark.parametrize('value', ['bytes=9-0', 'bytes=a-b', 'bytes=--5', 'bytes=-', 'bytes=0-1,5-6', 'items=0-1'])
+def test_invalid_range_is_ignored(value):
+    assert _range(value) is None
+
+
+@pytest.mark.parametrize('value', ['bytes=100-', 'bytes=200-300', 'bytes=-0'])
+def test_unsatisfiable_range(value):
+    with pytest.raises(downloads.RangeNotSatisfiable):
+        _range(value)
+
+
+def test_if_range_mismatch_serves_full_file():
+    assert downloads.parse_range({'range': 'bytes=0-9', 'if-range': '"other"'}, 100, '"etag"') is None
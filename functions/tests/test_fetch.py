@@ -0,0 +1,18 @@
+"""网页抓取的HTTP缓存：新鲜期计算与缓存键"""
+
+from convertlib import cache, fetch
+
+
+def test_private_and_no_store_are_not_stored():
+    assert fetch.freshness_lifetime({'cache-control': 'private, max-age=600'}) is None
+    assert fetch.freshness_lifetime({'cache-control': 'no-store'}) is None
+    assert fetch.freshness_lifetime({'cache-control': 'public, max-age=600'}) == 600
+    assert fetch.freshness_lifetime({'cache-control': 'no-cache'}) == 0
+
+
+def test_url_key_keeps_result_cache_key(tmp_path):
+    http_cache = fetch.HttpCache(tmp_path, max_bytes=1024)
+    assert http_cache.url_key('https://example.com/a') != http_cache.url_key('https://example.com/b')
+    # 基类的key签名不被覆盖
+    assert http_cache.key('abc', {'targetFormat': 'png'}, 'image') == \
+        cache.ResultCache(tmp_path, max_bytes=1024).key('abc', {'targetFormat': 'png'}, 'image')
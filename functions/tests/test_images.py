@@ -0,0 +1,74 @@
+"""图像转换：Pillow的解压炸弹上限保持默认，只在条带路径打开文件头时局部放宽"""
+
+import pytest
+from PIL import Image
+
+from convertlib import images
+
+
+@pytest.fixture
+def small_limits(monkeypatch):
+    # 缩小各上限，用小图模拟超大图
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1_000_000)
+    monkeypatch.setattr(images, 'MAX_PIXELS', 500_000)
+    monkeypatch.setattr(images, 'BAND_PIXELS', 100_000)
+    monkeypatch.setattr(images, 'MAX_BANDED_PIXELS', 10_000_000)
+
+
+def test_banded_path_keeps_global_limit(tmp_path, small_limits):
+    src = tmp_path / 'big.bmp'
+    Image.new('RGB', (3000, 1000), 'red').save(src)
+
+    result = images.convert_image(src, tmp_path / 'out.png', 'png', width=300)
+    assert result == {'width': 300, 'height': 100, 'decode': 'bands'}
+    assert Image.MAX_IMAGE_PIXELS == 1_000_000
+    # 模块外直接打开仍受Pillow默认保护
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(src)
+
+
+def test_over_banded_cap_is_rejected(tmp_path, small_limits, monkeypatch):
+    monkeypatch.setattr(images, 'MAX_BANDED_PIXELS', 2_500_000)
+    src = tmp_path / 'big.bmp'
+    Image.new('L', (3000, 1000)).save(src)
+
+    with pytest.raises(images.ImageTooLarge):
+        images.convert_image(src, tmp_path / 'out.png', 'png', width=300)
+    assert Image.MAX_IMAGE_PIXELS == 1_000_000
+
+
+def test_compressed_over_budget_is_rejected(tmp_path, small_limits):
+    src = tmp_path / 'big.png'
+    Image.new('L', (1500, 1000)).save(src)
+
+    with pytest.raises(images.ImageTooLarge):
+        images.convert_image(src, tmp_path / 'out.png', 'png', width=300)
+
+
+@pytest.mark.parametrize('target', ['webp', 'tiff'])
+def test_frames_streamed_to_multiframe_encoders(tmp_path, target):
+    colors = ['red', 'green', 'blue', 'white']
+    frames = [Image.new('RGB', (64, 48), color) for color in colors]
+    src = tmp_path / 'in.gif'
+    frames[0].save(src, save_all=True, append_images=frames[1:], duration=[50, 60, 70, 80], loop=0)
+
+    dst = tmp_path / f'out.{target}'
+    result = images.convert_image(src, dst, target, width=32)
+    assert result == {'width': 32, 'height': 24, 'decode': 'frames', 'frames': 4}
+    with Image.open(dst) as out:
+        assert out.n_frames == 4
+        pixels = []
+        for index in range(out.n_frames):
+            out.seek(index)
+            pixels.append(out.convert('RGB').getpixel((5, 5)))
+    assert [max(range(3), key=pixel.__getitem__) for pixel in pixels[:3]] == [0, 1, 2]
+
+
+def test_frames_to_pdf_pages(tmp_path):
+    frames = [Image.new('RGB', (64, 48), color) for color in ('red', 'green', 'blue')]
+    src = tmp_path / 'in.tiff'
+    frames[0].save(src, save_all=True, append_images=frames[1:])
+
+    result = images.convert_image(src, tmp_path / 'out.pdf', 'pdf')
+    assert result['frames'] == 3
+    assert (tmp_path / 'out.pdf').read_bytes().count(b'/Type /Page\n') == 3
@@ -0,0 +1,124 @@
+"""jobs：提交任务后轮询进度和结束状态，内存和SQLite两种存储；结束的任务按时间清理"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from convertlib import jobs
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return jobs.MemoryJobStore()
+    return jobs.SQLiteJobStore(tmp_path / 'jobs.sqlite3')
+
+
+@pytest.fixture
+def fast_progress(monkeypatch):
+    monkeypatch.setattr(jobs, 'PROGRESS_INTERVAL', 0.0)
+
+
+def wait_for(queue, job_id, states=jobs.FINISHED, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['state'] in states:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} still {job["state"]}')
+
+
+def response(status_code, **body):
+    return {'statusCode': status_code, 'body': json.dumps(body)}
+
+
+def test_job_reports_progress_and_result(store, fast_progress):
+    queue = jobs.JobQueue(store, max_workers=1)
+    halfway = threading.Event()
+    release = threading.Event()
+
+    def convert(name, progress):
+        progress(0.5, {'step': 'encode'})
+        halfway.set()
+        release.wait(5)
+        return response(200, success=True, fileName=name)
+
+    job = queue.submit('video', convert, 'out.mp4')
+    assert job['state'] == jobs.QUEUED
+    assert halfway.wait(5)
+
+    running = queue.get(job['id'])
+    assert running['state'] == jobs.RUNNING
+    assert running['progress'] == 0.5
+    assert running['detail'] == {'step': 'encode'}
+
+    release.set()
+    done = wait_for(queue, job['id'])
+    assert done['state'] == jobs.SUCCEEDED
+    assert done['progress'] == 1.0
+    assert done['result'] == {'success': True, 'fileName': 'out.mp4'}
+    assert done['kind'] == 'video'
+
+
+def test_failed_response_and_exception_mark_job_failed(store):
+    queue = jobs.JobQueue(store, max_workers=1)
+
+    def rejected(progress):
+        return response(415, success=False, error='Unsupported conversion')
+
+    def crashed(progress):
+        raise RuntimeError('ffmpeg exited with 1')
+
+    first = wait_for(queue, queue.submit('image', rejected)['id'])
+    assert first['state'] == jobs.FAILED
+    assert first['error'] == 'Unsupported conversion'
+    assert first['result'] is None
+
+    second = wait_for(queue, queue.submit('image', crashed)['id'])
+    assert second['state'] == jobs.FAILED
+    assert second['error'] == 'ffmpeg exited with 1'
+
+
+def test_progress_is_throttled(store):
+    queue = jobs.JobQueue(store, max_workers=1)
+    report = queue.progress_callback(store.create('job1', 'audio')['id'])
+    report(0.2)
+    report(0.3)
+    assert store.get('job1')['progress'] == 0.2
+    report(1.0)
+    assert store.get('job1')['progress'] == 1.0
+
+
+def test_runner_replaces_direct_call(store):
+    queue = jobs.JobQueue(store, max_workers=1)
+    calls = []
+
+    def runner(job_id, fn, args, kwargs, progress):
+        calls.append((job_id, args, kwargs))
+        return fn(*args, progress=progress, **kwargs)
+
+    queue.runner = runner
+    job = queue.submit('pdf', lambda name, progress, pages=0: response(200, fileName=name, pages=pages), 'a.pdf', pages=3)
+    done = wait_for(queue, job['id'])
+    assert done['result'] == {'fileName': 'a.pdf', 'pages': 3}
+    assert calls == [(job['id'], ('a.pdf',), {'pages': 3})]
+
+
+def test_prune_removes_only_old_finished_jobs(store, monkeypatch):
+    store.create('old-done', 'image')
+    store.update('old-done', state=jobs.SUCCEEDED, result={'fileName': 'a.png'})
+    store.create('old-running', 'video')
+    store.update('old-running', state=jobs.RUNNING)
+
+    later = time.time() + 120
+    monkeypatch.setattr(jobs.time, 'time', lambda: later)
+    store.create('new-done', 'image')
+    store.update('new-done', state=jobs.FAILED, error='boom')
+
+    assert store.prune(60) == 1
+    assert store.get('old-done') is None
+    assert store.get('old-running')['state'] == jobs.RUNNING
+    assert store.get('new-done')['state'] == jobs.FAILED
@@ -0,0 +1,117 @@
+"""multipart：分块喂入时的边界识别、字段大小上限、截断的请求体和放弃上传"""
+
+import os
+
+import pytest
+
+from convertlib import multipart
+
+BOUNDARY = '----formboundary7MA4YWxk'
+
+
+def body(*parts, boundary=BOUNDARY, closed=True):
+    out = b''
+    for name, value, filename in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        out += f'--{boundary}\r\nContent-Disposition: {disposition}\r\n'.encode()
+        if filename is not None:
+            out += b'Content-Type: application/octet-stream\r\n'
+        out += b'\r\n' + value + b'\r\n'
+    if closed:
+        out += f'--{boundary}--\r\n'.encode()
+    return out
+
+
+@pytest.fixture
+def make_parser(tmp_path):
+    def make(**options):
+        def factory(field_name, filename, content_type):
+            path = tmp_path / f'upload_{len(list(tmp_path.iterdir()))}'
+            return multipart.FileSink(multipart.UploadedFile(field_name, filename, content_type, path))
+        return multipart.MultipartParser(BOUNDARY, factory, **options)
+    return make
+
+
+def feed_in_chunks(parser, data, size):
+    for start in range(0, len(data), size):
+        parser.feed(data[start:start + size])
+    parser.close()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 31, 64, 1000, 10 ** 6])
+def test_boundary_split_across_feeds(make_parser, chunk_size):
+    content = os.urandom(5000)
+    data = body(('targetFormat', b'png', None), ('file', content, 'photo.jpg'), ('quality', b'80', None))
+    parser = make_parser()
+    feed_in_chunks(parser, data, chunk_size)
+
+    assert parser.fields == {'targetFormat': 'png', 'quality': '80'}
+    [upload] = parser.files
+    assert upload.filename == 'photo.jpg'
+    assert upload.size == len(content)
+    assert upload.path.read_bytes() == content
+
+
+def test_near_boundary_bytes_inside_file_data(make_parser):
+    delimiter = f'\r\n--{BOUNDARY}'.encode()
+    # 分隔符的各种前缀和差一个字节的变体出现在文件内容里，不能被当成边界
+    content = b''.join([
+        delimiter[:-1], b'x',
+        delimiter[:10], b'!',
+        b'--' + BOUNDARY.encode(), b'\r\n',
+        delimiter[:-1] + b'X',
+        b'\r\n--', b'\r\n\r\n',
+        delimiter[:-1],
+    ])
+    data = body(('file', content, 'tricky.bin'))
+    for chunk_size in (1, 5, len(delimiter) - 1, len(delimiter), len(delimiter) + 1, len(data)):
+        parser = make_parser()
+        feed_in_chunks(parser, data, chunk_size)
+        assert parser.files[-1].path.read_bytes() == content
+
+
+def test_field_too_large(make_parser):
+    parser = make_parser(max_field_size=16)
+    with pytest.raises(multipart.MultipartError, match='Field too large'):
+        parser.feed(body(('note', b'x' * 17, None)))
+
+    parser = make_parser(max_field_size=16)
+    feed_in_chunks(parser, body(('note', b'x' * 16, None)), 4)
+    assert parser.fields == {'note': 'x' * 16}
+
+
+def test_truncated_body_raises_on_close(make_parser):
+    data = body(('file', os.urandom(1000), 'a.bin'), closed=False)
+    parser = make_parser()
+    parser.feed(data[:600])
+    [upload] = parser.files
+    with pytest.raises(multipart.MultipartError, match='Unexpected end'):
+        parser.close()
+    # 写了一半的文件被关闭并删除
+    assert not upload.path.exists()
+
+
+def test_abort_removes_written_files(make_parser):
+    data = body(('file', os.urandom(1000), 'a.bin'), ('file', os.urandom(1000), 'b.bin'))
+    parser = make_parser()
+    # 第一个文件已完整写入，第二个正在写入
+    parser.feed(data[:len(data) - 500])
+    first, second = parser.files
+    assert first.path.exists() and second.path.exists()
+
+    parser.abort()
+    assert not first.path.exists()
+    assert not second.path.exists()
+    assert parser._sink is None
+    # 之后再收到的数据被忽略
+    parser.feed(data[len(data) - 500:])
+    assert not second.path.exists()
+
+
+def test_missing_boundary():
+    with pytest.raises(multipart.MultipartError):
+        multipart.MultipartParser('', lambda *args: None)
+    assert multipart.parse_boundary('multipart/form-data; boundary="abc"') == 'abc'
+    assert multipart.parse_boundary('multipart/form-data') is None
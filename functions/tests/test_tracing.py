@@ -0,0 +1,19 @@
+"""指标：标签值按Prometheus文本格式转义，路由标签只取固定集合"""
+
+import convert
+from convertlib import tracing
+
+
+def test_label_values_escaped():
+    metrics = tracing.Metrics()
+    metrics.observe_request('GET /a"b\\c\nd', 200, 0.01)
+    text = metrics.render()
+    assert 'route="GET /a\\"b\\\\c\\nd",status="200"' in text
+
+
+def test_unknown_routes_share_one_label():
+    assert convert.trace_route({'httpMethod': 'POST', 'path': '/api/convert'}) == 'POST /api/convert'
+    assert convert.trace_route({'httpMethod': 'GET', 'path': '/api/jobs/abc123'}) == 'GET /api/jobs'
+    assert convert.trace_route({'httpMethod': 'GET', 'path': '/random/x'}) == 'GET other'
+    assert convert.trace_route({'httpMethod': 'GET', 'path': '/api/nope-1'}) == 'GET other'
+    assert convert.trace_route({'httpMethod': 'BREW', 'path': '/api/status'}) == 'OTHER /api/status'
@@ -0,0 +1,130 @@
+"""uploads：按偏移量续传、重发已确认的块、进程重启后续传、整个文件的sha256和出错时的截断"""
+
+import hashlib
+import os
+
+import pytest
+
+from convertlib import uploads
+
+CHUNK = 1024
+
+
+@pytest.fixture
+def store(tmp_path):
+    return uploads.ChunkedUploads(tmp_path / '.partial', chunk_size=CHUNK, max_bytes=64 * CHUNK)
+
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def send_all(store, upload_id, data, start=0):
+    status = None
+    for offset in range(start, len(data), CHUNK):
+        chunk = data[offset:offset + CHUNK]
+        status = store.append(upload_id, offset, [chunk], sha(chunk))
+    return status
+
+
+def test_upload_and_complete(store, tmp_path):
+    data = os.urandom(3 * CHUNK + 100)
+    upload = store.start('clip.mp4', len(data), sha(data))
+    assert upload['offset'] == 0 and not upload['complete']
+
+    status = send_all(store, upload['uploadId'], data)
+    assert status['offset'] == len(data) and status['complete']
+
+    destination = tmp_path / 'clip.mp4'
+    info = store.complete(upload['uploadId'], destination)
+    assert info['sha256'] == sha(data)
+    assert destination.read_bytes() == data
+    with pytest.raises(uploads.UploadNotFound):
+        store.status(upload['uploadId'])
+
+
+def test_offset_mismatch_reports_expected_offset(store):
+    data = os.urandom(2 * CHUNK)
+    upload_id = store.start('a.bin', len(data))['uploadId']
+    store.append(upload_id, 0, [data[:CHUNK]])
+    with pytest.raises(uploads.OffsetMismatch) as excinfo:
+        store.append(upload_id, 2 * CHUNK, [data[CHUNK:]])
+    assert excinfo.value.offset == CHUNK
+    # 没有校验和时重发旧块也按偏移量不一致处理
+    with pytest.raises(uploads.OffsetMismatch):
+        store.append(upload_id, 0, [data[:CHUNK]])
+
+
+def test_resent_acknowledged_chunk_is_idempotent(store):
+    data = os.urandom(2 * CHUNK)
+    upload_id = store.start('a.bin', len(data))['uploadId']
+    first = data[:CHUNK]
+    store.append(upload_id, 0, [first], sha(first))
+
+    status = store.append(upload_id, 0, [first], sha(first))
+    assert status['offset'] == CHUNK
+    assert store.stats()['retries'] == 1
+    # 同一偏移量但内容不同不是重发
+    with pytest.raises(uploads.OffsetMismatch):
+        store.append(upload_id, 0, [b'x' * CHUNK], sha(b'x' * CHUNK))
+
+
+def test_resume_after_restart(store, tmp_path):
+    data = os.urandom(3 * CHUNK)
+    upload_id = store.start('a.bin', len(data), sha(data))['uploadId']
+    send_all(store, upload_id, data[:CHUNK])
+
+    # 新进程只有磁盘上的状态，已接收部分的哈希从文件重算
+    restarted = uploads.ChunkedUploads(store.root, chunk_size=CHUNK, max_bytes=64 * CHUNK)
+    assert restarted.status(upload_id)['offset'] == CHUNK
+    send_all(restarted, upload_id, data, start=CHUNK)
+    info = restarted.complete(upload_id, tmp_path / 'a.bin')
+    assert info['sha256'] == sha(data)
+    assert restarted.stats()['rehashed'] == 1
+
+
+def test_whole_file_checksum_mismatch_discards_upload(store, tmp_path):
+    data = os.urandom(CHUNK)
+    upload_id = store.start('a.bin', len(data), sha(b'something else'))['uploadId']
+    send_all(store, upload_id, data)
+    with pytest.raises(uploads.ChecksumMismatch):
+        store.complete(upload_id, tmp_path / 'a.bin')
+    assert not (tmp_path / 'a.bin').exists()
+    with pytest.raises(uploads.UploadNotFound):
+        store.status(upload_id)
+
+
+def test_incomplete_upload_cannot_complete(store, tmp_path):
+    upload_id = store.start('a.bin', 2 * CHUNK)['uploadId']
+    store.append(upload_id, 0, [os.urandom(CHUNK)])
+    with pytest.raises(uploads.UploadIncomplete):
+        store.complete(upload_id, tmp_path / 'a.bin')
+
+
+@pytest.mark.parametrize('error, chunks, checksum', [
+    (uploads.UploadTooLarge, [b'x' * CHUNK, b'y'], None),
+    (uploads.ChecksumMismatch, [b'x' * CHUNK], sha(b'not the chunk')),
+])
+def test_rejected_chunk_is_truncated_back_to_offset(store, tmp_path, error, chunks, checksum):
+    data = os.urandom(3 * CHUNK)
+    upload_id = store.start('a.bin', len(data), sha(data))['uploadId']
+    send_all(store, upload_id, data[:CHUNK])
+
+    with pytest.raises(error):
+        store.append(upload_id, CHUNK, chunks, checksum)
+    assert store.status(upload_id)['offset'] == CHUNK
+    assert store._data_path(upload_id).stat().st_size == CHUNK
+    assert store.stats()['rejected'] == 1
+
+    # 已接收部分不受影响，可以继续续传
+    send_all(store, upload_id, data, start=CHUNK)
+    assert store.complete(upload_id, tmp_path / 'a.bin')['sha256'] == sha(data)
+
+
+def test_size_limits(store):
+    with pytest.raises(uploads.UploadTooLarge):
+        store.start('big.bin', 64 * CHUNK + 1)
+    with pytest.raises(ValueError):
+        store.start('empty.bin', 0)
+    with pytest.raises(uploads.UploadNotFound):
+        store.status('not-an-id')
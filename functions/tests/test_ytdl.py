@@ -0,0 +1,177 @@
+"""ytdl：缓存键、信息缓存TTL、格式id校验、直链失效后的重新提取；yt_dlp用假模块代替，不联网"""
+
+import json
+import os
+import sys
+import time
+import types
+
+import pytest
+
+from convertlib import ytdl
+
+
+class DownloadError(Exception):
+    pass
+
+
+class FakeSite:
+    """模拟视频站：每次提取得到当前一代的直链，expire() 之后旧直链下载失败"""
+
+    def __init__(self):
+        self.generation = 1
+        self.extractions = 0
+        self.downloads = []
+
+    def expire(self):
+        self.generation += 1
+
+    def info(self, url):
+        self.extractions += 1
+        return {
+            'id': 'abc123',
+            'title': 'Fake video',
+            'webpage_url': url,
+            'generation': self.generation,
+            'formats': [
+                {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a'},
+                {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'none', 'width': 1920, 'height': 1080},
+            ],
+        }
+
+
+@pytest.fixture
+def site(monkeypatch):
+    site = FakeSite()
+
+    class YoutubeDL:
+        def __init__(self, params=None):
+            self.params = params or {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=False, process=True):
+            return site.info(url)
+
+        def sanitize_info(self, info):
+            return json.loads(json.dumps(info))
+
+        def process_ie_result(self, info, download=True):
+            if info['generation'] != site.generation:
+                raise DownloadError('HTTP Error 403: Forbidden')
+            site.downloads.append(self.params['format'])
+            return dict(info, format_id=self.params['format'])
+
+    utils = types.SimpleNamespace(DownloadError=DownloadError, parse_bytes=lambda value: 1024 if value else None)
+    monkeypatch.setitem(sys.modules, 'yt_dlp', types.SimpleNamespace(YoutubeDL=YoutubeDL, utils=utils))
+    monkeypatch.setitem(sys.modules, 'yt_dlp.utils', utils)
+    return site
+
+
+@pytest.fixture
+def extractors(monkeypatch):
+    class FakeIE:
+        @classmethod
+        def ie_key(cls):
+            return 'Youtube'
+
+        @classmethod
+        def suitable(cls, url):
+            return 'youtube.com/watch' in url or 'youtu.be/' in url
+
+        @classmethod
+        def get_temp_id(cls, url):
+            if 'youtu.be/' in url:
+                return url.split('youtu.be/')[1].split('?')[0]
+            return url.split('v=')[1].split('&')[0]
+
+    monkeypatch.setattr(ytdl, '_extractors', [FakeIE])
+
+
+def test_video_key_shared_by_url_variants(extractors):
+    key = ytdl.video_key('https://www.youtube.com/watch?v=abc123')
+    assert key == 'Youtube:abc123'
+    assert ytdl.video_key('https://youtu.be/abc123?t=42') == key
+    assert ytdl.video_key('https://www.youtube.com/watch?v=abc123&list=xyz') == key
+
+
+def test_video_key_falls_back_to_url_hash(extractors):
+    key = ytdl.video_key('https://example.com/video.mp4')
+    assert key.startswith('url:')
+    assert key == ytdl.video_key('  https://example.com/video.mp4 ')
+    assert key != ytdl.video_key('https://example.com/other.mp4')
+
+
+def test_info_cache_expires_after_ttl(tmp_path):
+    cache = ytdl.InfoCache(tmp_path, ttl=60)
+    cache.put('Youtube:abc123', {'id': 'abc123'})
+    assert cache.get('Youtube:abc123') == {'id': 'abc123'}
+
+    path = cache._path('Youtube:abc123')
+    old = time.time() - 61
+    os.utime(path, (old, old))
+    assert cache.get('Youtube:abc123') is None
+    assert not path.exists()
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_info_cache_disabled_without_ttl(tmp_path):
+    cache = ytdl.InfoCache(tmp_path, ttl=0)
+    cache.put('Youtube:abc123', {'id': 'abc123'})
+    assert cache.get('Youtube:abc123') is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_format_selector_rejects_unknown_format_id(site):
+    info = site.info('https://youtu.be/abc123')
+    assert ytdl.format_selector('mp4', '137+140', info) == '137+140'
+    with pytest.raises(ytdl.UnknownFormat, match='999'):
+        ytdl.format_selector('mp4', '137+999', info)
+    assert ytdl.format_selector('mp3', None, info) == 'bestaudio/best'
+
+
+def test_download_reuses_cached_info(site, extractors, tmp_path):
+    cache = ytdl.InfoCache(tmp_path, ttl=60)
+    url = 'https://youtu.be/abc123'
+    ytdl.download(url, 'mp4', {}, cache)
+    result = ytdl.download('https://www.youtube.com/watch?v=abc123', 'mp4', {}, cache, format_id='137')
+    assert site.extractions == 1
+    assert result['_cached'] is True
+    assert site.downloads == ['best[ext=mp4]/best', '137']
+
+
+def test_download_invalidates_and_retries_when_cached_links_expire(site, extractors, tmp_path):
+    cache = ytdl.InfoCache(tmp_path, ttl=60)
+    url = 'https://youtu.be/abc123'
+    ytdl.download(url, 'mp4', {}, cache)
+    site.expire()
+
+    result = ytdl.download(url, 'mp4', {}, cache)
+    assert site.extractions == 2
+    assert result['generation'] == site.generation
+    assert result['_cached'] is False
+    # 重新提取的信息写回缓存
+    assert cache.get(ytdl.video_key(url))['generation'] == site.generation
+
+
+def test_download_does_not_retry_fresh_info(site, extractors, tmp_path):
+    cache = ytdl.InfoCache(tmp_path, ttl=0)
+    original = site.info
+    site.info = lambda url: dict(original(url), generation=0)
+    with pytest.raises(DownloadError):
+        ytdl.download('https://youtu.be/abc123', 'mp4', {}, cache)
+    assert site.extractions == 1
+
+
+def test_unknown_format_id_returns_400(site, extractors, tmp_path, monkeypatch):
+    convert = pytest.importorskip('convert')
+    monkeypatch.setattr(convert, 'YTDL_INFO_CACHE', ytdl.InfoCache(tmp_path, ttl=60))
+    response = convert.handle_youtube_download_sync('https://youtu.be/abc123', 'mp4', 'test', {'formatId': '999'})
+    assert response['statusCode'] == 400
+    assert 'Unknown format id: 999' in json.loads(response['body'])['error']
+    assert site.downloads == []